@@ -0,0 +1,229 @@
+"""Run a manifest of mixed Pantip, YouTube and Wikipedia jobs on one scheduler.
+
+Usage:
+    python crawl.py crawl_manifest.json
+    python crawl.py crawl_manifest.json --stub        dry run with stub handlers, no network
+
+The manifest is a JSON object:
+
+    {
+      "state": "data/crawl_state.sqlite",
+      "sources": {"pantip": {"workers": 4, "rate": 2}, "wiki": {"workers": 1}},
+      "jobs": [
+        {"source": "pantip", "kind": "topic", "list": "pantip_scraper/list.txt", "priority": 5},
+        {"source": "youtube", "kind": "comments", "ids": ["VIDEO_ID"], "max_comments": 200},
+        {"source": "youtube", "kind": "transcript", "ids": ["VIDEO_ID"], "language": "th"},
+        {"source": "wiki", "kind": "dump", "id": "thwiki", "max_articles": 1000}
+      ]
+    }
+
+Each job entry names its ids with "id", "ids" or "list" (a file with one
+URL or id per line); every other key is passed to the handler as a
+parameter. "sources" overrides DEFAULT_SOURCES. Relative paths are relative
+to the current directory. The job store remembers finished jobs, so
+re-running a manifest only runs what is new, pending or (with
+--retry-failed) failed.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for directory in ('pantip_scraper', 'wikipedia_scraper', 'youtube_scraper'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+from scraper_common.scheduler import Job, JobStore, Scheduler, Source
+
+DEFAULT_STATE = 'data/crawl_state.sqlite'
+
+# Per-source pool settings; a manifest's "sources" entries override them.
+DEFAULT_SOURCES = {
+    'pantip': {'workers': 4, 'rate': 2.0},
+    'youtube': {'workers': 4, 'rate': 1.0},
+    # Dump cleaning is CPU-bound: run it in its own process so it does not
+    # hold the GIL while the network sources parse their responses.
+    'wiki': {'workers': 1, 'processes': True},
+}
+
+PANTIP_OUTPUT = 'pantip_scraper/data/pantip_dataset.jsonl'
+YOUTUBE_OUTPUT = 'youtube_scraper/youtube_data'
+WIKI_DUMP_URL = "https://dumps.wikimedia.org/thwiki/latest/thwiki-latest-pages-articles.xml.bz2"
+WIKI_DUMP = 'wikipedia_scraper/thwiki-latest-pages-articles.xml.bz2'
+WIKI_OUTPUT = 'wikipedia_scraper/data/wiki_dataset_clean.jsonl'
+
+_lock = threading.Lock()
+_youtube_scrapers = {}
+
+def pantip_topic(params):
+    """Scrape one Pantip topic and append its record to the dataset."""
+    from pantip_scraper import PANTIP_BASE_URL, get_client, scrape_pantip_topic
+
+    record = scrape_pantip_topic(params['id'], params.get('base_url', PANTIP_BASE_URL), get_client())
+    if record is None:
+        raise RuntimeError(f"topic {params['id']} could not be fetched")
+    output = params.get('output', PANTIP_OUTPUT)
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    with _lock:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'a', encoding='utf-8') as f:
+            f.write(line)
+    return {'comments': record['comment_count']}
+
+def youtube_comments(params):
+    """Scrape a video's comments into youtube_comments_{id}.jsonl; network and HTTP errors fail the job."""
+    from youtube_comment_scraper_requests import YOUTUBE_URL, YouTubeCommentScraperRequests
+
+    key = (params.get('output_dir', YOUTUBE_OUTPUT), params.get('base_url', YOUTUBE_URL))
+    with _lock:
+        # One scraper (and so one keep-alive pool) per output dir and host, shared by the workers.
+        if key not in _youtube_scrapers:
+            _youtube_scrapers[key] = YouTubeCommentScraperRequests(key[0], base_url=key[1])
+        scraper = _youtube_scrapers[key]
+    comments = scraper.scrape_video_comments(params['id'], params.get('max_comments', 100),
+                                             params.get('replies', False), raise_errors=True)
+    return {'comments': len(comments)}
+
+def youtube_transcript(params):
+    """Download a video's transcript; a video without one is a finished job, not a failure."""
+    from youtube_content_scraper import YouTubeContentScraper, fetch_best_transcript
+
+    language, entries = fetch_best_transcript(params['id'], params.get('language', 'th'))
+    if entries is None:
+        return {'transcript': None}
+    scraper = YouTubeContentScraper(params.get('output_dir', YOUTUBE_OUTPUT), params.get('merge_chars', 0))
+    scraper.save_transcript(entries, params['id'])
+    return {'transcript': language, 'segments': len(entries)}
+
+def wiki_dump(params):
+    """Download the dump if it is missing, then clean it into the wiki dataset."""
+    from wiki_processor import download_wiki_dump, process_wiki_dump
+
+    dump_path = params.get('dump', WIKI_DUMP)
+    output = params.get('output', WIKI_OUTPUT)
+    if not os.path.exists(dump_path):
+        download_wiki_dump(params.get('url', WIKI_DUMP_URL), dump_path, segments=params.get('segments', 1))
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    articles = process_wiki_dump(dump_path, output, params.get('max_articles', 1000),
+                                 compression=params.get('compression'), progress_interval=0)
+    return {'articles': articles}
+
+HANDLERS = {
+    'pantip': {'topic': pantip_topic},
+    'youtube': {'comments': youtube_comments, 'transcript': youtube_transcript},
+    'wiki': {'dump': wiki_dump},
+}
+
+def stub_network(params):
+    """Stand-in for a network job: waits `stub_seconds` and fails at `stub_fail_rate`."""
+    time.sleep(params.get('stub_seconds', 0.2))
+    if random.random() < params.get('stub_fail_rate', 0.0):
+        raise ConnectionError(f"stub failure for {params['id']}")
+    return {'stub': params['id']}
+
+def stub_cpu(params):
+    """Stand-in for a CPU-bound job: keeps one core busy for `stub_seconds`."""
+    deadline = time.perf_counter() + params.get('stub_seconds', 2.0)
+    loops = 0
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+        loops += 1
+    return {'stub': params['id'], 'loops': loops}
+
+STUB_HANDLERS = {
+    'pantip': {'topic': stub_network},
+    'youtube': {'comments': stub_network, 'transcript': stub_network},
+    'wiki': {'dump': stub_cpu},
+}
+
+def read_ids(source, list_file):
+    """Ids from a list file, using the source's own URL parsing."""
+    if source == 'pantip':
+        from pantip_scraper import read_topic_ids
+        return read_topic_ids(list_file)
+    if source == 'youtube':
+        from youtube_comment_scraper_requests import read_video_ids
+        return read_video_ids(list_file)
+    with open(list_file, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+def expand_jobs(entries):
+    """Turn manifest job entries into `Job` objects with stable ids (`source:kind:id`)."""
+    jobs = []
+    for entry in entries:
+        params = dict(entry)
+        source = params.pop('source')
+        kind = params.pop('kind')
+        priority = params.pop('priority', 0)
+        ids = params.pop('ids', [])
+        if 'id' in params:
+            ids = [params.pop('id')] + ids
+        if 'list' in params:
+            ids = ids + read_ids(source, params.pop('list'))
+        if source == 'youtube':
+            from youtube_comment_scraper_requests import video_id_from
+            ids = [video_id_from(str(item)) or item for item in ids]
+        for item in ids:
+            jobs.append(Job(f"{source}:{kind}:{item}", source, kind, dict(params, id=str(item)), priority))
+    return jobs
+
+def build_sources(overrides, handlers, max_attempts=3):
+    sources = []
+    for name in sorted(set(DEFAULT_SOURCES) | set(overrides)):
+        options = dict(DEFAULT_SOURCES.get(name, {}), **overrides.get(name, {}))
+        options.setdefault('max_attempts', max_attempts)
+        sources.append(Source(name, handlers.get(name, {}), **options))
+    return sources
+
+def run_manifest(manifest, state_path=None, stub=False, retry_failed=False, max_attempts=3,
+                 progress_interval=5.0):
+    """Load a manifest dict into the job store and run it; returns the scheduler stats."""
+    state_path = state_path or manifest.get('state', DEFAULT_STATE)
+    if stub:
+        state_path = os.path.splitext(state_path)[0] + '.stub.sqlite'
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+
+    store = JobStore(state_path)
+    try:
+        jobs = expand_jobs(manifest.get('jobs', []))
+        added = store.add(jobs)
+        print(f"Manifest: {len(jobs)} jobs, {added} new; state in {state_path}")
+        sources = build_sources(manifest.get('sources', {}), STUB_HANDLERS if stub else HANDLERS, max_attempts)
+        stats = Scheduler(store, sources, progress_interval).run(retry_failed)
+        for name, counters in stats.items():
+            if name != 'elapsed_seconds' and any(counters.values()):
+                print(f"{name}: {counters['done']} done, {counters['failed']} failed, "
+                      f"{counters['retried']} retried, {counters['busy_seconds']:.1f}s busy")
+        counts = store.counts()
+        totals = {}
+        for (_, status), count in counts.items():
+            totals[status] = totals.get(status, 0) + count
+        print(f"Finished in {stats['elapsed_seconds']:.1f}s; job store: " +
+              ', '.join(f"{count} {status}" for status, count in sorted(totals.items())))
+        return stats
+    finally:
+        store.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a manifest of Pantip, YouTube and Wikipedia jobs")
+    parser.add_argument('manifest', help="JSON manifest of sources and jobs")
+    parser.add_argument('--state', default=None,
+                        help=f"job store path (default: the manifest's \"state\" or {DEFAULT_STATE})")
+    parser.add_argument('--stub', action='store_true',
+                        help="run stub handlers instead of the scrapers (state goes to <state>.stub.sqlite)")
+    parser.add_argument('--retry-failed', action='store_true', help="run jobs that failed in earlier runs again")
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help="tries per job before it is recorded as failed (default 3)")
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+                        help="seconds between progress lines, 0 disables (default 5)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.manifest, encoding='utf-8') as f:
+        manifest = json.load(f)
+    run_manifest(manifest, args.state, args.stub, args.retry_failed, args.max_attempts, args.progress_interval)
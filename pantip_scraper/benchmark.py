@@ -0,0 +1,628 @@
+"""Benchmarks for the Pantip scraper, run against a local stub HTTP server.
+
+Usage:
+    python benchmark.py async [num_topics] [latency_ms]
+    python benchmark.py keepalive [num_topics]
+    python benchmark.py json [num_comments] [repeat]
+    python benchmark.py cache [num_topics] [latency_ms]
+    python benchmark.py parse [num_topics] [max_workers]
+    python benchmark.py topic [repeat]
+    python benchmark.py comments [num_comments] [latency_ms]
+    python benchmark.py discover [max_pages] [latency_ms]
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+TOPIC_HTML = """<!DOCTYPE html>
+<html><head>
+<meta property="og:title" content="กระทู้ทดสอบ {tid}">
+<meta property="og:description" content="รายละเอียดกระทู้ทดสอบหมายเลข {tid}">
+</head><body>
+<div id="topic-{tid}" class="display-post-wrapper main-post">
+<div class="display-post-story">เนื้อหากระทู้ {tid}<br>บรรทัดที่สอง</div>
+<div class="display-post-tag-wrapper"><a class="tag-item" href="/tag/test">แท็กทดสอบ</a></div>
+<a href="/profile/5000" class="display-post-name owner">ผู้ตั้งกระทู้</a>
+<span class="display-post-timestamp"><abbr class="timeago" data-utime="05/14/2024 21:37:55"></abbr></span>
+</div>
+<div id="comments-jsrender"></div>
+</body></html>
+"""
+
+def _comment_fields(i, tid, reply_count=1):
+    # Per-comment metadata in the shape render_comments returns it.
+    return {
+        'comment_id': f'{tid}{i + 1:05d}', 'comment_no': i + 1, 'data_addr': f't{tid}c{i + 1}',
+        'reply_count': reply_count, 'point': i % 9,
+        'user': {'mid': 1000 + i, 'name': f'สมาชิกหมายเลข {1000 + i}', 'link': f'https://pantip.com/profile/{1000 + i}',
+                 'avatar': {'original': f'https://ptcdn.info/images/avatar_member/{1000 + i}.png',
+                            'large': f'https://ptcdn.info/images/avatar_member/{1000 + i}_l.png'}},
+        'emo_score': i % 5, 'emotions': {'like': {'count': i % 4}, 'laugh': {'count': 0}, 'love': {'count': 1},
+                                         'impress': {'count': 0}, 'scary': {'count': 0}, 'surprised': {'count': 0}},
+        'created_time': '01/01/2024 12:00:00', 'is_deleted': False, 'status': 1, 'photos': [],
+    }
+
+def _reply(i, j, tid):
+    return {'message': f'ตอบกลับความคิดเห็นที่ {i + 1}' + (f' ({j + 1})' if j else ''),
+            **_comment_fields(i, tid, 0), 'reply_id': f'{tid}{i + 1:05d}{j + 1:04d}', 'reply_no': j + 1}
+
+def _reply_total(i, replies):
+    # replies is a fixed count, or a function of the comment index
+    return replies(i) if callable(replies) else replies
+
+def comments_json(tid, count=20, page=1, limit=100, replies=1, inline=5):
+    """Page `page` of a topic with `count` comments, each with `replies` replies of which `inline` are included."""
+    comments = []
+    for i in range((page - 1) * limit, min(count, page * limit)):
+        total = _reply_total(i, replies)
+        comments.append({
+            'message': f'ความคิดเห็นที่ {i + 1} ของกระทู้ {tid}<br />บรรทัดที่สอง',
+            'replies': [_reply(i, j, tid) for j in range(min(total, inline))],
+            **_comment_fields(i, tid, total),
+        })
+    return '\ufeff' + json.dumps({'comments': comments, 'count': count, 'paging': {'page': page, 'limit': limit}},
+                                   ensure_ascii=False)
+
+def replies_json(tid, comment_no, last, replies=1, batch=20):
+    """A render_replys batch: the replies of a comment after reply number `last`."""
+    i = comment_no - 1
+    total = _reply_total(i, replies)
+    return json.dumps({'replies': [_reply(i, j, tid) for j in range(last, min(total, last + batch))],
+                       'count': total}, ensure_ascii=False)
+
+LISTING_HTML = """<!DOCTYPE html>
+<html><head><title>{name}</title></head><body>
+<ul class="pt-list">
+{items}
+</ul>
+<a class="pt-list-loadmore" href="{path}?page={next_page}">ดูเพิ่มเติม</a>
+</body></html>
+"""
+
+LISTING_ITEM = ('<li class="pt-list-item"><a href="https://pantip.com/topic/{tid}">กระทู้ทดสอบ {tid}</a> '
+                '<a href="/profile/{mid}">สมาชิก</a></li>')
+
+def listing_ids(kind, page, newest, size, pages):
+    """Topic IDs on page `page` of a stub listing, newest first.
+
+    A room lists every second ID and a tag every third, so the two overlap
+    on every sixth ID; there are `pages` pages of `size` topics.
+    """
+    if page > pages:
+        return []
+    step = 2 if kind == 'forum' else 3
+    start = newest - (page - 1) * size * step
+    return [start - k * step for k in range(size)]
+
+def listing_html(kind, name, page, newest, size, pages):
+    path = f'/{kind}/{name}'
+    items = '\n'.join(LISTING_ITEM.format(tid=tid, mid=tid % 1000)
+                      for tid in listing_ids(kind, page, newest, size, pages))
+    return LISTING_HTML.format(name=name, items=items, path=path, next_page=page + 1)
+
+def long_thread_replies(i):
+    """Reply counts of a busy thread: most comments have a few replies, every tenth a long sub-thread."""
+    return 45 if i % 10 == 0 else i % 5
+
+class StubPantipHandler(BaseHTTPRequestHandler):
+    """Serves synthetic topic pages, paged render_comments and render_replys responses, and room and tag listings."""
+
+    protocol_version = 'HTTP/1.1'  # keep connections alive between requests
+    # Send headers and body in one segment; separate small writes on a
+    # kept-alive socket stall on Nagle plus delayed ACK.
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    latency = 0.0
+    comment_count = 20
+    reply_count = 1
+    newest_topic = 43100000
+    listing_size = 40
+    listing_pages = 10
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        tid = query.get('tid', ['0'])[0]
+        if parts.path.startswith('/topic/'):
+            body = TOPIC_HTML.format(tid=parts.path.rsplit('/', 1)[-1])
+            content_type = 'text/html; charset=utf-8'
+        elif parts.path == '/forum/topic/render_comments':
+            page = int(query.get('param', ['page1'])[0][len('page'):] or 1)
+            body = comments_json(tid, self.comment_count, page, replies=self.reply_count)
+            content_type = 'application/json; charset=utf-8'
+        elif parts.path == '/forum/topic/render_replys':
+            body = replies_json(tid, int(query['c'][0]), int(query['last'][0]), self.reply_count)
+            content_type = 'application/json; charset=utf-8'
+        elif parts.path.startswith(('/forum/', '/tag/')):
+            kind, name = parts.path.strip('/').split('/', 1)
+            body = listing_html(kind, name, int(query.get('page', ['1'])[0]), self.newest_topic, self.listing_size,
+                                self.listing_pages)
+            content_type = 'text/html; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        etag = f'"{hashlib.sha1(data).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class LongThreadHandler(StubPantipHandler):
+    """A topic with 3000 comments over 30 pages, some with more replies than render_comments includes."""
+
+    comment_count = 3000
+    reply_count = staticmethod(long_thread_replies)
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 stalls high-concurrency runs on connection retries.
+    request_queue_size = 128
+
+def _serve(handler, latency, port_queue, settings):
+    handler.latency = latency
+    for name, value in settings.items():
+        setattr(handler, name, value)
+    server = StubServer(('127.0.0.1', 0), handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def start_stub_server(handler=StubPantipHandler, latency=0.0, **settings):
+    """Run the stub server in a child process so it does not share our GIL.
+
+    settings override handler class attributes, e.g. comment_count.
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(handler, latency, port_queue, settings), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+def bench_async(num_topics=200, latency_ms=50):
+    """Report topics/sec of the async crawler for increasing concurrency."""
+    import contextlib
+    import io
+    from pantip_async import run_async_crawl
+
+    server, base_url = start_stub_server(latency=latency_ms / 1000.0)
+    topic_ids = [str(43000000 + i) for i in range(num_topics)]
+    print(f"Async crawl of {num_topics} topics, {latency_ms} ms stub latency per request")
+    print(f"{'concurrency':>12} {'topics/sec':>12} {'elapsed s':>10}")
+    try:
+        for concurrency in (1, 2, 4, 8, 16, 32, 64):
+            with tempfile.TemporaryDirectory() as tmp:
+                output_file = os.path.join(tmp, 'out.jsonl')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats = run_async_crawl(topic_ids, output_file, concurrency=concurrency,
+                                            rps=0, base_url=base_url)
+                with open(output_file, encoding='utf-8') as f:
+                    assert sum(1 for _ in f) == num_topics
+            print(f"{concurrency:>12} {stats['topics_per_sec']:>12.1f} {stats['elapsed']:>10.2f}")
+    finally:
+        server.terminate()
+
+def bench_keepalive(num_topics=200):
+    """Compare sequential scraping with a pooled client against a fresh client per topic."""
+    import contextlib
+    import io
+    from pantip_scraper import HEADERS, scrape_pantip_topic
+    from scraper_common.http_client import HttpClient
+
+    server, base_url = start_stub_server()
+    topic_ids = [str(43000000 + i) for i in range(num_topics)]
+    try:
+        for label, pooled in (('new connection per topic', False), ('pooled keep-alive', True)):
+            shared = HttpClient(headers=HEADERS)
+            started = time.perf_counter()
+            new_connections = 0
+            with contextlib.redirect_stdout(io.StringIO()):
+                for topic_id in topic_ids:
+                    client = shared if pooled else HttpClient(headers=HEADERS)
+                    scrape_pantip_topic(topic_id, base_url, client)
+                    if not pooled:
+                        new_connections += client.stats.new_connections
+                        client.close()
+            elapsed = time.perf_counter() - started
+            if pooled:
+                new_connections = shared.stats.new_connections
+                print(f"{label}: {shared.stats.summary()}")
+            print(f"{label}: {num_topics / elapsed:.1f} topics/sec, {new_connections} connections opened")
+            shared.close()
+    finally:
+        server.terminate()
+
+def bench_json(num_comments=100, repeat=200):
+    """parse_comments time and peak memory per render_comments response, per JSON backend."""
+    import tracemalloc
+    from types import SimpleNamespace
+    import pantip_scraper
+    from scraper_common.fastjson import available_backends, get_loads
+
+    body = comments_json(1, num_comments).encode('utf-8')
+    projection = pantip_scraper.COMMENT_FIELDS
+    decoders = [(f'{backend} (full)', SimpleNamespace(loads=get_loads(backend)))
+                for backend in reversed(available_backends())]
+    if projection.decoder is not None:
+        decoders.append(('msgspec projection', projection))
+    print(f"render_comments: {num_comments} comments, {len(body) / 1024:.0f} KB")
+    print(f"{'decoder':>20} {'ms/response':>12} {'peak KB':>8}")
+    expected = None
+    try:
+        for label, decoder in decoders:
+            pantip_scraper.COMMENT_FIELDS = decoder
+            comments = pantip_scraper.parse_comments(body)
+            expected = expected or comments
+            assert comments == expected, f"{label} parsed differently"
+            started = time.perf_counter()
+            for _ in range(repeat):
+                pantip_scraper.parse_comments(body)
+            elapsed = (time.perf_counter() - started) / repeat
+            tracemalloc.start()
+            pantip_scraper.parse_comments(body)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{label:>20} {elapsed * 1000:>12.3f} {peak / 1024:>8.0f}")
+    finally:
+        pantip_scraper.COMMENT_FIELDS = projection
+
+def bench_cache(num_topics=500, latency_ms=20):
+    """Async crawl without a cache, filling it, from it, revalidating it and replaying it offline."""
+    import contextlib
+    import io
+    from pantip_async import run_async_crawl
+    from scraper_common.response_cache import ResponseCache
+
+    server, base_url = start_stub_server(latency=latency_ms / 1000.0)
+    topic_ids = [str(43000000 + i) for i in range(num_topics)]
+    runs = (
+        ('no cache', None),
+        ('cold cache', {}),
+        ('warm cache', {}),
+        ('revalidate (304)', {'max_age': 0}),
+        ('replay, server down', {'replay': True}),
+    )
+    print(f"Async crawl of {num_topics} topics, {latency_ms} ms stub latency per request, concurrency 16")
+    print(f"{'run':>20} {'topics/sec':>11} {'requests':>9} {'hits':>6} {'304s':>6}")
+    expected = None
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, 'cache')
+        try:
+            for i, (label, options) in enumerate(runs):
+                if options is not None and options.get('replay'):
+                    server.terminate()
+                    server.join()
+                cache = ResponseCache(cache_dir, **options) if options is not None else None
+                output_file = os.path.join(tmp, f'out{i}.jsonl')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats = run_async_crawl(topic_ids, output_file, concurrency=16, rps=0, base_url=base_url,
+                                            cache=cache)
+                with open(output_file, encoding='utf-8') as f:
+                    lines = sorted(f)
+                expected = expected or lines
+                assert len(lines) == num_topics and lines == expected, f"{label}: output differs"
+                hits = revalidated = 0
+                if cache is not None:
+                    hits, revalidated = cache.stats['hits'], cache.stats['revalidated']
+                    cache.close()
+                print(f"{label:>20} {stats['topics_per_sec']:>11.1f} {stats['requests']['requests']:>9} "
+                      f"{hits - revalidated:>6} {revalidated:>6}")
+        finally:
+            server.terminate()
+
+def bench_parse(num_topics=2000, max_workers=None):
+    """Archive a crawl without parsing it, then time reparse.py alone for 1..max_workers processes.
+
+    Finally checks that long topics (several comment pages, extra reply
+    batches) reparse to the same topic and comment records as a live scrape.
+    """
+    import contextlib
+    import io
+    from pantip_async import run_async_crawl
+    from raw_archive import RawArchive
+    from reparse import reparse
+    from scraper_common.jsonl_writer import JsonlWriter
+
+    max_workers = max_workers or os.cpu_count() or 1
+    server, base_url = start_stub_server()
+    topic_ids = [str(43000000 + i) for i in range(num_topics)]
+    with tempfile.TemporaryDirectory() as tmp:
+        archive_path = os.path.join(tmp, 'raw.arc')
+        parsed_path = os.path.join(tmp, 'parsed.jsonl')
+        try:
+            archive = RawArchive(archive_path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                fetch_only = run_async_crawl(topic_ids, os.path.join(tmp, 'unused.jsonl'), concurrency=16, rps=0,
+                                             base_url=base_url, archive=archive, parse=False)
+                inline = run_async_crawl(topic_ids, parsed_path, concurrency=16, rps=0, base_url=base_url)
+            archive.close()
+        finally:
+            server.terminate()
+        with open(parsed_path, encoding='utf-8') as f:
+            expected = sorted(f)
+
+        print(f"{num_topics} topics against the stub server (network plus local HTTP overhead):")
+        print(f"  fetch and archive only: {fetch_only['topics_per_sec']:.0f} topics/sec, "
+              f"archive {os.path.getsize(archive_path) / 1e6:.1f} MB")
+        print(f"  fetch and parse:        {inline['topics_per_sec']:.0f} topics/sec")
+        print(f"Reparse from the archive, no network ({os.cpu_count()} cores):")
+        print(f"{'workers':>9} {'topics/sec':>11} {'elapsed s':>10}")
+        workers = 1
+        while workers <= max_workers:
+            output = os.path.join(tmp, f'reparsed{workers}.jsonl')
+            stats = reparse(archive_path, output, workers)
+            with open(output, encoding='utf-8') as f:
+                assert sorted(f) == expected, f"{workers} workers: output differs from the live parse"
+            print(f"{workers:>9} {stats['topics_per_sec']:>11.0f} {stats['elapsed']:>10.2f}")
+            workers *= 2
+
+        long_ids = [str(43000000 + i) for i in range(8)]
+        paths = {name: os.path.join(tmp, f'long_{name}.jsonl') for name in
+                 ('live', 'live_comments', 'reparsed', 'reparsed_comments')}
+        server, base_url = start_stub_server(LongThreadHandler, comment_count=450)
+        try:
+            archive = RawArchive(os.path.join(tmp, 'long.arc'))
+            with contextlib.redirect_stdout(io.StringIO()), JsonlWriter(paths['live_comments']) as comments_out:
+                run_async_crawl(long_ids, paths['live'], concurrency=4, rps=0, base_url=base_url, archive=archive,
+                                comments_out=comments_out)
+            archive.close()
+        finally:
+            server.terminate()
+        reparse(os.path.join(tmp, 'long.arc'), paths['reparsed'], 1, comments_file=paths['reparsed_comments'])
+        lines = {}
+        for name, path in paths.items():
+            with open(path, encoding='utf-8') as f:
+                lines[name] = sorted(f)
+        assert len(lines['live']) == len(long_ids) and lines['reparsed'] == lines['live'], \
+            "long topics: reparsed records differ from the live scrape"
+        assert lines['reparsed_comments'] == lines['live_comments'], \
+            "long topics: reparsed comment records differ from the live scrape"
+        print(f"{len(long_ids)} topics of 450 comments (5 pages, extra reply batches): "
+              f"{len(lines['live_comments'])} comment records, reparsed identically")
+
+def sequential_comments(client, topic_id, base_url):
+    """Every comment page, then each of its reply batches, one request at a time (the bench_comments baseline)."""
+    from pantip_comments import merge_replies, page_count, parse_reply_batch, reply_batches
+    from pantip_scraper import api_headers, comments_url, parse_comment_page, replies_url, thread_records
+
+    page = pages = 1
+    while page <= pages:
+        response = client.get(comments_url(topic_id, base_url, page), headers=api_headers())
+        items, count, limit = parse_comment_page(response.content)
+        pages = page_count(count, limit)
+        for item in items:
+            known = []
+            for last in reply_batches(item):
+                url = replies_url(topic_id, item['comment_id'], item['comment_no'], last, base_url)
+                merge_replies(item, known, parse_reply_batch(client.get(url, headers=api_headers()).content))
+            yield from thread_records(topic_id, item, known)
+        page += 1
+
+def bench_comments(num_comments=3000, latency_ms=10):
+    """Fetch every comment and reply of one long topic: sequentially, then through a window of pages."""
+    import asyncio
+    import tracemalloc
+    import aiohttp
+    from pantip_async import HostRateLimiter, fetch_api
+    from pantip_comments import (
+        client_fetcher, collect_comments, collect_comments_async, iter_comments, iter_comments_async,
+    )
+    from pantip_scraper import HEADERS, api_headers, comments_url
+    from scraper_common.http_client import HttpClient
+    from scraper_common.jsonl_writer import JsonlWriter
+
+    server, base_url = start_stub_server(LongThreadHandler, latency_ms / 1000.0, comment_count=num_comments)
+    topic_id = '43000001'
+    client = HttpClient(headers=HEADERS, pool_size=64)
+    requests_made = [0]
+
+    async def stream_async(window, out):
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=64)) as session:
+            limiter = HostRateLimiter(0)
+
+            async def fetch(url):
+                requests_made[0] += 1
+                return await fetch_api(session, limiter, url)
+
+            return await collect_comments_async(iter_comments_async(fetch, topic_id, first, base_url, window), out)
+
+    runs = [('sequential', lambda out: collect_comments(sequential_comments(client, topic_id, base_url), out))]
+    for window in (1, 4, 8, 16):
+        # Window 1 makes every request in turn, without threads.
+        runs.append((f"{'threads' if window > 1 else 'inline'}, window {window}",
+                     lambda out, window=window: collect_comments(iter_comments(client_fetcher(client), topic_id, first,
+                                                                               base_url, window), out)))
+    runs.append(('asyncio, window 8', lambda out: asyncio.run(stream_async(8, out))))
+
+    print(f"One topic with {num_comments} comments, every tenth with 45 replies (5 inline), "
+          f"{latency_ms} ms stub latency per request")
+    print(f"{'run':>18} {'requests':>9} {'elapsed s':>10} {'latency rounds':>15} {'records':>8}")
+    expected = None
+    try:
+        first = client.get(comments_url(topic_id, base_url), headers=api_headers()).content
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, (label, run) in enumerate(runs):
+                path = os.path.join(tmp, f'comments{i}.jsonl')
+                before = client.stats.requests
+                requests_made[0] = 0
+                started = time.perf_counter()
+                with JsonlWriter(path) as out:
+                    run(out)
+                elapsed = time.perf_counter() - started
+                with open(path, encoding='utf-8') as f:
+                    lines = f.readlines()
+                expected = expected or lines
+                assert lines == expected, f"{label}: records differ from the sequential fetch"
+                # +1 for the first page, fetched beforehand as the scraper does
+                requests = client.stats.requests - before + requests_made[0] + (0 if i == 0 else 1)
+                print(f"{label:>18} {requests:>9} {elapsed:>10.2f} {elapsed * 1000 / latency_ms:>15.0f} {len(lines):>8}"
+                      if latency_ms else f"{label:>18} {requests:>9} {elapsed:>10.2f} {'-':>15} {len(lines):>8}")
+
+            print("Peak Python memory, threads, window 8:")
+            for label, streaming in (('records kept in a list', False), ('streamed to JSONL', True)):
+                tracemalloc.start()
+                records = iter_comments(client_fetcher(client), topic_id, first, base_url, 8)
+                if streaming:
+                    with JsonlWriter(os.path.join(tmp, 'streamed.jsonl')) as out:
+                        collect_comments(records, out)
+                else:
+                    kept = list(records)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{label:>24}: {peak / 1e6:.1f} MB")
+    finally:
+        client.close()
+        server.terminate()
+
+async def discover_only(sources, base_url, max_pages):
+    """All topic IDs the sources list, newest first, before any scraping (the bench_discover baseline)."""
+    import aiohttp
+    from discovery import Frontier, discover
+    from pantip_async import HostRateLimiter, fetch
+    from pantip_scraper import HEADERS
+
+    frontier = Frontier(high_water=float('inf'))
+    async with aiohttp.ClientSession() as session:
+        limiter = HostRateLimiter(0)
+
+        async def fetch_page(url):
+            status, body = await fetch(session, limiter, url, HEADERS)
+            return body.decode('utf-8') if status == 200 else None
+
+        await discover(fetch_page, sources, frontier, base_url, max_pages)
+    topic_ids = []
+    while (topic_id := await frontier.get()) is not None:
+        topic_ids.append(topic_id)
+    return topic_ids
+
+def bench_discover(max_pages=10, latency_ms=50):
+    """Discover a room and a tag from stub listings, then scrape, against discovery feeding the crawler."""
+    import asyncio
+    import contextlib
+    import io
+    import tracemalloc
+    from discovery import TopicIdSet, parse_source, run_discovery_crawl
+    from pantip_async import run_async_crawl
+
+    server, base_url = start_stub_server(latency=latency_ms / 1000.0, listing_pages=max_pages)
+    sources = ['room:stub', 'tag:test']
+    print(f"Room and tag listings, {max_pages} pages of {StubPantipHandler.listing_size} topics each, "
+          f"{latency_ms} ms stub latency per request, concurrency 16")
+    print(f"{'run':>26} {'topics':>7} {'discovered s':>13} {'total s':>8} {'topics/sec':>11}")
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                topic_ids = asyncio.run(discover_only([parse_source(spec) for spec in sources], base_url, max_pages))
+                discovered = time.perf_counter() - started
+                run_async_crawl(topic_ids, os.path.join(tmp, 'sequential.jsonl'), concurrency=16, rps=0,
+                                base_url=base_url)
+                results.append(('discover, then scrape', discovered, time.perf_counter() - started))
+                started = time.perf_counter()
+                stats = run_discovery_crawl(sources, os.path.join(tmp, 'overlapped.jsonl'), concurrency=16, rps=0,
+                                            base_url=base_url, max_pages=max_pages)
+                results.append(('discovery feeds the crawler', stats['discovery']['elapsed'],
+                                time.perf_counter() - started))
+            outputs = []
+            for name in ('sequential', 'overlapped'):
+                with open(os.path.join(tmp, f'{name}.jsonl'), encoding='utf-8') as f:
+                    outputs.append(sorted(f))
+            assert outputs[0] == outputs[1], "the two runs scraped different topics"
+            for label, discovered, elapsed in results:
+                print(f"{label:>26} {len(topic_ids):>7} {discovered:>13.2f} {elapsed:>8.2f} "
+                      f"{len(topic_ids) / elapsed:>11.1f}")
+    finally:
+        server.terminate()
+
+    print("Dedup memory for 1,000,000 consecutive topic IDs:")
+    for label, factory in (('set of ints', set), ('TopicIdSet bitmap', TopicIdSet)):
+        tracemalloc.start()
+        seen = factory(range(43000000, 44000000))
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        assert 43500000 in seen and 44000000 not in seen
+        del seen
+        print(f"{label:>26}: {size / 1e6:.1f} MB")
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def legacy_parse_topic_page(html):
+    """The previous parse_topic_page: a full BeautifulSoup tree for two meta tags."""
+    from bs4 import BeautifulSoup
+    from pantip_scraper import clean_text
+
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.find('meta', property='og:title')
+    title = title['content'] if title else ""
+    summary = soup.find('meta', property='og:description')
+    summary = summary['content'] if summary else ""
+    return clean_text(title), clean_text(summary)
+
+def bench_topic(repeat=50):
+    """Per-page parse time of the synthetic topic pages in fixtures/, full BeautifulSoup against the fast path."""
+    import glob
+    from pantip_scraper import clean_topic, parse_topic_details, parse_topic_page
+    from topic_parser import TopicPageParser, extract_topic_soup
+
+    def timed(function, html):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            function(html)
+        return (time.perf_counter() - started) / repeat * 1000
+
+    print(f"{'page':>20} {'KB':>5} {'bs4 meta':>9} {'fast meta':>10} {'bs4 full':>9} {'fast full':>10} {'path':>9}  (ms/page)")
+    for path in sorted(glob.glob(os.path.join(FIXTURES, 'topic_*.html'))):
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        assert parse_topic_page(html) == legacy_parse_topic_page(html), f"{path}: meta differs"
+        parser = TopicPageParser()
+        parser.parse(html)
+        # The fast path and the fallback must agree once cleaned.
+        assert parse_topic_details(html) == clean_topic(extract_topic_soup(html)), \
+            f"{path}: fast path differs from BeautifulSoup"
+        print(f"{os.path.basename(path):>20} {len(html.encode('utf-8')) / 1024:>5.0f} "
+              f"{timed(legacy_parse_topic_page, html):>9.2f} {timed(parse_topic_page, html):>10.2f} "
+              f"{timed(extract_topic_soup, html):>9.2f} {timed(parse_topic_details, html):>10.2f} "
+              f"{'fast' if parser.found_post else 'fallback':>9}")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'async'
+    args = [int(a) for a in sys.argv[2:]]
+    if command == 'async':
+        bench_async(*args)
+    elif command == 'keepalive':
+        bench_keepalive(*args)
+    elif command == 'json':
+        bench_json(*args)
+    elif command == 'cache':
+        bench_cache(*args)
+    elif command == 'parse':
+        bench_parse(*args)
+    elif command == 'topic':
+        bench_topic(*args)
+    elif command == 'comments':
+        bench_comments(*args)
+    elif command == 'discover':
+        bench_discover(*args)
+    else:
+        print(__doc__)
+        sys.exit(1)
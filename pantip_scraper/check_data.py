@@ -14,11 +14,17 @@ print()
 for i, data in enumerate(topics, 1):
     print(f"Topic {i}:")
     print(f"  Title: {data['title']}")
-    print(f"  Comments: {len(data['comments'])}")
+    # Records scraped before the post fields were added only have title and summary
+    if data.get('author'):
+        print(f"  Author: {data['author']} ({data.get('created_at') or 'no timestamp'})")
+    if data.get('tags'):
+        print(f"  Tags: {', '.join(data['tags'])}")
+    # Records scraped with --comments-output keep only the count; older ones only the texts
+    print(f"  Comments: {data.get('comment_count', len(data.get('comments', [])))}")
     print(f"  URL: https://pantip.com/topic/{data['topic_id']}")
     
     # Print first 2 comments
     print("  First 2 comments:")
-    for j, comment in enumerate(data['comments'][:2]):
+    for j, comment in enumerate(data.get('comments', [])[:2]):
         print(f"    - {comment}")
     print()
\ No newline at end of file
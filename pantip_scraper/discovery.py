@@ -0,0 +1,273 @@
+"""Topic discovery: find topic IDs in forum rooms, tags and ID ranges and feed them to the async crawler.
+
+Sources are given as strings:
+
+    room:chalermkrung        the room's topic listing, /forum/chalermkrung
+    tag:ท่องเที่ยว              a tag's topic listing, /tag/ท่องเที่ยว
+    range:43000000-43001000  every ID in the range (inclusive), newest first
+
+Listing pages are fetched page after page (`?page=N`) and scanned for
+/topic/<id> links. A room or tag stops after `max_pages` pages, at an
+empty page, or at a page whose topics were all scraped in earlier runs, so
+re-running discovery over a room only walks as far back as the last run.
+
+Every ID goes through a `Frontier`: a priority queue that hands out the
+newest topic first (Pantip topic IDs increase over time) and drops IDs it
+has already seen, using a `TopicIdSet` bitmap rather than a set of ints.
+Discovery and scraping run in the same event loop: crawler workers take
+topics from the frontier while listings are still being read, and
+discovery pauses while the frontier holds `high_water` topics, so an ID
+range of millions never sits in memory at once.
+"""
+
+import asyncio
+import heapq
+import re
+import time
+from urllib.parse import quote
+
+import aiohttp
+
+from pantip_async import crawl_topics, fetch
+from pantip_scraper import DEFAULT_RPS, HEADERS, PANTIP_BASE_URL
+
+TOPIC_LINK = re.compile(r'href="(?:https?://pantip\.com)?/topic/(\d+)')
+
+# Listing pages read per room or tag, topics queued before discovery pauses,
+# and IDs pushed at a time from a range.
+DEFAULT_MAX_PAGES = 10
+HIGH_WATER = 1000
+RANGE_CHUNK = 500
+
+class TopicIdSet:
+    """Compact set of numeric topic IDs: one bitmap per block of 65536 consecutive IDs.
+
+    Pantip's IDs are dense, so every ID ever posted fits in a few MB, where
+    a set of ints costs around 60 bytes per ID.
+    """
+
+    BLOCK_BITS = 16
+
+    def __init__(self, topic_ids=()):
+        self._blocks = {}
+        self._len = 0
+        for topic_id in topic_ids:
+            self.add(topic_id)
+
+    def _locate(self, topic_id):
+        topic_id = int(topic_id)
+        offset = topic_id & ((1 << self.BLOCK_BITS) - 1)
+        return topic_id >> self.BLOCK_BITS, offset >> 3, 1 << (offset & 7)
+
+    def add(self, topic_id):
+        """Add topic_id; returns False if it was already in the set."""
+        block_no, byte, bit = self._locate(topic_id)
+        block = self._blocks.get(block_no)
+        if block is None:
+            block = self._blocks[block_no] = bytearray(1 << (self.BLOCK_BITS - 3))
+        if block[byte] & bit:
+            return False
+        block[byte] |= bit
+        self._len += 1
+        return True
+
+    def __contains__(self, topic_id):
+        block_no, byte, bit = self._locate(topic_id)
+        block = self._blocks.get(block_no)
+        return block is not None and bool(block[byte] & bit)
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def nbytes(self):
+        return len(self._blocks) << (self.BLOCK_BITS - 3)
+
+class Frontier:
+    """Newest-first queue of topic IDs to scrape, deduplicated against every ID ever pushed.
+
+    Args:
+        known: a `TopicIdSet` of IDs from earlier runs to never queue.
+        limit: stop accepting IDs after this many; None for no limit.
+        high_water: `wait_for_room` blocks while this many topics are queued.
+    """
+
+    def __init__(self, known=None, limit=None, high_water=HIGH_WATER):
+        self.known = known if known is not None else TopicIdSet()
+        self.seen = TopicIdSet()
+        self.limit = limit
+        self.high_water = high_water
+        self.accepted = 0
+        self.duplicates = 0
+        self._heap = []
+        self._closed = False
+        self._added = asyncio.Event()
+        self._taken = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def full(self):
+        return self.limit is not None and self.accepted >= self.limit
+
+    def push(self, topic_ids):
+        """Queue the IDs not seen before; returns how many were new."""
+        new = 0
+        for topic_id in topic_ids:
+            if self.full:
+                break
+            if topic_id in self.known or not self.seen.add(topic_id):
+                self.duplicates += 1
+                continue
+            heapq.heappush(self._heap, -int(topic_id))
+            self.accepted += 1
+            new += 1
+        if new:
+            self._added.set()
+        return new
+
+    def close(self):
+        """No more IDs will be pushed; `get` returns None once the queue is empty."""
+        self._closed = True
+        self._added.set()
+        self._taken.set()
+
+    async def get(self):
+        """The newest queued topic ID (a string), waiting for discovery; None when closed and empty."""
+        while not self._heap:
+            if self._closed:
+                return None
+            self._added.clear()
+            await self._added.wait()
+        topic_id = str(-heapq.heappop(self._heap))
+        self._taken.set()
+        return topic_id
+
+    async def wait_for_room(self):
+        """Wait until fewer than high_water topics are queued."""
+        while len(self._heap) >= self.high_water and not self._closed:
+            self._taken.clear()
+            await self._taken.wait()
+
+def parse_source(spec):
+    """('room', name), ('tag', name) or ('range', (first, last)) from a source string."""
+    kind, _, value = spec.partition(':')
+    if kind in ('room', 'tag') and value:
+        return kind, value
+    if kind == 'range':
+        first, _, last = value.partition('-')
+        if first.isdigit() and last.isdigit():
+            return kind, (min(int(first), int(last)), max(int(first), int(last)))
+    raise ValueError(f"unknown discovery source {spec!r}: use room:NAME, tag:NAME or range:FIRST-LAST")
+
+def listing_url(kind, name, page=1, base_url=PANTIP_BASE_URL):
+    path = f"/forum/{quote(name)}" if kind == 'room' else f"/tag/{quote(name)}"
+    return f"{base_url}{path}" if page == 1 else f"{base_url}{path}?page={page}"
+
+def parse_listing(html):
+    """Topic IDs linked from a listing page, in page order, without repeats."""
+    return list(dict.fromkeys(TOPIC_LINK.findall(html)))
+
+async def discover(fetch_page, sources, frontier, base_url=PANTIP_BASE_URL, max_pages=DEFAULT_MAX_PAGES, stats=None):
+    """Read every source concurrently into frontier, then close it.
+
+    `fetch_page(url)` is a coroutine returning a page's HTML, or None for a
+    failed request. Counts of pages read and IDs found go into `stats`.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault('pages', 0)
+    stats.setdefault('found', 0)
+
+    async def read_listing(kind, name):
+        for page in range(1, max_pages + 1):
+            await frontier.wait_for_room()
+            if frontier.full:
+                return
+            html = await fetch_page(listing_url(kind, name, page, base_url))
+            if html is None:
+                return
+            topic_ids = parse_listing(html)
+            stats['pages'] += 1
+            stats['found'] += len(topic_ids)
+            frontier.push(topic_ids)
+            # Listings are newest first: past a page of known topics, earlier runs saw the rest.
+            if all(topic_id in frontier.known for topic_id in topic_ids):
+                return
+
+    async def read_range(first, last):
+        for end in range(last, first - 1, -RANGE_CHUNK):
+            await frontier.wait_for_room()
+            if frontier.full:
+                return
+            topic_ids = range(end, max(first, end - RANGE_CHUNK + 1) - 1, -1)
+            stats['found'] += len(topic_ids)
+            frontier.push(topic_ids)
+
+    try:
+        await asyncio.gather(*(read_range(*value) if kind == 'range' else read_listing(kind, value)
+                               for kind, value in sources))
+    finally:
+        frontier.close()
+    return stats
+
+async def discover_and_crawl(sources, output_file, seeds=(), concurrency=16, rps=DEFAULT_RPS,
+                             base_url=PANTIP_BASE_URL, max_pages=DEFAULT_MAX_PAGES, max_topics=None, index=None,
+                             retry_failed=False, cache=None, archive=None, parse=True, comments_out=None,
+                             **crawl_options):
+    """Discover topics from sources and scrape them as they are found.
+
+    seeds (e.g. the IDs in list.txt) are queued first. Topics recorded in
+    the resume index (finished ones, and failed ones unless retry_failed)
+    are never queued, nor, in fetch-only runs, topics already archived.
+    Listing pages share the crawler's rate limiter but bypass the response
+    cache, since they change. Returns the crawler's stats with the
+    discovery counts under 'discovery'.
+    """
+    known = TopicIdSet()
+    if index is not None:
+        for topic_id in index.done if retry_failed else index.done | index.failed:
+            known.add(topic_id)
+    if archive is not None and not parse:
+        for topic_id in archive.topic_ids():
+            known.add(topic_id)
+    frontier = Frontier(known, max_topics)
+    frontier.push(seeds)
+    discovery = {'seeds': len(seeds)}
+    started = time.perf_counter()
+
+    async def run_discovery(session, limiter, retry):
+        async def fetch_page(url):
+            try:
+                status, body = await fetch(session, limiter, url, HEADERS, retry)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Error fetching listing {url}: {e}")
+                return None
+            if status != 200:
+                print(f"Failed to fetch listing {url}: {status}")
+                return None
+            return body.decode('utf-8', errors='replace')
+
+        await discover(fetch_page, sources, frontier, base_url, max_pages, discovery)
+        discovery['elapsed'] = time.perf_counter() - started
+
+    stats = await crawl_topics([], output_file, concurrency, rps, base_url, index=index, cache=cache, archive=archive,
+                               parse=parse, comments_out=comments_out, frontier=frontier, discover=run_discovery,
+                               **crawl_options)
+    discovery.update(queued=frontier.accepted, duplicates=frontier.duplicates,
+                     dedup_bytes=known.nbytes + frontier.seen.nbytes)
+    stats['discovery'] = discovery
+    return stats
+
+def run_discovery_crawl(sources, output_file, seeds=(), concurrency=16, rps=DEFAULT_RPS, base_url=PANTIP_BASE_URL,
+                        max_pages=DEFAULT_MAX_PAGES, max_topics=None, **options):
+    """Synchronous entry point for discover_and_crawl; sources are strings for `parse_source`."""
+    stats = asyncio.run(discover_and_crawl([parse_source(spec) for spec in sources], output_file, seeds, concurrency,
+                                           rps, base_url, max_pages, max_topics, **options))
+    discovery = stats['discovery']
+    print(f"Discovery: {discovery['pages']} listing pages, {discovery['found']} topic links, "
+          f"{discovery['queued']} topics queued ({discovery['seeds']} seeds), {discovery['duplicates']} duplicates "
+          f"dropped, dedup set {discovery['dedup_bytes'] / 1024:.0f} KB")
+    print(f"Crawl: {stats['topics_per_sec']:.2f} topics/sec (concurrency={concurrency}, rps={rps})")
+    print(stats['summary'])
+    return stats
@@ -0,0 +1,245 @@
+import asyncio
+import contextlib
+import itertools
+import json
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from pantip_comments import collect_comments_async, iter_comments_async
+from pantip_scraper import (
+    COMMENT_WINDOW, DEFAULT_RPS, PANTIP_BASE_URL, HEADERS, api_headers, build_record, comments_url,
+    parse_topic_details, topic_url,
+)
+from scraper_common.rate_limit import AdaptiveRateLimiter, RetryPolicy, parse_retry_after
+from scraper_common.response_cache import request_key
+
+class HostRateLimiter:
+    """One `AdaptiveRateLimiter` per host: at most `rps` requests per second each, less after 429/503."""
+
+    def __init__(self, rps):
+        self.rps = rps
+        self._hosts = {}
+
+    def for_url(self, url):
+        host = urlsplit(url).netloc
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = self._hosts[host] = AdaptiveRateLimiter(self.rps)
+        return limiter
+
+    async def wait(self, url):
+        await self.for_url(url).wait_async()
+
+    def on_response(self, url, status, retry_after=None, sent_at=None):
+        self.for_url(url).on_response(status, retry_after, sent_at)
+
+async def fetch(session, limiter, url, headers, retry=None, cache=None):
+    """GET url and return (status, body bytes), retrying transient failures as `retry` allows.
+
+    With a `ResponseCache`, fresh entries are returned without a request,
+    stale ones are revalidated and new 200 responses are stored. In replay
+    mode a miss is a 504.
+    """
+    key = entry = None
+    if cache is not None:
+        key = request_key('GET', url)
+        entry = cache.get(key)
+        if entry is not None and (cache.replay or cache.is_fresh(entry)):
+            return entry.status, entry.body
+        if cache.replay:
+            return 504, b''
+        if entry is not None:
+            headers = dict(headers, **entry.validators())
+    for attempt in itertools.count():
+        await limiter.wait(url)
+        if retry is not None:
+            retry.metrics.record_request()
+        sent_at = time.monotonic()
+        try:
+            async with session.get(url, headers=headers) as response:
+                status = response.status
+                response_headers = response.headers
+                retry_after = parse_retry_after(response_headers.get('Retry-After'))
+                body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            delay = retry.retry_delay(attempt) if retry is not None else None
+            if delay is None:
+                raise
+        else:
+            limiter.on_response(url, status, retry_after, sent_at)
+            delay = retry.retry_delay(attempt, status, retry_after) if retry is not None else None
+            if delay is None:
+                if cache is not None:
+                    if status == 304 and entry is not None:
+                        cache.touch(key)
+                        return entry.status, entry.body
+                    if status == 200:
+                        cache.put(key, 'GET', url, status, response_headers, body)
+                return status, body
+        await asyncio.sleep(delay)
+
+async def fetch_api(session, limiter, url, retry=None, cache=None, responses=None):
+    """The body of a 200 API response (comment pages, reply batches), or None after reporting the failure.
+
+    With a list as responses, the request is appended to it as (url, status,
+    body), status None when no response arrived (see `client_fetcher`).
+    """
+    try:
+        status, body = await fetch(session, limiter, url, api_headers(), retry, cache)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Error fetching {url}: {e}")
+        if responses is not None:
+            responses.append((url, None, b''))
+        return None
+    if responses is not None:
+        responses.append((url, status, body))
+    if status != 200:
+        print(f"Failed to fetch {url}: {status}")
+        return None
+    return body
+
+async def scrape_pantip_topic_async(session, limiter, topic_id, base_url=PANTIP_BASE_URL, retry=None,
+                                    cache=None, archive=None, parse=True, comments_out=None,
+                                    window=COMMENT_WINDOW):
+    """Fetch a topic and all of its comments and build the dataset record.
+
+    The topic page and the first comment page are fetched in parallel, then
+    the remaining comment pages and reply batches (see pantip_comments.py).
+
+    Raw responses, every comment request included, go to `archive` when
+    one is given, unless a comment request failed; with parse=False the
+    comments are still followed, to archive them, but nothing is parsed,
+    and True is returned for an archived topic, None for one to retry. Structured
+    comment records go to `comments_out` when one is given (see
+    `pantip_scraper.scrape_pantip_topic`).
+    """
+    try:
+        (status, body), (comments_status, comments_body) = await asyncio.gather(
+            fetch(session, limiter, topic_url(topic_id, base_url), HEADERS, retry, cache),
+            fetch(session, limiter, comments_url(topic_id, base_url), api_headers(), retry, cache),
+        )
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Error fetching topic {topic_id}: {e}")
+        return None
+
+    if status != 200:
+        print(f"Failed to fetch topic {topic_id}: {status}")
+        return None
+    comments_ok = comments_status == 200
+    if not comments_ok:
+        print(f"Failed to fetch comments for topic {topic_id}: {comments_status}")
+
+    responses = [] if archive is not None else None
+    comments, count = ([] if comments_out is None else None), 0
+    if comments_ok:
+        records = iter_comments_async(lambda url: fetch_api(session, limiter, url, retry, cache, responses),
+                                      topic_id, comments_body, base_url, window)
+        if parse:
+            comments, count = await collect_comments_async(records, comments_out)
+        else:
+            async for _ in records:
+                pass
+        comments_ok = all(response_status == 200 for _, response_status, _ in responses or ())
+    if archive is not None:
+        if comments_ok:
+            archive.append(topic_id, status, body, comments_status, comments_body, responses)
+        else:
+            print(f"Not archiving topic {topic_id}: a comment request failed")
+    if not parse:
+        return True if comments_ok else None
+    page = parse_topic_details(body.decode('utf-8', errors='replace'))
+    return build_record(topic_id, page, comments, count)
+
+async def crawl_topics(topic_ids, output_file, concurrency=16, rps=DEFAULT_RPS,
+                       base_url=PANTIP_BASE_URL, timeout=30, index=None, retry=None, cache=None, archive=None,
+                       parse=True, comments_out=None, window=COMMENT_WINDOW, frontier=None, discover=None):
+    """Scrape topic_ids with up to `concurrency` topics in flight.
+
+    Records are appended to output_file as they complete, so the line order
+    follows completion order rather than the order of topic_ids. An optional
+    resume index is consulted before each topic and updated after it.
+    Transient failures are retried with `retry` (a default `RetryPolicy`),
+    whose metrics end up in the returned stats. With a `ResponseCache`,
+    cached pages are reused (see `fetch`). With a `RawArchive`, raw
+    responses are archived too, and with parse=False only archived. Each
+    topic follows up to `window` comment pages at once; structured comments
+    go to `comments_out` when one is given.
+
+    With a `discovery.Frontier`, topics are taken from it instead of from
+    topic_ids, as discovery fills it; `discover(session, limiter, retry)`
+    runs alongside the workers and must close the frontier when done.
+    """
+    retry = retry or RetryPolicy()
+    queue = asyncio.Queue()
+    for topic_id in topic_ids:
+        queue.put_nowait(topic_id)
+
+    limiter = HostRateLimiter(rps)
+    # Two requests per topic are issued together, so allow twice the topic
+    # concurrency in open connections to the (single) Pantip host.
+    connector = aiohttp.TCPConnector(limit=concurrency * 2, limit_per_host=concurrency * 2)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    stats = {'total': len(topic_ids), 'successful': 0, 'failed': 0}
+
+    async def next_topic():
+        if frontier is not None:
+            topic_id = await frontier.get()
+            stats['total'] += topic_id is not None
+            return topic_id
+        try:
+            return queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+    started = time.perf_counter()
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        # Archive-only runs write no records.
+        with open(output_file, 'a', encoding='utf-8') if parse else contextlib.nullcontext() as out:
+
+            async def worker():
+                while True:
+                    topic_id = await next_topic()
+                    if topic_id is None:
+                        return
+                    if index is not None and index.is_done(topic_id):
+                        continue
+                    result = await scrape_pantip_topic_async(session, limiter, topic_id, base_url, retry, cache,
+                                                             archive, parse, comments_out, window)
+                    if result is True:
+                        stats['successful'] += 1
+                        print(f"✓ Topic {topic_id}: archived")
+                    elif result:
+                        out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                        out.flush()
+                        if index is not None:
+                            index.mark_done(topic_id, out.tell())
+                        stats['successful'] += 1
+                        print(f"✓ Topic {topic_id}: {result['comment_count']} comments")
+                    else:
+                        stats['failed'] += 1
+                        if index is not None:
+                            index.mark_failed(topic_id)
+                        print(f"✗ Failed to scrape topic {topic_id}")
+
+            tasks = [worker() for _ in range(max(1, concurrency))]
+            if discover is not None:
+                tasks.append(discover(session, limiter, retry))
+            await asyncio.gather(*tasks)
+
+    stats['elapsed'] = time.perf_counter() - started
+    stats['topics_per_sec'] = stats['total'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    stats['requests'] = retry.metrics.as_dict()
+    stats['summary'] = retry.metrics.summary()
+    return stats
+
+def run_async_crawl(topic_ids, output_file, concurrency=16, rps=DEFAULT_RPS, base_url=PANTIP_BASE_URL, index=None,
+                    cache=None, archive=None, parse=True, comments_out=None, window=COMMENT_WINDOW):
+    """Synchronous entry point for crawl_topics."""
+    stats = asyncio.run(crawl_topics(topic_ids, output_file, concurrency, rps, base_url, index=index, cache=cache,
+                                     archive=archive, parse=parse, comments_out=comments_out, window=window))
+    print(f"Async crawl: {stats['topics_per_sec']:.2f} topics/sec "
+          f"(concurrency={concurrency}, rps={rps})")
+    print(stats['summary'])
+    return stats
@@ -0,0 +1,239 @@
+"""Follow every comment page and reply batch of a Pantip topic, concurrently.
+
+The first render_comments page says how many comments a topic has and how
+many fit on a page. Each comment carries its first few replies and a
+`reply_count`; the rest come from render_replys, a batch at a time after a
+given reply number. All page numbers and reply offsets are therefore known
+as soon as the first page arrives, so nothing is fetched one request after
+another: pages 2..n are requested in a sliding window of `window` pages,
+and as each page arrives all of its missing reply batches are requested at
+once. A 3000-comment topic (30 pages of 100) is fetched in a few rounds
+of parallel requests instead of one request after another.
+
+Records come out in thread order (each comment followed by its replies,
+page by page; see `comment_record` for the fields), and only the pages in
+the window are held in memory, so `collect_comments` can stream a large
+thread to disk. A page or batch that fails is reported and skipped.
+
+Requests go through a `fetch(url)` function, so the same walk runs live
+(`client_fetcher`, `pantip_async.fetch_api`), recording every response
+for the raw archive, and offline over the archived responses
+(`pantip_scraper.parse_raw_topic`), producing the same records.
+"""
+
+import asyncio
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pantip_scraper import (
+    COMMENT_WINDOW, PANTIP_BASE_URL, REPLIES_PER_BATCH, REPLY_FIELDS, api_headers, comments_url,
+    parse_comment_page, replies_url, thread_records,
+)
+from scraper_common.jsonl_writer import encode_line
+
+# Bytes of a topic's encoded comment records held in memory before they spill to a temporary file.
+SPOOL_BYTES = 1 << 20
+
+def page_count(count, limit):
+    """render_comments pages holding `count` comments, `limit` per page."""
+    return max(1, -(-count // limit))
+
+def reply_batches(item):
+    """The `last` reply numbers of the render_replys batches a comment still needs."""
+    if not item.get('comment_id'):
+        return []
+    inline = len(item.get('replies') or [])
+    return list(range(inline, item.get('reply_count') or 0, REPLIES_PER_BATCH))
+
+def parse_reply_batch(content):
+    """The reply items of a render_replys response."""
+    try:
+        data = REPLY_FIELDS.loads(content)
+        return [reply for reply in data.get('replies', []) if isinstance(reply, dict)]
+    except Exception as e:
+        print(f"Error parsing replies JSON: {e}")
+        return []
+
+def merge_replies(item, known, batch):
+    """Add the replies of a batch that are not already inline or in `known`; returns how many were new."""
+    seen = {reply.get('reply_no') for reply in item.get('replies') or []}
+    seen.update(reply.get('reply_no') for reply in known)
+    added = 0
+    for reply in batch:
+        number = reply.get('reply_no')
+        if number is None or number not in seen:
+            seen.add(number)
+            known.append(reply)
+            added += 1
+    return added
+
+def missing_from(item, known):
+    """The `last` to continue from if replies are still missing (a short batch), else None."""
+    inline = item.get('replies') or []
+    if len(inline) + len(known) >= (item.get('reply_count') or 0):
+        return None
+    numbers = [reply.get('reply_no') for reply in inline + known if isinstance(reply.get('reply_no'), int)]
+    return max(numbers, default=len(inline) + len(known))
+
+def client_fetcher(client, responses=None):
+    """A `fetch(url)` for `iter_comments` on an `HttpClient`: the body of a 200 response, or None.
+
+    With a list as responses, every request is appended to it as
+    (url, status, body), status None when no response arrived.
+    """
+    def fetch(url):
+        try:
+            response = client.get(url, headers=api_headers())
+        except Exception as e:
+            print(f"Error fetching {url}: {e}")
+            if responses is not None:
+                responses.append((url, None, b''))
+            return None
+        if responses is not None:
+            responses.append((url, response.status_code, response.content))
+        if response.status_code != 200:
+            print(f"Failed to fetch {url}: {response.status_code}")
+            return None
+        return response.content
+    return fetch
+
+class _Inline:
+    """Stands in for a ThreadPoolExecutor with window 1: runs each call at once, in the caller's thread."""
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+def iter_comments(fetch, topic_id, first_page, base_url=PANTIP_BASE_URL, window=COMMENT_WINDOW):
+    """Yield the structured records of every comment and reply of a topic, in thread order.
+
+    first_page is the body of the topic's first render_comments page,
+    already fetched; `fetch(url)` (see `client_fetcher`) returns the body of
+    a 200 response or None, and is called from worker threads, `window`
+    pages at a time. With window 1 every request is made in turn from the
+    calling thread.
+    """
+    def fetch_replies(item, last):
+        body = fetch(replies_url(topic_id, item['comment_id'], item.get('comment_no'), last, base_url))
+        return parse_reply_batch(body) if body is not None else []
+
+    def load_page(page, items=None):
+        if items is None:
+            body = fetch(comments_url(topic_id, base_url, page))
+            items = parse_comment_page(body)[0] if body is not None else []
+        # Every missing batch of the page at once, then any shortfall one by one.
+        batches = [[reply_pool.submit(fetch_replies, item, last) for last in reply_batches(item)] for item in items]
+        records = []
+        for item, futures in zip(items, batches):
+            known = []
+            for future in futures:
+                merge_replies(item, known, future.result())
+            while futures and (last := missing_from(item, known)) is not None:
+                if not merge_replies(item, known, fetch_replies(item, last)):
+                    break
+            records.extend(thread_records(topic_id, item, known))
+        return records
+
+    items, count, limit = parse_comment_page(first_page)
+    pages = page_count(count, limit)
+    window = max(1, window)
+    page_pool, reply_pool = (_Inline(), _Inline()) if window == 1 else \
+        (ThreadPoolExecutor(window), ThreadPoolExecutor(window * 4))
+    with page_pool, reply_pool:
+        pending = deque([page_pool.submit(load_page, 1, items)])
+        next_page = 2
+        while pending or next_page <= pages:
+            while next_page <= pages and len(pending) < window:
+                pending.append(page_pool.submit(load_page, next_page))
+                next_page += 1
+            yield from pending.popleft().result()
+
+async def iter_comments_async(fetch, topic_id, first_page, base_url=PANTIP_BASE_URL, window=COMMENT_WINDOW):
+    """Async twin of `iter_comments`: an async generator of the same records.
+
+    `fetch(url)` is a coroutine returning the body of a 200 response, or
+    None for a failed request.
+    """
+    async def fetch_replies(item, last):
+        body = await fetch(replies_url(topic_id, item['comment_id'], item.get('comment_no'), last, base_url))
+        return parse_reply_batch(body) if body is not None else []
+
+    async def load_page(page, items=None):
+        if items is None:
+            body = await fetch(comments_url(topic_id, base_url, page))
+            items = parse_comment_page(body)[0] if body is not None else []
+        batches = await asyncio.gather(*(asyncio.gather(*(fetch_replies(item, last) for last in reply_batches(item)))
+                                         for item in items))
+        records = []
+        for item, results in zip(items, batches):
+            known = []
+            for batch in results:
+                merge_replies(item, known, batch)
+            while results and (last := missing_from(item, known)) is not None:
+                if not merge_replies(item, known, await fetch_replies(item, last)):
+                    break
+            records.extend(thread_records(topic_id, item, known))
+        return records
+
+    items, count, limit = parse_comment_page(first_page)
+    pages = page_count(count, limit)
+    pending = deque([asyncio.ensure_future(load_page(1, items))])
+    next_page = 2
+    try:
+        while pending or next_page <= pages:
+            while next_page <= pages and len(pending) < window:
+                pending.append(asyncio.ensure_future(load_page(next_page)))
+                next_page += 1
+            for record in await pending.popleft():
+                yield record
+    finally:
+        for task in pending:
+            task.cancel()
+
+def collect_comments(records, comments_out=None):
+    """Consume comment records; returns (comment texts, count).
+
+    With a `JsonlWriter` as comments_out the records are written there and
+    the texts are None; the count is of records with a message either way.
+    The records are spooled as they come and written with one
+    `write_from` once the topic is complete, so the comments file never
+    holds part of a topic: a topic retried after a crash does not
+    duplicate the comments that made it to disk.
+    """
+    if comments_out is None:
+        texts = [record['message'] for record in records if record['message']]
+        return texts, len(texts)
+    count = lines = 0
+    with tempfile.SpooledTemporaryFile(SPOOL_BYTES) as spool:
+        for record in records:
+            spool.write(encode_line(record))
+            lines += 1
+            count += bool(record['message'])
+        comments_out.write_from(spool, lines)
+    return None, count
+
+async def collect_comments_async(records, comments_out=None):
+    """`collect_comments` for the records of `iter_comments_async`."""
+    if comments_out is None:
+        texts = [record['message'] async for record in records if record['message']]
+        return texts, len(texts)
+    count = lines = 0
+    with tempfile.SpooledTemporaryFile(SPOOL_BYTES) as spool:
+        async for record in records:
+            spool.write(encode_line(record))
+            lines += 1
+            count += bool(record['message'])
+        # No await from here on: other topics' comments cannot interleave.
+        comments_out.write_from(spool, lines)
+    return None, count
@@ -1,133 +1,472 @@
-import requests
+import argparse
+import itertools
 import json
+import os
 import re
-from bs4 import BeautifulSoup
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scraper_common.fastjson import Projection
+from scraper_common.http_client import DEFAULT_POOL_SIZE, HttpClient
+from scraper_common.rate_limit import AdaptiveRateLimiter, RetryPolicy
+from scraper_common.response_cache import ResponseCache
+from scraper_common.text_cleaning import CleaningEngine, CollapseWhitespace, Regex
+from topic_parser import extract_meta, extract_topic, normalize_utime
+
+PANTIP_BASE_URL = "https://pantip.com"
+
+# Requests per second sent to Pantip, before adapting to 429/503.
+DEFAULT_RPS = 5.0
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+_client = None
+
+def get_client(pool_size=DEFAULT_POOL_SIZE, http2=False, rps=DEFAULT_RPS, cache=None):
+    """Return the shared keep-alive client, creating it on first use.
+
+    The client is paced to `rps` (0 for no limit), slows down when Pantip
+    answers 429/503 and retries those and other transient failures. With a
+    `ResponseCache`, pages already fetched are served from disk.
+    """
+    global _client
+    if _client is None:
+        _client = HttpClient(headers=HEADERS, pool_size=pool_size, http2=http2,
+                             limiter=AdaptiveRateLimiter(rps), retry=RetryPolicy(), cache=cache)
+    return _client
+
+def open_cache(directory, max_mb=1024, max_age_hours=None, replay=False):
+    """A response cache in directory, or None when no directory is given."""
+    if not directory:
+        if replay:
+            raise SystemExit("--replay needs --cache DIR")
+        return None
+    return ResponseCache(directory, max_bytes=int(max_mb * 1024 * 1024) if max_mb else None,
+                         max_age=max_age_hours * 3600 if max_age_hours else None, replay=replay)
+
+# Remove extra whitespace and newlines
+text_cleaner = CleaningEngine([CollapseWhitespace()])
+
+comment_cleaner = CleaningEngine([
+    # Remove HTML tags like <br />
+    Regex(r'<[^>]+>', repl=' ', guard='<'),
+    CollapseWhitespace(),
+])
 
 def clean_text(text):
     if not text:
         return ""
-    # Remove extra whitespace and newlines
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+    return text_cleaner.clean(text)
 
 def extract_comment_text(item):
     if not isinstance(item, dict):
         return None
     msg = item.get('message', '')
-    # Remove HTML tags like <br />
-    msg = re.sub(r'<[^>]+>', ' ', msg)
-    return clean_text(msg)
+    return comment_cleaner.clean(msg)
+
+def topic_url(topic_id, base_url=PANTIP_BASE_URL):
+    return f"{base_url}/topic/{topic_id}"
+
+def comments_url(topic_id, base_url=PANTIP_BASE_URL, page=1):
+    url = f"{base_url}/forum/topic/render_comments?tid={topic_id}"
+    return url if page == 1 else f"{url}&param=page{page}"
+
+def replies_url(topic_id, comment_id, comment_no, last, base_url=PANTIP_BASE_URL):
+    """A render_replys batch: the replies to a comment after reply number `last`."""
+    return f"{base_url}/forum/topic/render_replys?tid={topic_id}&cid={comment_id}&c={comment_no}&last={last}"
 
-def scrape_pantip_topic(topic_id):
-    url = f"https://pantip.com/topic/{topic_id}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+def api_headers():
+    headers = HEADERS.copy()
+    headers['X-Requested-With'] = 'XMLHttpRequest'
+    return headers
+
+def parse_topic_page(html):
+    """Extract the cleaned (title, summary) pair from a topic page, reading only its <head>."""
+    title, summary = extract_meta(html)
+    return clean_text(title), clean_text(summary)
+
+def clean_topic(page):
+    """Clean the raw fields extracted by topic_parser.py."""
+    return {
+        'title': clean_text(page['title']),
+        'summary': clean_text(page['summary']),
+        'body': clean_text(page['body']),
+        'author': clean_text(page['author']) or None,
+        'author_id': page['author_id'],
+        'created_at': page['created_at'],
+        'tags': [tag for tag in map(clean_text, page['tags']) if tag],
     }
-    
+
+def parse_topic_details(html):
+    """Cleaned title, summary, post body, author, author ID, timestamp and tags of a topic page.
+
+    Uses the streaming extractor in topic_parser.py, which stops after the
+    main post and falls back to a full BeautifulSoup parse on unexpected
+    layouts.
+    """
+    return clean_topic(extract_topic(html))
+
+# The render_comments and render_replys fields the comment parsers read;
+# the rest of each comment (avatars, emotion breakdown, photos, ...) is not
+# decoded.
+COMMENT_ITEM_FIELDS = ('comment_id', 'comment_no', 'reply_id', 'reply_no', 'message', 'user.mid', 'user.name',
+                       'created_time', 'point', 'emo_score', 'reply_count')
+COMMENT_FIELDS = Projection(['count', 'paging.limit']
+                            + [f'comments[*].{field}' for field in COMMENT_ITEM_FIELDS]
+                            + [f'comments[*].replies[*].{field}' for field in COMMENT_ITEM_FIELDS])
+REPLY_FIELDS = Projection(['count'] + [f'replies[*].{field}' for field in COMMENT_ITEM_FIELDS])
+
+# Page sizes assumed when a response does not state them.
+COMMENTS_PER_PAGE = 100
+REPLIES_PER_BATCH = 20
+# render_comments pages of one topic in flight at once.
+COMMENT_WINDOW = 8
+
+def parse_comment_page(content):
+    """Decode a render_comments page into (comment items, total comments in the topic, page size)."""
+    try:
+        # The response starts with a UTF-8 BOM, which fastjson strips
+        data = COMMENT_FIELDS.loads(content)
+        items = [item for item in data.get('comments', []) if isinstance(item, dict)]
+        limit = (data.get('paging') or {}).get('limit') or COMMENTS_PER_PAGE
+        return items, data.get('count') or len(items), limit
+    except Exception as e:
+        print(f"Error parsing comments JSON: {e}")
+        return [], 0, COMMENTS_PER_PAGE
+
+def comment_record(topic_id, item, parent=None):
+    """One structured comment, or a reply to the comment record `parent`."""
+    user = item.get('user') if isinstance(item.get('user'), dict) else {}
+    created = item.get('created_time')
+    if parent is None:
+        item_id = item.get('comment_id') or f"{topic_id}-{item.get('comment_no')}"
+    else:
+        item_id = item.get('reply_id') or f"{parent['id']}-{item.get('reply_no')}"
+    return {
+        'topic_id': topic_id,
+        'id': str(item_id),
+        'reply_to': parent['id'] if parent else None,
+        'comment_no': parent['comment_no'] if parent else item.get('comment_no'),
+        'reply_no': item.get('reply_no') if parent else None,
+        'author': user.get('name'),
+        'author_id': str(user['mid']) if user.get('mid') is not None else None,
+        'created_at': normalize_utime(created) if created else None,
+        'points': item.get('point', 0),
+        'emotion_score': item.get('emo_score', 0),
+        'reply_count': None if parent else item.get('reply_count', 0),
+        'message': extract_comment_text(item),
+    }
+
+def thread_records(topic_id, item, extra_replies=()):
+    """A comment's record followed by its replies' (inline ones, then `extra_replies`)."""
+    comment = comment_record(topic_id, item)
+    yield comment
+    for reply in itertools.chain(item.get('replies') or (), extra_replies):
+        if isinstance(reply, dict):
+            yield comment_record(topic_id, reply, comment)
+
+def parse_comments(content):
+    """Flatten one render_comments page into a list of comment texts, each comment followed by its replies."""
+    texts = []
+    for item in parse_comment_page(content)[0]:
+        for entry in itertools.chain((item,), item.get('replies') or ()):
+            text = extract_comment_text(entry)
+            if text:
+                texts.append(text)
+    return texts
+
+def build_record(topic_id, page, comments, comment_count=None):
+    """A dataset record from `parse_topic_details` output and the comment texts.
+
+    comments=None leaves the texts out (they were streamed to a separate
+    comments file); `comment_count` then says how many there were.
+    """
+    record = {
+        'topic_id': topic_id,
+        **page,
+    }
+    if comments is not None:
+        record['comments'] = comments
+    record['comment_count'] = len(comments) if comment_count is None else comment_count
+    return record
+
+def parse_raw_topic(topic_id, body, comments_status, comments_body, responses=(), comments_out=None):
+    """Build the dataset record from a topic page and its comment responses as fetched (bytes).
+
+    Stage 2 of the pipeline: it needs nothing but the raw responses, so it
+    runs the same on a live fetch and on a raw archive (see reparse.py).
+    responses are the archived (request path, status, body) of the later
+    comment pages and reply batches; the comment walk of `iter_comments`
+    is replayed over them, so the comments (and `comments_out` records) are
+    those of the live scrape. Archives written before these were kept
+    yield the first comment page and its inline replies.
+    """
+    from pantip_comments import collect_comments, iter_comments
+
+    page = parse_topic_details(body.decode('utf-8', errors='replace'))
+    records = ()
+    if comments_status == 200:
+        archived = {path: response_body for path, status, response_body in responses if status == 200}
+        records = iter_comments(archived.get, topic_id, comments_body, '', window=1)
+    comments, count = collect_comments(records, comments_out)
+    return build_record(topic_id, page, comments, count)
+
+def scrape_pantip_topic(topic_id, base_url=PANTIP_BASE_URL, client=None, archive=None, parse=True,
+                        comments_out=None, window=COMMENT_WINDOW):
+    """Fetch a topic and all of its comments and return the record, or None if the topic page failed.
+
+    Every comment page and reply batch is followed (see pantip_comments.py).
+    With a `JsonlWriter` as comments_out, the structured comment records are
+    written there and the record only keeps their count. With a
+    `RawArchive`, the topic page and every comment response are appended to
+    it, unless a comment request failed: an archived topic must reparse to
+    the same record. With parse=False the comments are still followed, to
+    archive them, but nothing is parsed, and True is returned for an
+    archived topic, None for one to retry.
+    """
+    from pantip_comments import client_fetcher, collect_comments, iter_comments
+
+    client = client or get_client()
     print(f"Fetching topic {topic_id}...")
-    response = requests.get(url, headers=headers)
-    response.encoding = 'utf-8' # Force UTF-8
+    response = client.get(topic_url(topic_id, base_url))
     if response.status_code != 200:
         print(f"Failed to fetch topic: {response.status_code}")
         return None
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    # Extract title and summary from meta tags (cleaner than HTML)
-    title = soup.find('meta', property='og:title')
-    title = title['content'] if title else ""
-    
-    summary = soup.find('meta', property='og:description')
-    summary = summary['content'] if summary else ""
-    
-    # Clean title and summary
-    title = clean_text(title)
-    summary = clean_text(summary)
-    
     # Fetch comments
-    comments_url = f"https://pantip.com/forum/topic/render_comments?tid={topic_id}"
-    api_headers = headers.copy()
-    api_headers['X-Requested-With'] = 'XMLHttpRequest'
-    
     print(f"Fetching comments for topic {topic_id}...")
-    comments_response = requests.get(comments_url, headers=api_headers)
-    
-    all_comments = []
-    if comments_response.status_code == 200:
-        try:
-            # Handle UTF-8 BOM
-            content = comments_response.content.decode('utf-8-sig')
-            data = json.loads(content)
-            comment_list = data.get('comments', [])
-            for item in comment_list:
-                # Main comment
-                text = extract_comment_text(item)
-                if text:
-                    all_comments.append(text)
-                
-                # Replies
-                replies = item.get('replies', [])
-                for reply in replies:
-                    reply_text = extract_comment_text(reply)
-                    if reply_text:
-                        all_comments.append(reply_text)
-        except Exception as e:
-            print(f"Error parsing comments JSON: {e}")
-    else:
+    comments_response = client.get(comments_url(topic_id, base_url), headers=api_headers())
+    comments_ok = comments_response.status_code == 200
+    if not comments_ok:
         print(f"Failed to fetch comments: {comments_response.status_code}")
 
-    return {
-        'topic_id': topic_id,
-        'title': title,
-        'summary': summary,
-        'comments': all_comments
-    }
+    responses = [] if archive is not None else None
+    comments, count = ([] if comments_out is None else None), 0
+    if comments_ok:
+        records = iter_comments(client_fetcher(client, responses), topic_id, comments_response.content, base_url,
+                                window)
+        if parse:
+            comments, count = collect_comments(records, comments_out)
+        else:
+            for _ in records:
+                pass
+        comments_ok = all(status == 200 for _, status, _ in responses or ())
+    if archive is not None:
+        if comments_ok:
+            archive.append(topic_id, response.status_code, response.content,
+                           comments_response.status_code, comments_response.content, responses)
+        else:
+            print(f"Not archiving topic {topic_id}: a comment request failed")
+    if not parse:
+        return True if comments_ok else None
+    page = parse_topic_details(response.content.decode('utf-8', errors='replace'))
+    return build_record(topic_id, page, comments, count)
 
-if __name__ == "__main__":
-    # Read topic URLs from list.txt
-    try:
-        with open('list.txt', 'r', encoding='utf-8') as f:
-            urls = [line.strip() for line in f if line.strip()]
-    except FileNotFoundError:
-        print("Error: list.txt not found")
-        exit(1)
+def read_topic_ids(list_file):
+    """Read topic URLs from list_file and return their numeric topic IDs."""
+    with open(list_file, 'r', encoding='utf-8') as f:
+        urls = [line.strip() for line in f if line.strip()]
     
     # Extract topic IDs from URLs
     topic_ids = []
     for url in urls:
         # Extract topic ID from URL like https://pantip.com/topic/43899619
-        import re
         match = re.search(r'/topic/(\d+)', url)
         if match:
             topic_ids.append(match.group(1))
         else:
             print(f"Warning: Could not extract topic ID from {url}")
-    
-    if not topic_ids:
-        print("No valid topic IDs found in list.txt")
-        exit(1)
-    
-    output_file = "data/pantip_dataset.jsonl"
-    
-    # Scrape each topic and append to file
+    return topic_ids
+
+def scrape_topics(topic_ids, output_file, base_url=PANTIP_BASE_URL, client=None, index=None, archive=None,
+                  parse=True, comments_out=None, window=COMMENT_WINDOW):
+    """Scrape topics one at a time, appending each record to output_file.
+
+    When a resume index is given, finished topics are skipped before any
+    request is sent and each outcome is recorded in the index. Raw responses
+    go to `archive` when one is given; with parse=False only the archive is
+    written. Structured comments go to `comments_out` when one is given.
+    """
     total_topics = len(topic_ids)
     successful = 0
     
     for i, topic_id in enumerate(topic_ids, 1):
+        if index is not None and index.is_done(topic_id):
+            continue
         print(f"\n[{i}/{total_topics}] Scraping topic {topic_id}...")
-        result = scrape_pantip_topic(topic_id)
+        result = scrape_pantip_topic(topic_id, base_url, client, archive, parse, comments_out, window)
         
-        if result:
+        if result is True:
+            successful += 1
+            print(f"✓ Topic {topic_id}: archived")
+        elif result:
             with open(output_file, 'a', encoding='utf-8') as f:
                 f.write(json.dumps(result, ensure_ascii=False) + '\n')
+                f.flush()
+                if index is not None:
+                    index.mark_done(topic_id, f.tell())
             successful += 1
-            print(f"✓ Topic {topic_id}: {len(result['comments'])} comments")
+            print(f"✓ Topic {topic_id}: {result['comment_count']} comments")
         else:
+            if index is not None:
+                index.mark_failed(topic_id)
             print(f"✗ Failed to scrape topic {topic_id}")
+    return successful
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape Pantip topics listed in list.txt")
+    parser.add_argument('--list', default='list.txt', help="file with one topic URL per line")
+    parser.add_argument('--output', default='data/pantip_dataset.jsonl', help="JSONL file to append records to")
+    parser.add_argument('--base-url', default=PANTIP_BASE_URL,
+                        help="site root, e.g. a local stub server for testing")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="fetch many topics concurrently with asyncio")
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help="maximum topics in flight in async mode (default 16)")
+    parser.add_argument('--rps', type=float, default=DEFAULT_RPS,
+                        help=f"per-host requests per second, lowered automatically on 429/503, "
+                             f"0 disables (default {DEFAULT_RPS:g})")
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"keep-alive connections per host (default {DEFAULT_POOL_SIZE})")
+    parser.add_argument('--http2', action='store_true',
+                        help="use HTTP/2 when httpx[http2] is installed")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip topics already recorded in the resume index and record new ones")
+    parser.add_argument('--index', default=None,
+                        help="resume index path (default: <output>.index.sqlite)")
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help="rebuild the resume index from the existing output file first")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="with --resume, retry topics that failed in earlier runs")
+    parser.add_argument('--cache', default=None, metavar='DIR',
+                        help="keep fetched pages in an on-disk response cache in DIR and reuse them on re-runs")
+    parser.add_argument('--cache-max-mb', type=float, default=1024,
+                        help="evict least recently used cache entries beyond this size (default 1024)")
+    parser.add_argument('--cache-max-age', type=float, default=None, metavar='HOURS',
+                        help="revalidate cached pages older than this (default: never expire)")
+    parser.add_argument('--replay', action='store_true',
+                        help="serve only from --cache, never touching the network (misses fail)")
+    parser.add_argument('--archive', default=None, metavar='PATH',
+                        help="append the raw topic pages and comment responses to this archive (see reparse.py)")
+    parser.add_argument('--fetch-only', action='store_true',
+                        help="with --archive, only archive the raw responses and skip topics already archived; "
+                             "parse later with reparse.py")
+    parser.add_argument('--comments-output', default=None, metavar='FILE',
+                        help="append structured, threaded comment records (IDs, authors, timestamps, votes) "
+                             "to this JSONL file instead of keeping comment texts in the topic records")
+    parser.add_argument('--comment-window', type=int, default=COMMENT_WINDOW,
+                        help=f"comment pages of a topic fetched at once; 1 makes one request at a time "
+                             f"(default {COMMENT_WINDOW})")
+    parser.add_argument('--discover', action='append', default=[], metavar='SOURCE',
+                        help="also scrape topics found in room:NAME, tag:NAME or range:FIRST-LAST, newest first, "
+                             "while they are being discovered (repeatable; implies --async)")
+    parser.add_argument('--discover-pages', type=int, default=10,
+                        help="listing pages read per room or tag (default 10)")
+    parser.add_argument('--max-topics', type=int, default=None,
+                        help="with --discover, stop after queueing this many topics")
+    args = parser.parse_args()
+    if args.fetch_only and not args.archive:
+        parser.error("--fetch-only needs --archive PATH")
+    if args.fetch_only and args.resume:
+        parser.error("--fetch-only resumes from the archive itself; drop --resume")
+    if args.discover:
+        from discovery import parse_source
+        for spec in args.discover:
+            try:
+                parse_source(spec)
+            except ValueError as e:
+                parser.error(str(e))
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Read topic URLs from list.txt; with --discover it only adds seeds
+    try:
+        topic_ids = read_topic_ids(args.list)
+    except FileNotFoundError:
+        if not args.discover:
+            print(f"Error: {args.list} not found")
+            exit(1)
+        topic_ids = []
+    
+    if not topic_ids and not args.discover:
+        print(f"No valid topic IDs found in {args.list}")
+        exit(1)
+    
+    output_file = args.output
+    
+    index = None
+    if args.resume:
+        from resume_index import open_index, pending_topic_ids
+        index = open_index(output_file, args.index, args.rebuild_index)
+        remaining = pending_topic_ids(topic_ids, index, args.retry_failed)
+        print(f"Resuming: skipping {len(topic_ids) - len(remaining)} finished or duplicate topics, {len(remaining)} remaining")
+        topic_ids = remaining
+    
+    archive = None
+    if args.archive:
+        from raw_archive import RawArchive
+        os.makedirs(os.path.dirname(args.archive) or '.', exist_ok=True)
+        archive = RawArchive(args.archive)
+        if archive.recovered:
+            print(f"Indexed {archive.recovered} archived topics written after the last index commit")
+        if args.fetch_only:
+            remaining = [topic_id for topic_id in dict.fromkeys(topic_ids) if topic_id not in archive]
+            print(f"Fetch only: skipping {len(topic_ids) - len(remaining)} archived or duplicate topics, "
+                  f"{len(remaining)} remaining")
+            topic_ids = remaining
+    
+    total_topics = len(topic_ids)
+    cache = open_cache(args.cache, args.cache_max_mb, args.cache_max_age, args.replay)
+    parse = not args.fetch_only
+    comments_out = None
+    if args.comments_output and parse:
+        from scraper_common.jsonl_writer import JsonlWriter
+        os.makedirs(os.path.dirname(args.comments_output) or '.', exist_ok=True)
+        comments_out = JsonlWriter(args.comments_output, mode='a')
+    
+    try:
+        if args.discover:
+            from discovery import run_discovery_crawl
+            stats = run_discovery_crawl(args.discover, output_file, topic_ids, concurrency=args.concurrency,
+                                        rps=args.rps, base_url=args.base_url, max_pages=args.discover_pages,
+                                        max_topics=args.max_topics, index=index, retry_failed=args.retry_failed,
+                                        cache=cache, archive=archive, parse=parse, comments_out=comments_out,
+                                        window=args.comment_window)
+            successful = stats['successful']
+            total_topics = stats['total']
+        elif args.use_async:
+            from pantip_async import run_async_crawl
+            stats = run_async_crawl(topic_ids, output_file,
+                                    concurrency=args.concurrency, rps=args.rps,
+                                    base_url=args.base_url, index=index, cache=cache,
+                                    archive=archive, parse=parse, comments_out=comments_out,
+                                    window=args.comment_window)
+            successful = stats['successful']
+        else:
+            client = get_client(args.pool_size, args.http2, args.rps, cache)
+            successful = scrape_topics(topic_ids, output_file, args.base_url, client, index, archive, parse,
+                                       comments_out, args.comment_window)
+            print(client.stats.summary())
+            print(client.metrics.summary())
+        if cache is not None:
+            print(cache.summary())
+    finally:
+        if index is not None:
+            index.close()
+        if cache is not None:
+            cache.close()
+        if archive is not None:
+            archive.close()
+        if comments_out is not None:
+            comments_out.close()
     
     print(f"\n{'='*50}")
     print(f"Scraping completed!")
     print(f"Total topics processed: {total_topics}")
     print(f"Successful: {successful}")
     print(f"Failed: {total_topics - successful}")
-    print(f"Data saved to {output_file}")
+    print(f"Data saved to {args.archive if args.fetch_only else output_file}")
@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Every record is one frame: magic, codec, compressed length, CRC-32 of the
+# compressed bytes, then the compressed payload. The payload is a JSON header
+# line followed by the raw topic page and first render_comments bodies, then
+# the bodies of the header's `responses` (further comment pages and reply
+# batches) in order. Frames written before `responses` existed end with the
+# first render_comments body.
+FRAME = struct.Struct('<4sBII')
+MAGIC = b'PRAW'
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+class RawRecord:
+    """One archived fetch: the topic page and comment responses exactly as received.
+
+    `responses` holds the later comment pages and reply batches as
+    (request path, status, body) tuples, e.g.
+    ('/forum/topic/render_comments?tid=1&param=page2', 200, b'{...}').
+    """
+
+    __slots__ = ('topic_id', 'fetched_at', 'status', 'body', 'comments_status', 'comments_body', 'responses')
+
+    def __init__(self, topic_id, fetched_at, status, body, comments_status, comments_body, responses=()):
+        self.topic_id = topic_id
+        self.fetched_at = fetched_at
+        self.status = status
+        self.body = body
+        self.comments_status = comments_status
+        self.comments_body = comments_body
+        self.responses = responses
+
+def request_path(url):
+    """The path and query of url, the key a response is archived under."""
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+def _compress(codec, payload):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(payload)
+    return zlib.compress(payload, 6)
+
+def decode_frame(codec, data):
+    """Decompress and split a frame's payload into a `RawRecord`."""
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ImportError("this archive was written with zstd: pip install zstandard")
+        payload = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        payload = zlib.decompress(data)
+    end = payload.index(b'\n')
+    header = json.loads(payload[:end])
+    body_end = end + 1 + header['body_length']
+    if 'comments_length' not in header:
+        return RawRecord(header['topic_id'], header['fetched_at'], header['status'], payload[end + 1:body_end],
+                         header['comments_status'], payload[body_end:])
+    offset = body_end + header['comments_length']
+    responses = []
+    for path, status, length in header['responses']:
+        responses.append((path, status, payload[offset:offset + length]))
+        offset += length
+    return RawRecord(header['topic_id'], header['fetched_at'], header['status'], payload[end + 1:body_end],
+                     header['comments_status'], payload[body_end:body_end + header['comments_length']], responses)
+
+def read_frame(f):
+    """Read the frame at f's position; returns (codec, compressed bytes) or None at the end or a torn frame."""
+    head = f.read(FRAME.size)
+    if len(head) < FRAME.size:
+        return None
+    magic, codec, length, crc = FRAME.unpack(head)
+    if magic != MAGIC:
+        return None
+    data = f.read(length)
+    if len(data) < length or zlib.crc32(data) != crc:
+        return None
+    return codec, data
+
+class RawArchive:
+    """Append-only archive of raw Pantip responses with an offset index.
+
+    Stage 1 of the two-stage pipeline: the crawler appends what it fetched
+    and nothing is parsed, so parsing and cleaning can be re-run later from
+    the archive (see reparse.py) without touching the network. Each record
+    is an independently compressed frame (zstd when installed, zlib
+    otherwise), so a reader can start at any frame offset.
+
+    A SQLite index next to the archive maps each topic ID to the offset of
+    its latest frame. It is committed every `flush_every` records together
+    with the archive size it covers; frames written after that are
+    re-indexed on the next open, and a frame torn by a crash is truncated.
+    """
+
+    def __init__(self, path, index_path=None, flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        self._pending = {}
+        self._end = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_path or path + '.index.sqlite', check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS records "
+                           "(topic_id TEXT PRIMARY KEY, offset INTEGER NOT NULL, fetched_at REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self.recovered = self._recover()
+        self._file = open(path, 'ab')
+
+    @property
+    def committed_size(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'archive_size'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _recover(self):
+        """Index frames written after the last commit and cut off a torn tail; returns frames adopted."""
+        if not os.path.exists(self.path):
+            return 0
+        adopted = 0
+        with open(self.path, 'rb+') as f:
+            offset = min(self.committed_size, os.path.getsize(self.path))
+            f.seek(offset)
+            while True:
+                frame = read_frame(f)
+                if frame is None:
+                    break
+                record = decode_frame(*frame)
+                self._pending[record.topic_id] = (offset, record.fetched_at)
+                offset = f.tell()
+                adopted += 1
+            f.truncate(offset)
+        self._end = offset
+        self.flush()
+        return adopted
+
+    def append(self, topic_id, status, body, comments_status=None, comments_body=b'', responses=()):
+        """Store one topic's raw responses; returns the frame's offset.
+
+        responses are (url, status, body) tuples of the requests made after
+        the first comment page; they are stored under `request_path(url)`.
+        """
+        fetched_at = time.time()
+        comments_body = comments_body or b''
+        header = json.dumps({'topic_id': str(topic_id), 'fetched_at': fetched_at, 'status': status,
+                             'comments_status': comments_status, 'body_length': len(body),
+                             'comments_length': len(comments_body),
+                             'responses': [[request_path(url), response_status, len(response_body)]
+                                           for url, response_status, response_body in responses]})
+        data = _compress(self.codec, b''.join((header.encode('utf-8'), b'\n', body, comments_body,
+                                               *(response_body for _, _, response_body in responses))))
+        frame = FRAME.pack(MAGIC, self.codec, len(data), zlib.crc32(data)) + data
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(frame)
+            self._pending[str(topic_id)] = (offset, fetched_at)
+            self._end = offset + len(frame)
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+        return offset
+
+    def _flush(self):
+        if not self._pending and self._end is None:
+            return
+        # The frames must be on disk before the index says they are.
+        if self._file is not None:
+            self._file.flush()
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO records (topic_id, offset, fetched_at) VALUES (?, ?, ?)",
+                                   ((topic_id, offset, fetched_at)
+                                    for topic_id, (offset, fetched_at) in self._pending.items()))
+            if self._end is not None:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('archive_size', ?)",
+                                   (str(self._end),))
+        self._pending.clear()
+        self._end = None
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def __contains__(self, topic_id):
+        with self._lock:
+            if str(topic_id) in self._pending:
+                return True
+            row = self._conn.execute("SELECT 1 FROM records WHERE topic_id = ?", (str(topic_id),)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        self.flush()
+        return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def topic_ids(self):
+        """IDs of every archived topic."""
+        self.flush()
+        return [topic_id for topic_id, in self._conn.execute("SELECT topic_id FROM records")]
+
+    def offsets(self):
+        """Offsets of the latest frame of every topic, in archive order."""
+        self.flush()
+        return [offset for offset, in self._conn.execute("SELECT offset FROM records ORDER BY offset")]
+
+    def get(self, topic_id):
+        """The latest `RawRecord` of topic_id, or None."""
+        self.flush()
+        row = self._conn.execute("SELECT offset FROM records WHERE topic_id = ?", (str(topic_id),)).fetchone()
+        if row is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(row[0])
+            return decode_frame(*read_frame(f))
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            self._flush()
+            self._file.close()
+            self._file = None
+        self._conn.close()
+
+def iter_frames(path, offsets=None):
+    """Yield (codec, compressed bytes) for the frames at offsets (all frames, in order, by default)."""
+    with open(path, 'rb') as f:
+        if offsets is None:
+            while True:
+                frame = read_frame(f)
+                if frame is None:
+                    return
+                yield frame
+        for offset in offsets:
+            f.seek(offset)
+            frame = read_frame(f)
+            if frame is not None:
+                yield frame
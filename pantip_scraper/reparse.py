@@ -0,0 +1,127 @@
+"""Stage 2: parse a raw archive into dataset records on every core.
+
+Usage:
+    python pantip_scraper.py --async --archive data/pantip_raw.arc --fetch-only
+    python reparse.py data/pantip_raw.arc --output data/pantip_dataset.jsonl [--workers N]
+        [--comments-output data/pantip_comments.jsonl]
+
+The crawler's --archive option keeps the topic pages and every comment page
+and reply batch exactly as fetched, so a change to parsing or cleaning only
+needs this script, not another crawl, and gives the records a live scrape
+would. The parent process reads compressed frames in archive order and
+hands them to a multiprocessing pool in batches; each worker decompresses,
+parses and serializes its batch, and the records are written in archive
+order. Only the latest fetch of each topic is parsed.
+"""
+
+import argparse
+import functools
+import json
+import os
+import time
+from multiprocessing import Pool
+
+from pantip_scraper import parse_raw_topic
+from raw_archive import RawArchive, decode_frame, iter_frames
+
+class CommentLines:
+    """Collects the encoded comment records of `collect_comments`, in place of the crawler's `JsonlWriter`."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write_from(self, f, records):
+        f.seek(0)
+        self.lines.append(f.read().decode('utf-8'))
+
+def parse_frames(frames, comments=False):
+    """Parse a batch of (codec, compressed bytes) frames; returns (JSONL text, comments JSONL text, records, skipped).
+
+    With comments=True the structured comment records are serialized too,
+    and the topic records leave the comment texts out, as with the crawler's
+    --comments-output.
+    """
+    lines = []
+    comments_out = CommentLines() if comments else None
+    skipped = 0
+    for frame in frames:
+        raw = decode_frame(*frame)
+        if raw.status != 200:
+            skipped += 1
+            continue
+        record = parse_raw_topic(raw.topic_id, raw.body, raw.comments_status, raw.comments_body, raw.responses,
+                                 comments_out)
+        lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+    return ''.join(lines), ''.join(comments_out.lines) if comments else '', len(lines), skipped
+
+def batches(archive_path, offsets, batch_size):
+    batch = []
+    for frame in iter_frames(archive_path, offsets):
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def reparse(archive_path, output_file, workers=None, batch_size=64, comments_file=None):
+    """Parse every archived topic into output_file (overwritten); returns stats.
+
+    workers=1 parses in this process; otherwise a pool of `workers`
+    processes (default: one per core) is used. With comments_file, the
+    structured comment records are written there (overwritten).
+    """
+    archive = RawArchive(archive_path)
+    try:
+        offsets = archive.offsets()
+    finally:
+        archive.close()
+    workers = workers or os.cpu_count() or 1
+    stats = {'records': 0, 'skipped': 0, 'workers': workers}
+    started = time.perf_counter()
+    parse = functools.partial(parse_frames, comments=comments_file is not None)
+    with open(output_file, 'w', encoding='utf-8') as out, \
+            open(comments_file or os.devnull, 'w', encoding='utf-8') as comments_out:
+        frames = batches(archive_path, offsets, batch_size)
+        if workers == 1:
+            results = map(parse, frames)
+            pool = None
+        else:
+            pool = Pool(workers)
+            results = pool.imap(parse, frames)
+        try:
+            for text, comments_text, records, skipped in results:
+                out.write(text)
+                comments_out.write(comments_text)
+                stats['records'] += records
+                stats['skipped'] += skipped
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    stats['elapsed'] = time.perf_counter() - started
+    stats['topics_per_sec'] = stats['records'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parse a raw Pantip archive into dataset records")
+    parser.add_argument('archive', help="archive written by pantip_scraper.py --archive")
+    parser.add_argument('--output', default='data/pantip_dataset.jsonl', help="JSONL file to write (overwritten)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="parser processes (default: one per core; 1 parses in this process)")
+    parser.add_argument('--batch-size', type=int, default=64, help="topics per batch sent to a worker (default 64)")
+    parser.add_argument('--comments-output', metavar='FILE', default=None,
+                        help="also write one structured record per comment and reply to this JSONL file "
+                             "(overwritten); topic records then only keep comment_count")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    for path in (args.output, args.comments_output):
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    stats = reparse(args.archive, args.output, args.workers, args.batch_size, args.comments_output)
+    print(f"Parsed {stats['records']} topics in {stats['elapsed']:.1f}s "
+          f"({stats['topics_per_sec']:.0f} topics/sec, {stats['workers']} workers)"
+          + (f"; skipped {stats['skipped']} failed fetches" if stats['skipped'] else ""))
+    print(f"Data saved to {args.output}" + (f", comments to {args.comments_output}" if args.comments_output else ""))
@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+
+class TopicIndex:
+    """On-disk record of finished topic IDs used to resume an interrupted crawl.
+
+    The IDs live in a small SQLite database next to the output file and are
+    mirrored in two in-memory sets, so `should_skip` is an O(1) lookup that
+    never touches disk. Updates are buffered and committed every
+    `flush_every` topics in one transaction together with the byte offset of
+    the output file they cover, so the index and the JSONL never disagree by
+    more than the records written since the last commit. Those records are
+    re-adopted from the JSONL tail on the next start (see `recover_output`).
+    """
+
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, path, flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self.done = set()
+        self.failed = set()
+        self._pending = {}
+        self._output_offset = None
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS topics (topic_id INTEGER PRIMARY KEY, status TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        for topic_id, status in self._conn.execute("SELECT topic_id, status FROM topics"):
+            (self.done if status == self.DONE else self.failed).add(topic_id)
+
+    def __len__(self):
+        return len(self.done) + len(self.failed)
+
+    @property
+    def committed_offset(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'output_offset'").fetchone()
+        return int(row[0]) if row else 0
+
+    def is_done(self, topic_id):
+        return int(topic_id) in self.done
+
+    def should_skip(self, topic_id, retry_failed=False):
+        topic_id = int(topic_id)
+        return topic_id in self.done or (not retry_failed and topic_id in self.failed)
+
+    def mark_done(self, topic_id, output_offset):
+        """Record that topic_id's line ends at output_offset in the output file."""
+        topic_id = int(topic_id)
+        self.done.add(topic_id)
+        self.failed.discard(topic_id)
+        self._pending[topic_id] = self.DONE
+        self._output_offset = output_offset
+        self._maybe_flush()
+
+    def mark_failed(self, topic_id):
+        topic_id = int(topic_id)
+        if topic_id in self.done:
+            return
+        self.failed.add(topic_id)
+        self._pending[topic_id] = self.FAILED
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Commit buffered updates and the output offset in one transaction."""
+        if not self._pending and self._output_offset is None:
+            return
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO topics (topic_id, status) VALUES (?, ?)",
+                                   self._pending.items())
+            if self._output_offset is not None:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('output_offset', ?)",
+                                   (str(self._output_offset),))
+        self._pending.clear()
+        self._output_offset = None
+
+    def recover_output(self, output_file):
+        """Reconcile the index with records written after its last commit.
+
+        Complete lines past the committed offset are adopted as done; a
+        trailing line without its newline, left by a crash mid-write, is
+        truncated away.
+        Returns the number of adopted records.
+        """
+        if not os.path.exists(output_file):
+            return 0
+        adopted = self._scan(output_file, self.committed_offset)
+        self.flush()
+        return adopted
+
+    def rebuild_from_jsonl(self, output_file):
+        """Recreate the index from scratch by reading every record in output_file."""
+        with self._conn:
+            self._conn.execute("DELETE FROM topics")
+            self._conn.execute("DELETE FROM meta")
+        self.done.clear()
+        self.failed.clear()
+        self._pending.clear()
+        adopted = self._scan(output_file, 0) if os.path.exists(output_file) else 0
+        self.flush()
+        return adopted
+
+    def _scan(self, output_file, offset):
+        adopted = 0
+        with open(output_file, 'rb+') as f:
+            f.seek(offset)
+            good_end = offset
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                good_end += len(line)
+                try:
+                    topic_id = json.loads(line)['topic_id']
+                except (ValueError, KeyError, TypeError):
+                    continue
+                self.mark_done(topic_id, good_end)
+                adopted += 1
+            f.seek(0, os.SEEK_END)
+            if f.tell() > good_end:
+                f.truncate(good_end)
+        self._output_offset = good_end
+        return adopted
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+def open_index(output_file, index_path=None, rebuild=False):
+    """Open the resume index for output_file, building it from the JSONL when needed."""
+    index_path = index_path or output_file + '.index.sqlite'
+    needs_rebuild = rebuild or not os.path.exists(index_path)
+    index = TopicIndex(index_path)
+    if needs_rebuild:
+        adopted = index.rebuild_from_jsonl(output_file)
+        print(f"Built resume index {index_path} from {adopted} existing records")
+    else:
+        adopted = index.recover_output(output_file)
+        if adopted:
+            print(f"Recovered {adopted} records written after the last index commit")
+    return index
+
+def pending_topic_ids(topic_ids, index, retry_failed=False):
+    """Return topic_ids minus finished ones and duplicates, keeping list order."""
+    pending = []
+    seen = set()
+    for topic_id in topic_ids:
+        if topic_id in seen or index.should_skip(topic_id, retry_failed):
+            continue
+        seen.add(topic_id)
+        pending.append(topic_id)
+    return pending
@@ -0,0 +1,255 @@
+"""Topic page extraction: a streaming fast path with a BeautifulSoup fallback.
+
+Building a BeautifulSoup tree of a whole topic page (inline scripts, comment
+templates, footer) costs far more than reading the few parts the dataset
+uses. `TopicPageParser` tokenizes the page with the standard library's
+`HTMLParser` and keeps no tree: it reads the og:title/og:description meta
+tags in <head>, then the main post (its story text, author, timestamp and
+tags), and stops tokenizing as soon as the main post's wrapper closes, so
+the rest of the page is never looked at. On a page without a main post it
+gives up at the first sign of that: a post story outside any main post
+(an older layout), the comments container, or the end of <body>.
+
+`extract_topic` runs the fast path and falls back to `extract_topic_soup`,
+a full BeautifulSoup parse that extracts the same fields, when the fast
+path raises or finds no main post (an unexpected layout). Both return the
+raw, uncleaned text; pantip_scraper.py cleans it.
+"""
+
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup, NavigableString
+
+# The main post: <div class="display-post-wrapper main-post ...">
+MAIN_POST_CLASS = 'main-post'
+POST_WRAPPER_CLASS = 'display-post-wrapper'
+STORY_CLASS = 'display-post-story'
+AUTHOR_CLASS = 'display-post-name'
+TAG_CLASS = 'tag-item'
+TIMESTAMP_ATTR = 'data-utime'
+UTIME = re.compile(r'(\d\d)/(\d\d)/(\d{4}) (\d\d):(\d\d):(\d\d)', re.ASCII)
+# <div id="comments-jsrender">: the comments come after the main post.
+COMMENTS_ID = 'comments-jsrender'
+
+# Tags whose start separates words in the extracted story text.
+BLOCK_TAGS = frozenset(('br', 'p', 'div', 'li', 'tr', 'td', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'hr'))
+SKIPPED_TAGS = frozenset(('script', 'style'))
+
+class _Done(Exception):
+    """Raised from a handler to stop tokenizing the rest of the page."""
+
+def _classes(attrs):
+    for name, value in attrs:
+        if name == 'class' and value:
+            return value.split()
+    return ()
+
+def _attr(attrs, wanted):
+    for name, value in attrs:
+        if name == wanted:
+            return value
+    return None
+
+def normalize_utime(value):
+    """Pantip's data-utime ("05/14/2024 21:37:55", Bangkok time) as ISO 8601; other values unchanged."""
+    try:
+        text = value.strip()
+        # strptime is slow enough to dominate parsing a long thread, so the usual zero-padded form is matched directly.
+        match = UTIME.fullmatch(text)
+        if match:
+            month, day, year, hour, minute, second = map(int, match.groups())
+            return datetime(year, month, day, hour, minute, second).isoformat()
+        return datetime.strptime(text, '%m/%d/%Y %H:%M:%S').isoformat()
+    except (AttributeError, ValueError):
+        return value
+
+def author_id_from(href):
+    """The member ID from a profile link like /profile/1234567."""
+    if href and '/profile/' in href:
+        return href.rstrip('/').rsplit('/', 1)[-1] or None
+    return None
+
+def empty_topic():
+    return {'title': '', 'summary': '', 'body': '', 'author': None, 'author_id': None, 'created_at': None, 'tags': []}
+
+class TopicPageParser(HTMLParser):
+    """Streaming extractor for a topic page; see the module docstring.
+
+    With head_only=True it stops at <body>, after the meta tags.
+    """
+
+    def __init__(self, head_only=False):
+        super().__init__(convert_charrefs=True)
+        self.head_only = head_only
+        self.result = empty_topic()
+        self.found_post = False
+        self._post_depth = 0      # open <div>s of the main post wrapper, 0 when outside it
+        self._story_depth = 0     # open <div>s of the story, 0 when outside it
+        self._story_done = False
+        self._skip = 0            # open <script>/<style> inside the main post
+        self._capture = None      # 'author' or 'tag' while inside that <a>
+        self._captured = []
+        self._body = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'meta':
+            prop = _attr(attrs, 'property')
+            if prop == 'og:title' and not self.result['title']:
+                self.result['title'] = _attr(attrs, 'content') or ''
+            elif prop == 'og:description' and not self.result['summary']:
+                self.result['summary'] = _attr(attrs, 'content') or ''
+            return
+        if tag == 'body' and self.head_only:
+            raise _Done
+        if not self._post_depth:
+            if tag != 'div':
+                return
+            classes = _classes(attrs)
+            if MAIN_POST_CLASS not in classes:
+                # The main post holds the first story and precedes the comments: past either, there is none.
+                if STORY_CLASS in classes or _attr(attrs, 'id') == COMMENTS_ID:
+                    raise _Done
+                return
+            self.found_post = True
+        if self.result['created_at'] is None:
+            utime = _attr(attrs, TIMESTAMP_ATTR)
+            if utime:
+                self.result['created_at'] = normalize_utime(utime)
+        if not self._post_depth:
+            self._post_depth = 1
+            return
+
+        if tag == 'div':
+            self._post_depth += 1
+            if self._story_depth:
+                self._story_depth += 1
+            elif not self._story_done and STORY_CLASS in _classes(attrs):
+                self._story_depth = 1
+                return
+        if tag in SKIPPED_TAGS:
+            self._skip += 1
+            return
+        if self._story_depth and tag in BLOCK_TAGS:
+            self._body.append(' ')
+        if tag == 'a' and self._capture is None:
+            classes = _classes(attrs)
+            if AUTHOR_CLASS in classes and self.result['author'] is None:
+                self._capture = 'author'
+                self.result['author_id'] = author_id_from(_attr(attrs, 'href'))
+            elif TAG_CLASS in classes:
+                self._capture = 'tag'
+            self._captured = []
+
+    def handle_startendtag(self, tag, attrs):
+        # <div/>, <a/> and <script/> open and close at once; void tags like <br/> only open.
+        self.handle_starttag(tag, attrs)
+        if tag in ('div', 'a') or tag in SKIPPED_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if not self._post_depth:
+            if tag == 'body':
+                raise _Done
+            return
+        if tag in SKIPPED_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == 'a' and self._capture is not None:
+            text = ''.join(self._captured)
+            if self._capture == 'author':
+                self.result['author'] = text
+            else:
+                self.result['tags'].append(text)
+            self._capture = None
+        elif tag == 'div':
+            if self._story_depth:
+                self._story_depth -= 1
+                if not self._story_depth:
+                    self._story_done = True
+            self._post_depth -= 1
+            if not self._post_depth:
+                raise _Done
+
+    def handle_data(self, data):
+        if self._skip or not self._post_depth:
+            return
+        if self._story_depth:
+            self._body.append(data)
+        if self._capture is not None:
+            self._captured.append(data)
+
+    def parse(self, html):
+        try:
+            self.feed(html)
+            self.close()
+        except _Done:
+            pass
+        self.result['body'] = ''.join(self._body)
+        return self.result
+
+def _in_skipped(node, root):
+    for parent in node.parents:
+        if parent is root:
+            return False
+        if parent.name in SKIPPED_TAGS:
+            return True
+    return False
+
+def extract_topic_soup(html):
+    """The fields of `extract_topic` from a full BeautifulSoup parse (the fallback path)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    result = empty_topic()
+    title = soup.find('meta', property='og:title')
+    result['title'] = title.get('content', '') if title else ''
+    summary = soup.find('meta', property='og:description')
+    result['summary'] = summary.get('content', '') if summary else ''
+
+    post = soup.find('div', class_=MAIN_POST_CLASS)
+    if post is None:
+        # Older layouts: the post wrapper around the first story, else the whole page.
+        story = soup.find('div', class_=STORY_CLASS)
+        post = (story.find_parent('div', class_=POST_WRAPPER_CLASS) if story is not None else None) or soup
+    story = post.find('div', class_=STORY_CLASS)
+    if story is not None:
+        parts = []
+        for node in story.descendants:
+            if isinstance(node, NavigableString):
+                # Plain text only (not comments or doctype), and not inside a script or style.
+                if type(node) is NavigableString and not _in_skipped(node, story):
+                    parts.append(str(node))
+            elif node.name in BLOCK_TAGS:
+                parts.append(' ')
+        result['body'] = ''.join(parts)
+    author = post.find('a', class_=AUTHOR_CLASS)
+    if author is not None:
+        result['author'] = author.get_text()
+        result['author_id'] = author_id_from(author.get('href'))
+    stamped = post.find(attrs={TIMESTAMP_ATTR: True})
+    if stamped is not None:
+        result['created_at'] = normalize_utime(stamped[TIMESTAMP_ATTR])
+    result['tags'] = [tag.get_text() for tag in post.find_all('a', class_=TAG_CLASS)]
+    return result
+
+def extract_topic(html):
+    """Title, summary, story text, author, author ID, timestamp and tags of a topic page.
+
+    Uses the streaming parser and falls back to BeautifulSoup when it fails
+    or the page has no main post wrapper.
+    """
+    try:
+        parser = TopicPageParser()
+        result = parser.parse(html)
+        if parser.found_post:
+            return result
+    except Exception:
+        pass
+    return extract_topic_soup(html)
+
+def extract_meta(html):
+    """Just the og:title and og:description contents, reading no further than <head>."""
+    try:
+        result = TopicPageParser(head_only=True).parse(html)
+    except Exception:
+        result = extract_topic_soup(html)
+    return result['title'], result['summary']
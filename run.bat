@@ -5,11 +5,12 @@ echo 1. Run Pantip Scraper
 echo 2. Run Wikipedia Processor
 echo 3. Run YouTube Comment Scraper
 echo 4. Run YouTube Content Scraper
-echo 5. Install Dependencies for Pantip
-echo 6. Install Dependencies for Wikipedia
-echo 7. Install Dependencies for YouTube
-echo 8. Exit
-set /p choice="Enter your choice (1-8): "
+echo 5. Run Crawl Manifest (all sources, crawl_manifest.json)
+echo 6. Install Dependencies for Pantip
+echo 7. Install Dependencies for Wikipedia
+echo 8. Install Dependencies for YouTube
+echo 9. Exit
+set /p choice="Enter your choice (1-9): "
 
 if "%choice%"=="1" (
     cd pantip_scraper
@@ -24,15 +25,17 @@ if "%choice%"=="1" (
     cd youtube_scraper
     call run_content_scraper.bat
 ) else if "%choice%"=="5" (
+    python crawl.py crawl_manifest.json
+) else if "%choice%"=="6" (
     cd pantip_scraper
     call install_deps.bat
-) else if "%choice%"=="6" (
+) else if "%choice%"=="7" (
     cd wikipedia_scraper
     call install_deps.bat
-) else if "%choice%"=="7" (
+) else if "%choice%"=="8" (
     cd youtube_scraper
     call install_deps.bat
-) else if "%choice%"=="8" (
+) else if "%choice%"=="9" (
     echo Exiting...
     exit /b
 ) else (
@@ -0,0 +1 @@
+"""Code shared by the Pantip, Wikipedia and YouTube scrapers."""
@@ -0,0 +1,324 @@
+"""Benchmarks and golden checks for code in scraper_common.
+
+Usage:
+    python benchmark.py cleaning             verify the golden corpus, then report MB/s
+    python benchmark.py cleaning --regenerate rebuild golden/cleaning_corpus.jsonl
+    python benchmark.py scheduler [jobs_per_source] [fail_rate]
+                                             one-job-at-a-time vs the crawl scheduler on stub jobs
+    python benchmark.py ratelimit [server_rps] [requests] [threads]
+                                             naive retries vs backoff vs adaptive rate limiting
+                                             against a stub server that answers 429 above server_rps
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for directory in ('pantip_scraper', 'wikipedia_scraper', 'youtube_scraper'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+GOLDEN_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'cleaning_corpus.jsonl')
+
+# The re.sub chains the cleaning engine replaced, kept verbatim as the
+# reference for the golden corpus and as the "before" in the benchmark.
+
+def legacy_wiki_regex_stage(plain):
+    plain = re.sub(r'\(\)', '', plain)
+    plain = re.sub(r'<[^>]+>', '', plain)
+    plain = re.sub(r'thumb\|[^|]*\|', '', plain)
+    plain = re.sub(r'alt=[^|]*\|', '', plain)
+    plain = re.sub(r'right\|', '', plain)
+    plain = re.sub(r'upright=[^|]*\|', '', plain)
+    plain = re.sub(r'\[\[.*?\]\]', '', plain)
+    plain = re.sub(r'\{\{.*?\}\}', '', plain)
+    plain = re.sub(r'\[\d+\]', '', plain)
+    additional_patterns = [
+        r'\(; , \)',
+        r'\(, \)',
+        r'thumb\|',
+        r'\(; \)',
+        r'frameless\|350px',
+        r'250px\|',
+        r'thumbnail\|300px\|',
+        r'\(; ; \)'
+    ]
+    for pattern in additional_patterns:
+        plain = re.sub(pattern, '', plain)
+    plain = re.sub(r'\s+', ' ', plain)
+    return plain.strip()
+
+def legacy_clean_text(text):
+    if not text:
+        return ""
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+def legacy_comment_message(msg):
+    msg = re.sub(r'<[^>]+>', ' ', msg)
+    return legacy_clean_text(msg)
+
+def legacy_clean_transcript_text(text):
+    text = re.sub(r'\[\d+:\d+:\d+\.\d+\]', '', text)
+    text = re.sub(r'\[\d+:\d+\]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'[^\w\s\u0E00-\u0E7F.,!?]', '', text)
+    return text
+
+LEGACY = {
+    'wiki': legacy_wiki_regex_stage,
+    'pantip_text': legacy_clean_text,
+    'pantip_comment': legacy_comment_message,
+    'transcript': legacy_clean_transcript_text,
+}
+
+def current_cleaners():
+    from pantip_scraper import clean_text, extract_comment_text
+    from wiki_processor import wiki_cleaner
+    from youtube_content_scraper import transcript_cleaner
+    return {
+        'wiki': wiki_cleaner.clean,
+        'pantip_text': clean_text,
+        'pantip_comment': lambda msg: extract_comment_text({'message': msg}),
+        'transcript': transcript_cleaner.clean,
+    }
+
+# Fragments chosen to exercise every rule, including the cases where one
+# deletion creates a match for a later rule.
+FRAGMENTS = [
+    'ประเทศไทย', 'กรุงเทพมหานคร', 'Thailand', '()', '(; , )', '(, )', '(; )', '(; ; )', '((; , ), )',
+    '(; (), )', '<b>', '</b>', '<br />', '< x <b>', '<ref name="a">', 'thumb|', 'thumb|250px|', 'thu<i>mb|',
+    'alt=ภาพ|', 'alt=thumb|a|', 'right|', 'upright=1.2|', 'frameless|350px', '250frameless|350pxpx|',
+    'thumbnail|300px|', '250px|', '[[ลิงก์]]', '[[a[1]]]', '{{แม่แบบ}}', '{{a [[b}} c]]', '[1]', '[12]',
+    '[1][[a]]', '[00:01:02.500]', '[1:[0:0:0.0]2]', '[03:04]', '[ab]', '  ', '\n', '\t\t', '\xa0', '\u3000',
+    '\u200b', '!', '?', '.', ',', '♪', '😀', '-', '—', '"', "'", '|', '=', '[', ']', '{', '}', '<', '>',
+    '(', ')', '๑๒๓', 'ๆ', 'ฯ', '123',
+]
+
+def make_inputs(count=200, seed=1):
+    rng = random.Random(seed)
+    inputs = ['', ' ', 'a', 'ข้อความธรรมดาไม่มีอะไรให้ลบ'] + FRAGMENTS
+    for _ in range(count):
+        inputs.append(''.join(rng.choice(FRAGMENTS) + rng.choice(['', ' ', '', '\n'])
+                              for _ in range(rng.randint(1, 40))))
+    return inputs
+
+def regenerate_corpus():
+    os.makedirs(os.path.dirname(GOLDEN_CORPUS), exist_ok=True)
+    count = 0
+    with open(GOLDEN_CORPUS, 'w', encoding='utf-8') as f:
+        for source, legacy in LEGACY.items():
+            for text in make_inputs():
+                record = {'source': source, 'input': text, 'expected': legacy(text)}
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+    print(f"Wrote {count} golden records to {GOLDEN_CORPUS}")
+
+def verify_corpus(cleaners):
+    mismatches = 0
+    total = 0
+    with open(GOLDEN_CORPUS, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            total += 1
+            actual = cleaners[record['source']](record['input'])
+            if actual != record['expected']:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"MISMATCH [{record['source']}] {record['input']!r}: "
+                          f"expected {record['expected']!r}, got {actual!r}")
+    print(f"Golden corpus: {total - mismatches}/{total} records match")
+    return mismatches == 0
+
+def bench_workload(source):
+    """A few MB of text resembling what each cleaner sees in practice."""
+    rng = random.Random(2)
+    words = ['ประเทศไทย', 'กรุงเทพมหานคร', 'วัฒนธรรม', 'Thailand', 'ภาษาไทย', 'การศึกษา', '2567']
+    docs = []
+    for _ in range(2000):
+        parts = []
+        for _ in range(rng.randint(100, 300)):
+            parts.append(rng.choice(words))
+            roll = rng.random()
+            if source == 'wiki' and roll < 0.01:
+                parts.append(rng.choice(['()', '[1]', 'thumb|250px|', '(; , )']))
+            elif source == 'pantip_comment' and roll < 0.02:
+                parts.append('<br />')
+            elif source == 'transcript' and roll < 0.02:
+                parts.append(rng.choice(['[00:01]', '♪', '!']))
+            parts.append(rng.choice([' ', ' ', '  ', '\n']))
+        docs.append(''.join(parts))
+    return docs
+
+def bench_cleaning():
+    cleaners = current_cleaners()
+    if not verify_corpus(cleaners):
+        sys.exit(1)
+    print(f"{'source':>15} {'before MB/s':>12} {'after MB/s':>11} {'speedup':>8}")
+    for source, legacy in LEGACY.items():
+        docs = bench_workload(source)
+        size_mb = sum(len(doc.encode('utf-8')) for doc in docs) / 1e6
+        timings = []
+        for clean in (legacy, cleaners[source]):
+            started = time.perf_counter()
+            for doc in docs:
+                clean(doc)
+            timings.append(time.perf_counter() - started)
+        before, after = (size_mb / t for t in timings)
+        print(f"{source:>15} {before:>12.1f} {after:>11.1f} {after / before:>7.1f}x")
+
+def bench_scheduler(jobs_per_source=40, fail_rate=0.1):
+    """Mixed stub crawl: sequential (like running each script from run.bat) vs per-source pools."""
+    import tempfile
+    sys.path.insert(0, ROOT)
+    from crawl import STUB_HANDLERS, build_sources, expand_jobs
+    from scraper_common.scheduler import JobStore, Scheduler
+
+    jobs_per_source = int(jobs_per_source)
+    fail_rate = float(fail_rate)
+    entries = [
+        {'source': 'pantip', 'kind': 'topic', 'ids': list(range(jobs_per_source)), 'stub_seconds': 0.05,
+         'stub_fail_rate': fail_rate, 'priority': 5},
+        {'source': 'youtube', 'kind': 'comments', 'ids': [f"v{i:010d}" for i in range(jobs_per_source)],
+         'stub_seconds': 0.1, 'stub_fail_rate': fail_rate},
+        {'source': 'wiki', 'kind': 'dump', 'id': 'thwiki', 'stub_seconds': 2.0},
+    ]
+    jobs = expand_jobs(entries)
+    print(f"{len(jobs)} stub jobs, {fail_rate:.0%} of network attempts fail")
+
+    random.seed(3)
+    started = time.perf_counter()
+    for job in jobs:
+        handler = STUB_HANDLERS[job.source][job.kind]
+        for _ in range(5):
+            try:
+                handler(job.params)
+                break
+            except ConnectionError:
+                continue
+    sequential = time.perf_counter() - started
+    print(f"{'one job at a time':>20} {sequential:>7.2f}s")
+
+    # No start-rate limits on either side: this measures overlap, not politeness.
+    overrides = {name: {'workers': 4, 'rate': 0, 'retry_delay': 0.1} for name in ('pantip', 'youtube')}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(os.path.join(tmp, 'state.sqlite'))
+        store.add(jobs)
+        scheduler = Scheduler(store, build_sources(overrides, STUB_HANDLERS, max_attempts=5), progress_interval=0)
+        stats = scheduler.run()
+        print(f"{'scheduler':>20} {stats['elapsed_seconds']:>7.2f}s "
+              f"({sequential / stats['elapsed_seconds']:.1f}x, "
+              f"{sum(stats[name]['retried'] for name in ('pantip', 'youtube'))} retries)")
+        for name in ('pantip', 'youtube', 'wiki'):
+            print(f"{name:>20} {stats[name]['busy_seconds']:>7.2f}s busy, {stats[name]['done']} done")
+        assert store.counts() == {('pantip', 'done'): jobs_per_source, ('youtube', 'done'): jobs_per_source,
+                                  ('wiki', 'done'): 1}, store.counts()
+        # A second run over the same store has nothing left to do.
+        assert not store.pending()
+        store.close()
+
+def _serve_throttled(server_rps, port_queue):
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+    bucket = {'tokens': float(server_rps) / 10, 'updated': time.monotonic()}
+    burst = max(1.0, server_rps / 10)
+
+    class ThrottlingHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                now = time.monotonic()
+                bucket['tokens'] = min(burst, bucket['tokens'] + (now - bucket['updated']) * server_rps)
+                bucket['updated'] = now
+                allowed = bucket['tokens'] >= 1
+                if allowed:
+                    bucket['tokens'] -= 1
+            body = b'ok' if allowed else b'slow down'
+            self.send_response(200 if allowed else 429)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+    server = Server(('127.0.0.1', 0), ThrottlingHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def bench_ratelimit(server_rps=50, num_requests=300, threads=8):
+    """Goodput and wasted requests against a host that allows `server_rps` and answers 429 above it."""
+    import multiprocessing
+    from concurrent.futures import ThreadPoolExecutor
+    sys.path.insert(0, ROOT)
+    from scraper_common.http_client import HttpClient
+    from scraper_common.rate_limit import AdaptiveRateLimiter, RetryPolicy
+
+    server_rps, num_requests, threads = float(server_rps), int(num_requests), int(threads)
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_throttled, args=(server_rps, port_queue), daemon=True)
+    process.start()
+    url = f"http://127.0.0.1:{port_queue.get(timeout=10)}/item"
+    print(f"Server allows {server_rps:g} req/s; {num_requests} items on {threads} threads")
+    print(f"{'client':>30} {'ok':>5} {'requests':>9} {'429s':>6} {'req/s':>7} {'retry rate':>11} {'seconds':>8}")
+
+    def naive(client):
+        # Retry until it works, straight away: what a bare loop around the old fetchers would do.
+        while True:
+            response = client.get(url)
+            if response.status_code == 200:
+                return True
+
+    def once(client):
+        return client.get(url).status_code == 200
+
+    clients = (
+        ('naive immediate retry', naive, lambda: HttpClient(pool_size=threads)),
+        ('jittered backoff', once, lambda: HttpClient(pool_size=threads, retry=RetryPolicy(base_delay=0.1))),
+        ('adaptive limiter + backoff', once,
+         lambda: HttpClient(pool_size=threads, limiter=AdaptiveRateLimiter(server_rps * 4),
+                            retry=RetryPolicy(base_delay=0.1))),
+    )
+    try:
+        for name, fetch, make_client in clients:
+            with make_client() as client:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(threads) as pool:
+                    ok = sum(pool.map(lambda _: fetch(client), range(num_requests)))
+                elapsed = time.perf_counter() - started
+                stats = client.metrics.as_dict()
+                throttled = stats['requests'] - ok
+                retry_rate = (stats['requests'] - num_requests) / stats['requests']
+                print(f"{name:>30} {ok:>5} {stats['requests']:>9} {throttled:>6} "
+                      f"{stats['requests'] / elapsed:>7.1f} {retry_rate:>11.1%} {elapsed:>8.2f}")
+                if client.limiter is not None:
+                    print(f"{'':>30} limiter settled at {client.limiter.rate:.1f} req/s "
+                          f"(lowest {client.limiter.lowest_rate:.1f})")
+    finally:
+        process.terminate()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'cleaning':
+        if '--regenerate' in sys.argv:
+            regenerate_corpus()
+        else:
+            bench_cleaning()
+    elif command == 'scheduler':
+        bench_scheduler(*sys.argv[2:])
+    elif command == 'ratelimit':
+        bench_ratelimit(*sys.argv[2:])
+    else:
+        print(__doc__)
+        sys.exit(1)
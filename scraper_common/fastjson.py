@@ -0,0 +1,182 @@
+"""Fast JSON decoding and precompiled field extraction for API responses.
+
+`loads` decodes with orjson or msgspec when one of them is installed and
+falls back to the stdlib `json` module otherwise; all backends return the
+same plain dicts and lists, and a UTF-8 BOM (which Pantip prepends) is
+accepted by every backend.
+
+Responses such as youtubei pages are mostly tracking data, thumbnails and
+accessibility labels around the few fields a scraper reads. Two helpers
+avoid walking or even building that:
+
+- `JsonPath` compiles a path like `a.b[*].c` once and returns the values
+  found at it, skipping missing keys and unexpected types.
+- `Projection` takes the list of paths a parser reads. With msgspec it
+  builds a typed schema from them, so decoding materialises only those
+  fields and skips everything else inside the C decoder. Without msgspec
+  it decodes the whole document. Either way the result has the same shape
+  for the projected paths, so parsing code works unchanged on both.
+"""
+
+import json
+import typing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+_BOM = b'\xef\xbb\xbf'
+
+def _strip_bom(data):
+    if isinstance(data, str):
+        return data[1:] if data.startswith('\ufeff') else data
+    return data[3:] if data[:3] == _BOM else data
+
+def available_backends():
+    """Installed backends, fastest first."""
+    modules = {'orjson': orjson, 'msgspec': msgspec, 'json': json}
+    return [name for name in BACKENDS if modules[name] is not None]
+
+def get_loads(backend=None):
+    """Return a `loads(bytes_or_str)` function for `backend` (default: the fastest installed)."""
+    backend = backend or available_backends()[0]
+    if backend not in available_backends():
+        raise ImportError(f"JSON backend {backend!r} is not installed")
+    if backend == 'orjson':
+        decode = orjson.loads
+    elif backend == 'msgspec':
+        decode = msgspec.json.decode
+    else:
+        decode = json.loads
+
+    def loads(data):
+        return decode(_strip_bom(data))
+
+    loads.backend = backend
+    return loads
+
+loads = get_loads()
+BACKEND = loads.backend
+
+# Compiled path steps.
+_KEY, _EACH, _INDEX = 'key', 'each', 'index'
+
+def _compile(path):
+    steps = []
+    for part in path.split('.'):
+        key, _, rest = part.partition('[')
+        if key:
+            steps.append((_KEY, key))
+        while rest:
+            inner, _, rest = rest.partition(']')
+            steps.append((_EACH, None) if inner == '*' else (_INDEX, int(inner)))
+            rest = rest[1:] if rest.startswith('[') else rest
+    return tuple(steps)
+
+class JsonPath:
+    """A dotted path compiled once and applied to decoded JSON.
+
+    `key` selects a dict value, `[*]` every element of a list and `[n]` one
+    element. Missing keys, short lists and values of an unexpected type
+    simply produce no match.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.steps = _compile(path)
+
+    def find_all(self, data):
+        """Every value at the path, in document order."""
+        nodes = [data]
+        for kind, arg in self.steps:
+            found = []
+            if kind == _KEY:
+                for node in nodes:
+                    if type(node) is dict and arg in node:
+                        found.append(node[arg])
+            elif kind == _EACH:
+                for node in nodes:
+                    if type(node) is list:
+                        found.extend(node)
+            else:
+                for node in nodes:
+                    if type(node) is list and -len(node) <= arg < len(node):
+                        found.append(node[arg])
+            if not found:
+                return found
+            nodes = found
+        return nodes
+
+    def find(self, data, default=None):
+        """The first value at the path, or `default`."""
+        found = self.find_all(data)
+        return found[0] if found else default
+
+    def __repr__(self):
+        return f"JsonPath({self.path!r})"
+
+def _add_path(tree, steps):
+    node = tree
+    for kind, arg in steps:
+        if node.get('leaf'):
+            return
+        if kind == _KEY:
+            node = node.setdefault('keys', {}).setdefault(arg, {})
+        else:
+            # [n] is decoded as [*]: the projection keeps whole lists.
+            node = node.setdefault('items', {})
+    node.clear()
+    node['leaf'] = True
+
+def _build_type(node, name):
+    if node.get('leaf') or ('keys' in node and 'items' in node):
+        return typing.Any
+    if 'items' in node:
+        return typing.List[_build_type(node['items'], name + 'Item')]
+    fields = []
+    for key, child in node.get('keys', {}).items():
+        field_type = _build_type(child, name + key[:1].upper() + key[1:])
+        if field_type is not typing.Any:
+            field_type = typing.Union[field_type, msgspec.UnsetType]
+        fields.append((key, field_type, msgspec.UNSET))
+    return msgspec.defstruct(name, fields)
+
+class Projection:
+    """Decode only the parts of a document reachable through `paths`.
+
+    With msgspec the paths become a typed schema and `loads` returns a
+    pruned copy of the document holding just those fields (objects keep
+    only projected keys, missing keys stay missing). Without msgspec, or if
+    a document does not fit the schema, the full document is returned.
+    """
+
+    def __init__(self, paths, backend=None):
+        self.paths = list(paths)
+        self.fallback = get_loads(None if backend == 'msgspec' else backend)
+        self.decoder = None
+        if msgspec is not None and backend in (None, 'msgspec'):
+            tree = {}
+            for path in self.paths:
+                _add_path(tree, _compile(path))
+            self.decoder = msgspec.json.Decoder(_build_type(tree, 'Projection'))
+
+    @property
+    def backend(self):
+        return 'msgspec projection' if self.decoder else self.fallback.backend
+
+    def loads(self, data):
+        if self.decoder is None:
+            return self.fallback(data)
+        data = _strip_bom(data)
+        try:
+            return msgspec.to_builtins(self.decoder.decode(data))
+        except msgspec.ValidationError:
+            return self.fallback(data)
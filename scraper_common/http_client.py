@@ -0,0 +1,304 @@
+"""Shared HTTP client with pooled keep-alive connections and per-run counters.
+
+Every scraper that talks HTTP synchronously goes through `HttpClient` so that
+connections are reused across requests instead of paying a new TCP+TLS
+handshake each time. The default backend is a `requests.Session` with a
+tunable connection pool; with `http2=True` and `httpx[http2]` installed the
+client uses HTTP/2 instead.
+
+Given an `AdaptiveRateLimiter` and a `RetryPolicy` (see rate_limit.py), the
+client paces every request, slows down on 429/503 and retries retryable
+statuses and connection errors with jittered backoff. Without them it sends
+each request once, as fast as it is called.
+
+Given a `ResponseCache` (see response_cache.py), `request()` answers from
+disk when it can and revalidates stale entries with a conditional request;
+streamed downloads are never cached.
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .rate_limit import RequestMetrics, parse_retry_after
+from .response_cache import miss_response, request_key
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+except ImportError:
+    httpx = None
+
+# Failures before a response arrived that are worth another try.
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+if httpx is not None:
+    TRANSPORT_ERRORS += (httpx.TransportError,)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+
+def _supported_encodings():
+    encodings = ['gzip', 'deflate']
+    # requests/urllib3 and httpx decode brotli transparently once a brotli
+    # package is importable, so only advertise it in that case.
+    for module in ('brotli', 'brotlicffi'):
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        encodings.append('br')
+        break
+    return ', '.join(encodings)
+
+ACCEPT_ENCODING = _supported_encodings()
+
+class ConnectionStats:
+    """Thread-safe counters for requests, new connections and handshake time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.handshake_seconds = 0.0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self, seconds):
+        with self._lock:
+            self.new_connections += 1
+            self.handshake_seconds += seconds
+
+    @property
+    def reused(self):
+        return max(0, self.requests - self.new_connections)
+
+    def as_dict(self):
+        with self._lock:
+            requests_made = self.requests
+            new_connections = self.new_connections
+            handshake = self.handshake_seconds
+        return {
+            'requests': requests_made,
+            'new_connections': new_connections,
+            'reused_connections': max(0, requests_made - new_connections),
+            'reuse_ratio': (requests_made - new_connections) / requests_made if requests_made else 0.0,
+            'handshake_seconds': handshake,
+            'avg_handshake_ms': handshake * 1000 / new_connections if new_connections else 0.0,
+        }
+
+    def summary(self):
+        stats = self.as_dict()
+        return (f"HTTP: {stats['requests']} requests, {stats['new_connections']} new connections, "
+                f"{stats['reused_connections']} reused ({stats['reuse_ratio']:.0%}), "
+                f"handshakes {stats['handshake_seconds']:.2f}s total / "
+                f"{stats['avg_handshake_ms']:.1f}ms avg")
+
+class _ConnectTimingMixin:
+    """urllib3 pool mixin that times connect() (TCP plus TLS) on every new connection."""
+
+    stats = None
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        connect = conn.connect
+        stats = self.stats
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                connect()
+            finally:
+                stats.record_connection(time.perf_counter() - started)
+
+        conn.connect = timed_connect
+        return conn
+
+class _InstrumentedAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('TimedHTTPConnectionPool', (_ConnectTimingMixin, HTTPConnectionPool),
+                         {'stats': self.stats}),
+            'https': type('TimedHTTPSConnectionPool', (_ConnectTimingMixin, HTTPSConnectionPool),
+                          {'stats': self.stats}),
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+class HttpClient:
+    """Pooled keep-alive HTTP client shared by the scrapers.
+
+    Args:
+        headers: default headers sent with every request.
+        pool_size: connections kept alive per host.
+        http2: use HTTP/2 via httpx when it is installed; falls back to
+            requests (HTTP/1.1) otherwise.
+        timeout: default request timeout in seconds.
+        limiter: `AdaptiveRateLimiter` pacing every request.
+        retry: `RetryPolicy` for retryable statuses and connection errors;
+            its metrics become the client's `metrics`.
+        cache: `ResponseCache` consulted by `request()`.
+    """
+
+    def __init__(self, headers=None, pool_size=DEFAULT_POOL_SIZE, http2=False, timeout=DEFAULT_TIMEOUT,
+                 limiter=None, retry=None, cache=None):
+        self.stats = ConnectionStats()
+        self.timeout = timeout
+        self.limiter = limiter
+        self.retry = retry
+        self.cache = cache
+        self.metrics = retry.metrics if retry is not None else RequestMetrics()
+        self.http2 = bool(http2 and httpx is not None)
+        default_headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        default_headers.update(headers or {})
+
+        if self.http2:
+            self._trace_state = threading.local()
+            self._client = httpx.Client(
+                http2=True,
+                headers=default_headers,
+                timeout=timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+        else:
+            if http2:
+                print("HTTP/2 requested but httpx[http2] is not installed; using HTTP/1.1")
+            self._client = requests.Session()
+            self._client.headers.update(default_headers)
+            adapter = _InstrumentedAdapter(self.stats, pool_connections=pool_size, pool_maxsize=pool_size)
+            self._client.mount('http://', adapter)
+            self._client.mount('https://', adapter)
+
+    @property
+    def headers(self):
+        return self._client.headers
+
+    def _trace(self, event, info):
+        # httpcore trace hook: connect_tcp only fires when a new connection is
+        # opened, so reused connections never reach the timing below.
+        state = self._trace_state
+        if event == 'connection.connect_tcp.started':
+            state.started = time.perf_counter()
+            state.connected = None
+        elif event == 'connection.connect_tcp.complete':
+            state.connected = time.perf_counter()
+        elif getattr(state, 'started', None) is None:
+            return
+        elif event == 'connection.start_tls.complete':
+            self.stats.record_connection(time.perf_counter() - state.started)
+            state.started = None
+        elif event.endswith('.send_request_headers.started') and state.connected is not None:
+            # Plain http: the connection is ready once TCP connect completed.
+            self.stats.record_connection(state.connected - state.started)
+            state.started = None
+
+    def _send(self, method, url, stream, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.http2:
+            self.stats.record_request()
+            extensions = kwargs.pop('extensions', {})
+            extensions['trace'] = self._trace
+            if stream:
+                return self._client.send(self._client.build_request(method, url, extensions=extensions, **kwargs),
+                                         stream=True)
+            return self._client.request(method, url, extensions=extensions, **kwargs)
+        return self._client.request(method, url, stream=stream, **kwargs)
+
+    def _request(self, method, url, stream, kwargs):
+        """Send through the limiter, retrying as the retry policy allows; returns the last response."""
+        for attempt in itertools.count():
+            if self.limiter is not None:
+                self.limiter.wait()
+            self.metrics.record_request()
+            sent_at = time.monotonic()
+            try:
+                response = self._send(method, url, stream, **kwargs)
+            except TRANSPORT_ERRORS:
+                delay = self.retry.retry_delay(attempt) if self.retry is not None else None
+                if delay is None:
+                    raise
+            else:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if self.limiter is not None:
+                    self.limiter.on_response(response.status_code, retry_after, sent_at)
+                delay = None
+                if self.retry is not None:
+                    delay = self.retry.retry_delay(attempt, response.status_code, retry_after)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+
+    def request(self, method, url, **kwargs):
+        if self.cache is None:
+            return self._request(method, url, False, kwargs)
+        return self._cached_request(method, url, kwargs)
+
+    def _cached_request(self, method, url, kwargs):
+        cache = self.cache
+        params = kwargs.get('params')
+        full_url = f"{url}{'&' if '?' in url else '?'}{urlencode(sorted(dict(params).items()))}" if params else url
+        key = request_key(method, full_url, kwargs.get('data'), kwargs.get('json'))
+        entry = cache.get(key)
+        if entry is not None and (cache.replay or cache.is_fresh(entry)):
+            return entry.to_response(full_url)
+        if cache.replay:
+            return miss_response(full_url)
+        if entry is not None:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **entry.validators())
+        response = self._request(method, url, False, kwargs)
+        if response.status_code == 304 and entry is not None:
+            cache.touch(key)
+            return entry.to_response(full_url)
+        if response.status_code == 200:
+            cache.put(key, method, full_url, 200, response.headers, response.content)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    @contextmanager
+    def stream(self, method, url, **kwargs):
+        """Context manager yielding a response whose body has not been read yet.
+
+        Retries only cover getting the response; a connection that drops
+        while the body is being read is up to the caller.
+        """
+        response = self._request(method, url, True, kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
+
+    def iter_chunks(self, response, chunk_size):
+        """Iterate over the decoded body of a streamed response."""
+        if self.http2:
+            return response.iter_bytes(chunk_size)
+        return response.iter_content(chunk_size=chunk_size)
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,156 @@
+"""Streaming JSONL output with batched flushes, compression and size-based shards."""
+
+import gzip
+import io
+import json
+import os
+import shutil
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = (None, 'gzip', 'zstd')
+_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+def shard_path(path, shard, compression=None):
+    """`data/out.jsonl`, shard 3 -> `data/out-00003.jsonl` (plus `.gz`/`.zst`)."""
+    base, ext = os.path.splitext(path)
+    return f"{base}-{shard:05d}{ext or '.jsonl'}{_SUFFIXES[compression]}"
+
+def output_path(path, compression=None):
+    """`data/out.jsonl` with gzip -> `data/out.jsonl.gz`; a path that already has the suffix is kept."""
+    suffix = _SUFFIXES[compression]
+    return path if path.endswith(suffix) else path + suffix
+
+def encode_line(record):
+    """A record as one UTF-8 JSON line, as `JsonlWriter` writes it."""
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+def _open_binary(path, compression, mode):
+    if compression == 'gzip':
+        return gzip.open(path, mode)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd output needs the zstandard package: pip install zstandard")
+        return zstandard.ZstdCompressor().stream_writer(open(path, mode), closefd=True)
+    return open(path, mode)
+
+def iter_jsonl(path, compression=None):
+    """Yield the records of a JSONL file written by `JsonlWriter` (path as given to it)."""
+    path = output_path(path, compression)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd input needs the zstandard package: pip install zstandard")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True,
+                                                         read_across_frames=True)
+    else:
+        raw = _open_binary(path, compression, 'rb')
+    with io.TextIOWrapper(raw, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+class JsonlWriter:
+    """Write records as JSON lines as soon as they are produced.
+
+    Lines are buffered and written (and flushed) every `batch_size` records,
+    so a crash loses at most one batch and memory does not grow with the
+    number of records. With `max_bytes`, output rotates to a new shard file
+    (see `shard_path`) once a shard holds that many uncompressed bytes;
+    rotation happens on record boundaries, so every shard is valid JSONL.
+
+    Args:
+        path: output file, or the base name for shards when rotating;
+            compressed output gets a `.gz`/`.zst` suffix (see `output_path`).
+        compression: None, 'gzip' or 'zstd'.
+        batch_size: records per write/flush.
+        max_bytes: rotate after this many uncompressed bytes per shard.
+        mode: 'w' to truncate or 'a' to append to an unsharded file.
+    """
+
+    def __init__(self, path, compression=None, batch_size=100, max_bytes=None, mode='w'):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {COMPRESSIONS}, not {compression!r}")
+        self.path = path
+        self.compression = compression
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.records = 0
+        self.bytes_written = 0
+        self.paths = []
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._shard = 0
+        self._shard_bytes = 0
+        self._file = None
+        self._open_next()
+
+    def _open_next(self):
+        if self.max_bytes:
+            path = shard_path(self.path, self._shard, self.compression)
+            self._shard += 1
+        else:
+            path = output_path(self.path, self.compression)
+        # Shards are always fresh files; gzip members and zstd frames can
+        # be concatenated, so appending works for every compression.
+        mode = 'ab' if self.mode == 'a' and not self.max_bytes else 'wb'
+        self._file = _open_binary(path, self.compression, mode)
+        self._shard_bytes = 0
+        self.paths.append(path)
+
+    def write(self, record):
+        line = encode_line(record)
+        if self.max_bytes and self._shard_bytes + self._buffered_bytes + len(line) > self.max_bytes \
+                and self._shard_bytes + self._buffered_bytes > 0:
+            self.flush()
+            self._file.close()
+            self._open_next()
+        self._buffer.append(line)
+        self._buffered_bytes += len(line)
+        self.records += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def write_from(self, f, records):
+        """Append `records` lines encoded with `encode_line`, all of the binary file f, and flush.
+
+        The lines go out together, after any buffered records, so a group
+        of records that belong together (e.g. one topic's comments) is
+        never split by a crash between batches.
+        """
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        self.flush()
+        if self.max_bytes and self._shard_bytes and self._shard_bytes + size > self.max_bytes:
+            self._file.close()
+            self._open_next()
+        shutil.copyfileobj(f, self._file)
+        self._file.flush()
+        self._shard_bytes += size
+        self.bytes_written += size
+        self.records += records
+
+    def flush(self):
+        if self._buffer:
+            data = b''.join(self._buffer)
+            self._file.write(data)
+            self._shard_bytes += len(data)
+            self.bytes_written += len(data)
+            self._buffer.clear()
+            self._buffered_bytes = 0
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,92 @@
+"""Low-overhead progress reporting for long-running jobs."""
+
+import json
+import time
+
+def _format_bytes(value):
+    for unit in ('B', 'KB', 'MB'):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+class ProgressReporter:
+    """Accumulates counters and prints one status line every `interval` seconds.
+
+    Updating a counter is a dict increment plus a clock read, so it is cheap
+    enough to call per page. Counters whose name ends in `_bytes` are shown
+    as sizes. When `total` and a `position` callable are given (for example
+    the compressed input size and the raw file's `tell`), the line also shows
+    percent done and an ETA.
+
+    Args:
+        total: size of the input in the same units as `position()`.
+        position: callable returning how far through the input we are.
+        interval: seconds between status lines; 0 disables printing.
+    """
+
+    def __init__(self, total=None, position=None, interval=5.0):
+        self.total = total
+        self.position = position
+        self.interval = interval
+        self.counters = {}
+        self.started = time.monotonic()
+        self._next_report = self.started + interval if interval else float('inf')
+
+    def add(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+        if time.monotonic() >= self._next_report:
+            self.report()
+
+    def set(self, name, value):
+        self.counters[name] = value
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def fraction_done(self):
+        if not self.total or self.position is None:
+            return None
+        return min(1.0, self.position() / self.total)
+
+    def status_line(self):
+        elapsed = max(self.elapsed(), 1e-9)
+        parts = []
+        for name, value in self.counters.items():
+            label = name[:-len('_bytes')] if name.endswith('_bytes') else name
+            if name.endswith('_bytes'):
+                parts.append(f"{label} {_format_bytes(value)} ({_format_bytes(value / elapsed)}/s)")
+            else:
+                parts.append(f"{label} {value:,} ({value / elapsed:,.1f}/s)")
+        done = self.fraction_done()
+        if done:
+            eta = elapsed * (1 - done) / done
+            parts.append(f"{done:.1%} ETA {_format_duration(eta)}")
+        return ' | '.join(parts)
+
+    def report(self):
+        print(self.status_line(), flush=True)
+        self._next_report = time.monotonic() + self.interval if self.interval else float('inf')
+
+    def as_dict(self):
+        elapsed = self.elapsed()
+        stats = {'elapsed_seconds': round(elapsed, 3)}
+        for name, value in self.counters.items():
+            stats[name] = value
+            stats[f"{name}_per_sec"] = round(value / elapsed, 3) if elapsed else 0.0
+        done = self.fraction_done()
+        if done is not None:
+            stats['fraction_done'] = round(done, 4)
+        return stats
+
+    def write_json(self, path, **extra):
+        """Write the final counters (plus any extra fields) as a stats JSON file."""
+        stats = self.as_dict()
+        stats.update(extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        return stats
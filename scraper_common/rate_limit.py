@@ -0,0 +1,207 @@
+"""Adaptive request pacing, jittered retries and request metrics shared by the fetchers.
+
+- `AdaptiveRateLimiter` is a token bucket: up to `burst` requests go out at
+  once, then one every 1/rate seconds. A 429 or 503 halves the rate
+  (multiplicative decrease) and a `Retry-After` pauses every request until
+  it has passed; each success adds the rate back a little at a time
+  (additive increase) up to the configured maximum. Callers ask for a
+  delay with `reserve()`, so the same limiter serves threads (`wait`) and
+  asyncio tasks (`wait_async`).
+- `RetryPolicy` decides whether a failed attempt (retryable status or
+  connection error) is tried again and how long to wait: exponential
+  backoff with full jitter, at least `Retry-After`. Each source gets its
+  own policy, whose retry budget caps retries at a fraction of its
+  requests so that an unhealthy host is not hit with a multiple of the
+  normal traffic.
+- `RequestMetrics` counts requests, retries and throttled responses and
+  reports the effective requests/sec and retry rate.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def jittered_backoff(attempt, base_delay=1.0, max_delay=60.0):
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+class RequestMetrics:
+    """Thread-safe request, retry and throttle counters for one source."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.gave_up = 0
+        self.budget_exhausted = 0
+        self.started = None
+
+    def record_request(self):
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+            self.requests += 1
+
+    def record(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+            requests_made = self.requests
+            stats = {
+                'requests': requests_made,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'gave_up': self.gave_up,
+                'budget_exhausted': self.budget_exhausted,
+            }
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        stats['requests_per_sec'] = requests_made / elapsed if elapsed else 0.0
+        stats['retry_rate'] = stats['retries'] / requests_made if requests_made else 0.0
+        return stats
+
+    def summary(self):
+        stats = self.as_dict()
+        return (f"Requests: {stats['requests']} ({stats['requests_per_sec']:.1f} req/s), "
+                f"retries {stats['retries']} ({stats['retry_rate']:.1%}), throttled {stats['throttled']}, "
+                f"gave up {stats['gave_up']}" +
+                (f", retry budget exhausted {stats['budget_exhausted']}x" if stats['budget_exhausted'] else ""))
+
+class AdaptiveRateLimiter:
+    """Token-bucket pacing whose rate adapts to throttling (AIMD).
+
+    Args:
+        rate: starting and maximum requests per second; 0 disables pacing
+            (throttling then only pauses for Retry-After).
+        burst: requests allowed back to back after an idle period.
+        min_rate: the rate never drops below this (default rate / 32).
+        increase: requests/sec regained per second of successful requests
+            at the current rate (default rate / 10).
+        decrease: factor applied to the rate on a 429/503.
+
+    Throttled responses to requests sent before the last decrease belong to
+    the same overload and do not cut the rate again. Callers pass the
+    request's `sent_at` (from `time.monotonic()`) to `on_response` for this;
+    without it the rate is cut at most once per second.
+    """
+
+    def __init__(self, rate, burst=1, min_rate=None, increase=None, decrease=0.5):
+        self.max_rate = float(rate or 0)
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate if min_rate is not None else self.max_rate / 32
+        self.increase = increase if increase is not None else self.max_rate / 10
+        self.decrease = decrease
+        self.throttled = 0
+        self.lowest_rate = self.rate
+        self._next = 0.0
+        self._paused_until = 0.0
+        self._decreased_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Claim the next send slot; returns how many seconds to wait before sending."""
+        now = time.monotonic()
+        with self._lock:
+            start = max(now, self._paused_until)
+            if not self.rate:
+                return start - now
+            interval = 1.0 / self.rate
+            # A bucket holding `burst` tokens: idle time earns up to burst-1 early slots.
+            slot = max(self._next, start - (self.burst - 1) * interval)
+            slot = max(slot, self._paused_until)
+            self._next = slot + interval
+            return max(0.0, slot - now)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def on_response(self, status, retry_after=None, sent_at=None):
+        """Adapt to a response status (and its Retry-After, in seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            if status not in THROTTLE_STATUSES:
+                if self.rate and self.rate < self.max_rate:
+                    self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+                return
+            self.throttled += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            fresh = sent_at >= self._decreased_at if sent_at is not None else now >= self._decreased_at + 1.0
+            if self.rate and fresh:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.lowest_rate = min(self.lowest_rate, self.rate)
+                self._decreased_at = now
+
+class RetryPolicy:
+    """When to retry a failed request and for how long to back off.
+
+    Args:
+        attempts: total tries per request, including the first.
+        base_delay: backoff scale in seconds; attempt n waits up to base_delay * 2**n.
+        max_delay: cap on a single backoff (Retry-After may ask for longer).
+        budget: retries allowed per request made, on top of `min_budget`.
+        min_budget: retries always allowed, so a short run can still retry.
+        statuses: HTTP statuses worth retrying.
+        metrics: `RequestMetrics` to count into (a new one by default).
+    """
+
+    def __init__(self, attempts=4, base_delay=1.0, max_delay=60.0, budget=0.2, min_budget=10,
+                 statuses=RETRY_STATUSES, metrics=None):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.min_budget = min_budget
+        self.statuses = frozenset(statuses)
+        self.metrics = metrics or RequestMetrics()
+
+    def retry_delay(self, attempt, status=None, retry_after=None):
+        """Seconds to wait before retrying after try number `attempt` (0-based) failed, or None to give up.
+
+        `status` is the response status, or None for a connection error or
+        timeout. Non-retryable statuses return None without counting.
+        """
+        metrics = self.metrics
+        if status is not None:
+            if status in THROTTLE_STATUSES:
+                metrics.record('throttled')
+            if status not in self.statuses:
+                return None
+        if attempt + 1 >= self.attempts:
+            metrics.record('gave_up')
+            return None
+        if metrics.retries >= self.min_budget + self.budget * metrics.requests:
+            metrics.record('budget_exhausted')
+            metrics.record('gave_up')
+            return None
+        metrics.record('retries')
+        delay = jittered_backoff(attempt, self.base_delay, self.max_delay)
+        return max(delay, retry_after) if retry_after else delay
@@ -0,0 +1,280 @@
+"""Opt-in on-disk cache of HTTP responses for re-runs and offline reprocessing.
+
+Re-running a scraper after a change to its cleaning or parsing fetches the
+same pages again. With a `ResponseCache`, each 200 response is stored under
+a key derived from its method, URL and request body, and later requests for
+the same key are answered from disk.
+
+- Bodies are content-addressed: a blob named after the SHA-256 of the body,
+  compressed with zstd (or zlib without the zstandard package), so identical
+  responses are stored once. A SQLite index maps request keys to blobs,
+  status, headers and validators.
+- Entries are fresh for `max_age` seconds (forever by default). A stale
+  entry with an ETag or Last-Modified is revalidated with a conditional
+  request; a 304 keeps the stored body without downloading it again.
+- `max_bytes` bounds the compressed size on disk; the least recently used
+  entries are evicted first.
+- With `replay=True` nothing touches the network: hits are served whatever
+  their age and misses get a synthetic 504 (as for `Cache-Control:
+  only-if-cached`), so a past crawl can be reprocessed fully offline.
+
+`HttpClient(cache=...)` uses the cache for `request()`; streamed downloads
+bypass it.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The stored body is already decoded, so these no longer describe it.
+_SKIPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive',
+                    'set-cookie'}
+
+def request_key(method, url, data=None, json_body=None):
+    """SHA-256 over method, URL and request body (JSON bodies with sorted keys)."""
+    if json_body is not None:
+        body = json.dumps(json_body, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    elif isinstance(data, str):
+        body = data.encode('utf-8')
+    elif isinstance(data, bytes):
+        body = data
+    elif data:
+        body = json.dumps(data, sort_keys=True).encode('utf-8')
+    else:
+        body = b''
+    digest = hashlib.sha256(method.upper().encode('ascii') + b'\0' + url.encode('utf-8') + b'\0')
+    digest.update(body)
+    return digest.hexdigest()
+
+class CachedResponse:
+    """A stored response: status, headers and decoded body."""
+
+    __slots__ = ('key', 'status', 'headers', 'body', 'stored_at')
+
+    def __init__(self, key, status, headers, body, stored_at):
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at
+
+    def validators(self):
+        """Conditional-request headers for revalidating this entry."""
+        headers = {}
+        if 'etag' in self.headers:
+            headers['If-None-Match'] = self.headers['etag']
+        if 'last-modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['last-modified']
+        return headers
+
+    def to_response(self, url):
+        """A `requests.Response` with this entry's status, headers and body."""
+        response = requests.Response()
+        response.status_code = self.status
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        response.url = url
+        response.reason = 'OK' if self.status == 200 else ''
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.from_cache = True
+        return response
+
+class ResponseCache:
+    """Content-addressed, size-bounded response cache in `directory`.
+
+    Args:
+        directory: where the index and blobs live (created if missing).
+        max_bytes: evict least recently used entries beyond this many
+            compressed bytes; None for no limit.
+        max_age: seconds an entry is served without revalidation; None
+            means always fresh.
+        replay: serve only from the cache, never from the network.
+        flush_every: index updates per commit.
+    """
+
+    def __init__(self, directory, max_bytes=None, max_age=None, replay=False, flush_every=50):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.replay = replay
+        self.flush_every = flush_every
+        self.codec = 'zstd' if zstandard is not None else 'zlib'
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0}
+        self._pending = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            method TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            headers TEXT NOT NULL,
+            blob TEXT NOT NULL,
+            stored_at REAL NOT NULL,
+            last_used REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_blob ON entries (blob)")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            size INTEGER NOT NULL)""")
+        self._conn.commit()
+        self.size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _blob_path(self, digest, codec):
+        return os.path.join(self.directory, 'blobs', digest[:2], f"{digest}.{'zst' if codec == 'zstd' else 'z'}")
+
+    def _compress(self, body):
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=3).compress(body)
+        return zlib.compress(body, 6)
+
+    def _read_blob(self, digest, codec):
+        with open(self._blob_path(digest, codec), 'rb') as f:
+            data = f.read()
+        if codec == 'zstd':
+            if zstandard is None:
+                raise ImportError("this cache was written with zstd: pip install zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def is_fresh(self, entry, now=None):
+        if self.max_age is None:
+            return True
+        return (time.time() if now is None else now) - entry.stored_at < self.max_age
+
+    def get(self, key):
+        """The entry stored under key, or None (also counted as a miss)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT e.status, e.headers, e.blob, b.codec, e.stored_at FROM entries e "
+                "JOIN blobs b ON b.hash = e.blob WHERE e.key = ?", (key,)).fetchone()
+        if row is not None:
+            status, headers, digest, codec, stored_at = row
+            try:
+                body = self._read_blob(digest, codec)
+            except (OSError, zlib.error):
+                body = None
+            if body is not None:
+                with self._lock:
+                    self.stats['hits'] += 1
+                    self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._maybe_flush()
+                return CachedResponse(key, status, json.loads(headers), body, stored_at)
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key, method, url, status, headers, body):
+        """Store a response body (bytes) with its status and headers."""
+        digest = hashlib.sha256(body).hexdigest()
+        kept = {name.lower(): value for name, value in headers.items() if name.lower() not in _SKIPPED_HEADERS}
+        now = time.time()
+        with self._lock:
+            known = self._conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if not known:
+            data = self._compress(body)
+            path = self._blob_path(digest, self.codec)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            if not known:
+                cursor = self._conn.execute("INSERT OR IGNORE INTO blobs (hash, codec, size) VALUES (?, ?, ?)",
+                                            (digest, self.codec, len(data)))
+                self.size += len(data) if cursor.rowcount else 0
+            previous = self._conn.execute("SELECT blob FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (key, method.upper(), url, status, json.dumps(kept, ensure_ascii=False), digest,
+                                now, now))
+            if previous and previous[0] != digest:
+                self._drop_orphans([previous[0]])
+            self.stats['stored'] += 1
+            self._maybe_flush()
+            if self.max_bytes is not None and self.size > self.max_bytes:
+                self._evict()
+
+    def touch(self, key):
+        """Mark an entry as revalidated (a 304): it is fresh again."""
+        now = time.time()
+        with self._lock:
+            self.stats['revalidated'] += 1
+            self._conn.execute("UPDATE entries SET stored_at = ?, last_used = ? WHERE key = ?", (now, now, key))
+            self._maybe_flush()
+
+    def _evict(self):
+        # Drop least recently used entries until 90% of max_bytes, then their blobs if nothing else refers to them.
+        target = self.max_bytes * 0.9
+        while self.size > target:
+            rows = self._conn.execute("SELECT key, blob FROM entries ORDER BY last_used LIMIT 20").fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", ((key,) for key, _ in rows))
+            self.stats['evicted'] += len(rows)
+            self._drop_orphans({blob for _, blob in rows})
+        self._conn.commit()
+        self._pending = 0
+
+    def _drop_orphans(self, digests):
+        # Only the given blobs are checked, through the index on entries.blob, never the whole table.
+        orphans = [self._conn.execute(
+            "SELECT hash, codec, size FROM blobs WHERE hash = ? AND NOT EXISTS "
+            "(SELECT 1 FROM entries WHERE blob = ?)", (digest, digest)).fetchone() for digest in digests]
+        orphans = [row for row in orphans if row]
+        for digest, codec, size in orphans:
+            try:
+                os.remove(self._blob_path(digest, codec))
+            except FileNotFoundError:
+                pass
+            self.size -= size
+        self._conn.executemany("DELETE FROM blobs WHERE hash = ?", ((digest,) for digest, _, _ in orphans))
+
+    def _maybe_flush(self):
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._conn.commit()
+            self._pending = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def summary(self):
+        stats = self.stats
+        return (f"Cache: {stats['hits']} hits, {stats['misses']} misses, {stats['revalidated']} revalidated, "
+                f"{stats['stored']} stored, {stats['evicted']} evicted, {self.size / 1e6:.1f} MB on disk")
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+def miss_response(url):
+    """The 504 returned for a cache miss in replay mode."""
+    response = requests.Response()
+    response.status_code = 504
+    response.reason = 'Not in cache (replay mode)'
+    response._content = b''
+    response.url = url
+    response.from_cache = True
+    return response
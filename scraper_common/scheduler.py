@@ -0,0 +1,272 @@
+"""Priority job scheduler with per-source worker pools, start rates and a resumable job store.
+
+A crawl mixes jobs from several sources (Pantip topics, YouTube videos, a
+Wikipedia dump). Each source gets its own pool, so a CPU-bound wiki job in
+a process pool overlaps with network-bound scraping on threads instead of
+the two running one after the other. Within a source, jobs start in
+priority order (higher first, then the order they were added) and no
+faster than the source's `rate` jobs per second.
+
+Job outcomes are kept in a SQLite `JobStore`: finished jobs are never run
+again, a job that raises is retried with exponential backoff up to
+`max_attempts` times and is then recorded as failed. A job that was running
+when the process stopped is simply still pending on the next run.
+
+Handlers are plain functions `handler(params) -> result`, looked up by the
+job's kind, so the scheduler can be driven by stub handlers in tests and
+benchmarks. Handlers of a source with `processes=True` must be picklable
+(module-level functions).
+"""
+
+import heapq
+import itertools
+import json
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .progress import ProgressReporter
+
+class Job:
+    """One unit of work: `handler(params)` for the source's handler of `kind`."""
+
+    __slots__ = ('job_id', 'source', 'kind', 'params', 'priority', 'attempts')
+
+    def __init__(self, job_id, source, kind, params, priority=0, attempts=0):
+        self.job_id = job_id
+        self.source = source
+        self.kind = kind
+        self.params = params
+        self.priority = priority
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Job({self.job_id!r}, priority={self.priority}, attempts={self.attempts})"
+
+class Source:
+    """How the jobs of one source run.
+
+    Args:
+        name: source name used in job records.
+        handlers: dict of job kind -> handler function.
+        workers: jobs of this source running at once.
+        rate: job starts per second, 0 for no limit.
+        processes: run handlers in a process pool (for CPU-bound work).
+        max_attempts: tries per job before it is recorded as failed.
+        retry_delay: seconds before the first retry; doubles on each retry.
+    """
+
+    def __init__(self, name, handlers, workers=4, rate=0.0, processes=False, max_attempts=3, retry_delay=5.0):
+        self.name = name
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self.rate = rate
+        self.processes = processes
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+
+    @property
+    def interval(self):
+        return 1.0 / self.rate if self.rate and self.rate > 0 else 0.0
+
+    def new_executor(self):
+        if self.processes:
+            return ProcessPoolExecutor(self.workers)
+        return ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+
+class JobStore:
+    """SQLite record of every job and its outcome.
+
+    Adding a job that already exists keeps its status and attempts, but a
+    job that has not finished picks up the new priority and params. Status
+    updates are committed every `flush_every` changes and on `close`.
+    """
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, path, flush_every=20):
+        self.path = path
+        self.flush_every = flush_every
+        self._pending = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            result TEXT,
+            updated_at REAL NOT NULL)""")
+        self._conn.commit()
+
+    def add(self, jobs):
+        """Record jobs from a manifest; returns how many were not in the store yet."""
+        before = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                """INSERT INTO jobs (job_id, source, kind, params, priority, status, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (job_id) DO UPDATE SET priority = excluded.priority, params = excluded.params
+                   WHERE jobs.status != ?""",
+                ((job.job_id, job.source, job.kind, json.dumps(job.params, ensure_ascii=False), job.priority,
+                  self.PENDING, now, self.DONE) for job in jobs))
+        return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - before
+
+    def pending(self, retry_failed=False):
+        """Jobs still to run, highest priority first; failed ones too (from attempt 0) with retry_failed."""
+        condition = "status != ?" if retry_failed else "status = ?"
+        argument = self.DONE if retry_failed else self.PENDING
+        rows = self._conn.execute(
+            f"""SELECT job_id, source, kind, params, priority, attempts, status FROM jobs
+                WHERE {condition} ORDER BY priority DESC, rowid""", (argument,))
+        return [Job(job_id, source, kind, json.loads(params), priority,
+                    0 if status == self.FAILED else attempts)
+                for job_id, source, kind, params, priority, attempts, status in rows]
+
+    def _update(self, job, status, error=None, result=None):
+        self._conn.execute("UPDATE jobs SET status = ?, attempts = ?, error = ?, result = ?, updated_at = ? "
+                           "WHERE job_id = ?",
+                           (status, job.attempts, error, result, time.time(), job.job_id))
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def mark_done(self, job, result=None):
+        self._update(job, self.DONE, result=json.dumps(result, ensure_ascii=False, default=str))
+
+    def mark_retry(self, job, error):
+        """Record a failed attempt of a job that will be tried again."""
+        self._update(job, self.PENDING, error=error)
+
+    def mark_failed(self, job, error):
+        self._update(job, self.FAILED, error=error)
+
+    def counts(self):
+        """Number of jobs per (source, status)."""
+        return {(source, status): count for source, status, count in self._conn.execute(
+            "SELECT source, status, COUNT(*) FROM jobs GROUP BY source, status")}
+
+    def flush(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+def _describe(error):
+    return f"{type(error).__name__}: {error}"[:500]
+
+class Scheduler:
+    """Run the pending jobs of a `JobStore` on per-source pools.
+
+    The dispatch loop runs in the calling thread: it starts queued jobs
+    while their source has a free worker and its rate allows, then waits
+    for the next job to finish, retry to come due or rate slot to open.
+    Results and failures are recorded in the store as they arrive.
+
+    Args:
+        store: the `JobStore` to take jobs from and record outcomes in.
+        sources: `Source` objects; jobs of any other source fail at once.
+        progress_interval: seconds between progress lines, 0 disables.
+    """
+
+    def __init__(self, store, sources, progress_interval=5.0):
+        self.store = store
+        self.sources = {source.name: source for source in sources}
+        self.progress_interval = progress_interval
+
+    def run(self, retry_failed=False):
+        """Run until every pending job is done or failed; returns per-source stats."""
+        order = itertools.count()
+        queues = {name: [] for name in self.sources}
+        delayed = []
+        stats = {name: {'done': 0, 'failed': 0, 'retried': 0, 'busy_seconds': 0.0} for name in self.sources}
+        progress = ProgressReporter(interval=self.progress_interval)
+
+        for job in self.store.pending(retry_failed):
+            source = self.sources.get(job.source)
+            if source is None or job.kind not in source.handlers:
+                self.store.mark_failed(job, f"no handler for {job.source}/{job.kind}")
+                progress.add('failed')
+                continue
+            heapq.heappush(queues[job.source], (-job.priority, next(order), job))
+
+        executors = {name: source.new_executor() for name, source in self.sources.items()}
+        running = {}
+        in_flight = dict.fromkeys(self.sources, 0)
+        next_start = dict.fromkeys(self.sources, 0.0)
+        try:
+            while True:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    _, _, job = heapq.heappop(delayed)
+                    heapq.heappush(queues[job.source], (-job.priority, next(order), job))
+
+                wake_at = delayed[0][0] if delayed else None
+                for name, source in self.sources.items():
+                    queue = queues[name]
+                    while queue and in_flight[name] < source.workers:
+                        if next_start[name] > now:
+                            wake_at = next_start[name] if wake_at is None else min(wake_at, next_start[name])
+                            break
+                        _, _, job = heapq.heappop(queue)
+                        job.attempts += 1
+                        future = executors[name].submit(source.handlers[job.kind], job.params)
+                        running[future] = (job, time.monotonic())
+                        in_flight[name] += 1
+                        next_start[name] = max(next_start[name], now) + source.interval
+
+                if not running and wake_at is None:
+                    break
+                timeout = None if wake_at is None else max(0.0, wake_at - time.monotonic())
+                if not running:
+                    time.sleep(timeout)
+                    continue
+                finished, _ = wait(running, timeout, FIRST_COMPLETED)
+
+                for future in finished:
+                    job, started = running.pop(future)
+                    source = self.sources[job.source]
+                    in_flight[job.source] -= 1
+                    counters = stats[job.source]
+                    counters['busy_seconds'] += time.monotonic() - started
+                    error = future.exception()
+                    if error is None:
+                        self.store.mark_done(job, future.result())
+                        counters['done'] += 1
+                        progress.add('done')
+                        continue
+                    if isinstance(error, BrokenProcessPool):
+                        # A worker process died (killed, out of memory); the pool cannot be reused.
+                        executors[job.source].shutdown(wait=False)
+                        executors[job.source] = source.new_executor()
+                    if job.attempts < source.max_attempts:
+                        self.store.mark_retry(job, _describe(error))
+                        delay = source.retry_delay * 2 ** (job.attempts - 1)
+                        heapq.heappush(delayed, (time.monotonic() + delay, next(order), job))
+                        counters['retried'] += 1
+                        progress.add('retried')
+                    else:
+                        self.store.mark_failed(job, _describe(error))
+                        counters['failed'] += 1
+                        progress.add('failed')
+                        print(f"{job.job_id} failed after {job.attempts} attempts: {_describe(error)}")
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=not running, cancel_futures=True)
+            self.store.flush()
+
+        if self.progress_interval and progress.counters:
+            progress.report()
+        for counters in stats.values():
+            counters['busy_seconds'] = round(counters['busy_seconds'], 3)
+        stats['elapsed_seconds'] = round(progress.elapsed(), 3)
+        return stats
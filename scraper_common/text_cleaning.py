@@ -0,0 +1,81 @@
+"""Precompiled text cleaning shared by the scrapers.
+
+Each source describes its cleaning as an ordered list of steps and builds a
+`CleaningEngine` from it once at import time. The engine keeps the exact
+semantics of the `re.sub` chains it replaces (checked against
+`golden/cleaning_corpus.jsonl`), but avoids most of their cost:
+
+- patterns are compiled once instead of going through the `re` cache on
+  every call;
+- pure literal deletions use `str.replace`, which is the same
+  left-to-right, non-overlapping substitution as `re.sub` on an escaped
+  literal;
+- regex steps carry a literal guard (a substring every match must
+  contain), so a step whose pattern cannot match is skipped without
+  scanning the text with the regex engine;
+- several sequential substitutions are only merged into one alternation
+  where that is provably equivalent. In general it is not: a deletion can
+  create a match for a later rule, which a single pass would miss.
+"""
+
+import re
+
+class Literal:
+    """Replace every occurrence of a fixed string."""
+
+    def __init__(self, old, new=''):
+        self.old = old
+        self.new = new
+
+    def apply(self, text):
+        if self.old not in text:
+            return text
+        return text.replace(self.old, self.new)
+
+class Regex:
+    """Substitute a compiled pattern, skipped when `guard` is not in the text.
+
+    Several patterns are joined into one alternation in the given order.
+    """
+
+    def __init__(self, *patterns, repl='', guard=None, flags=0):
+        self.pattern = re.compile('|'.join(patterns), flags)
+        self.repl = repl
+        self.guard = guard
+
+    def apply(self, text):
+        if self.guard is not None and self.guard not in text:
+            return text
+        return self.pattern.sub(self.repl, text)
+
+class CollapseWhitespace:
+    """`re.sub(r'\\s+', ' ', text)`, optionally followed by `.strip()`.
+
+    With strip, this is `' '.join(text.split())`: `str.split()` and `\\s`
+    use the same definition of whitespace, and the join never leaves a
+    leading or trailing space.
+    """
+
+    _whitespace = re.compile(r'\s+')
+
+    def __init__(self, strip=True):
+        self.strip = strip
+
+    def apply(self, text):
+        if self.strip:
+            return ' '.join(text.split())
+        return self._whitespace.sub(' ', text)
+
+class CleaningEngine:
+    """Apply a fixed sequence of cleaning steps to text."""
+
+    def __init__(self, steps):
+        self.steps = tuple(steps)
+        self._appliers = tuple(step.apply for step in self.steps)
+
+    def clean(self, text):
+        for apply in self._appliers:
+            text = apply(text)
+        return text
+
+    __call__ = clean
@@ -0,0 +1,447 @@
+"""Benchmarks for the Wikipedia dump processor on synthetic dump fixtures.
+
+Usage:
+    python benchmark.py parallel [num_pages]
+    python benchmark.py memory
+    python benchmark.py download [size_mb]
+    python benchmark.py incremental [num_pages]
+    python benchmark.py parse [num_pages]
+"""
+
+import bz2
+import hashlib
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+MW_NS = 'http://www.mediawiki.org/xml/export-0.11/'
+
+WORDS = ['ประเทศไทย', 'กรุงเทพมหานคร', 'ประวัติศาสตร์', 'วัฒนธรรม', 'ภาษา', 'การศึกษา',
+         'เศรษฐกิจ', 'แม่น้ำเจ้าพระยา', 'ราชอาณาจักร', 'พุทธศาสนา', 'จังหวัด', 'อำเภอ']
+
+def make_wikitext(rng, paragraphs=6):
+    """Build wiki markup with the templates, links, refs and files real articles contain."""
+    parts = ['{{กล่องข้อมูล ประเทศ|ชื่อ=ตัวอย่าง|เมืองหลวง=[[กรุงเทพมหานคร]]}}']
+    for _ in range(paragraphs):
+        sentence = []
+        for _ in range(rng.randint(20, 40)):
+            word = rng.choice(WORDS)
+            roll = rng.random()
+            if roll < 0.15:
+                word = f'[[{word}|{rng.choice(WORDS)}]]'
+            elif roll < 0.2:
+                word = f"'''{word}'''"
+            elif roll < 0.23:
+                word = f'{word}<ref>{{{{cite web|url=http://example.com|title={word}}}}}</ref>'
+            sentence.append(word)
+        parts.append(' '.join(sentence) + ' ()')
+    parts.append('[[ไฟล์:Example.jpg|thumb|250px|คำอธิบายภาพ]]')
+    parts.append('== ดูเพิ่ม ==\n* [[ประเทศไทย]]\n\n[[หมวดหมู่:ตัวอย่าง]]')
+    return '\n\n'.join(parts)
+
+def page_xml(page_id, title, ns, text, revision_id=None):
+    return (f'  <page>\n    <title>{escape(title)}</title>\n    <ns>{ns}</ns>\n    <id>{page_id}</id>\n'
+            f'    <revision>\n      <id>{revision_id or page_id * 10}</id>\n'
+            f'      <text bytes="{len(text)}" xml:space="preserve">{escape(text)}</text>\n'
+            f'    </revision>\n  </page>\n')
+
+def make_multistream_dump(dump_path, index_path, num_pages, pages_per_stream=100, seed=0, edits=None):
+    """Write a synthetic multistream dump and its index, like the Wikimedia ones.
+
+    `edits` maps page_id to (revision_id, text) to simulate later dumps;
+    a text of None leaves the page out, as if it was deleted.
+    """
+    edits = edits or {}
+    rng = random.Random(seed)
+    header = (f'<mediawiki xmlns="{MW_NS}" version="0.11" xml:lang="th">\n'
+              '  <siteinfo>\n    <sitename>วิกิพีเดีย</sitename>\n  </siteinfo>\n')
+    index_lines = []
+    with open(dump_path, 'wb') as dump:
+        dump.write(bz2.compress(header.encode('utf-8')))
+        for first in range(1, num_pages + 1, pages_per_stream):
+            offset = dump.tell()
+            pages = []
+            for page_id in range(first, min(first + pages_per_stream, num_pages + 1)):
+                # Mix in some non-article namespaces like the real dump.
+                ns = 0 if page_id % 10 else 10
+                title = f'บทความ {page_id}' if ns == 0 else f'แม่แบบ:ตัวอย่าง {page_id}'
+                text = make_wikitext(rng)
+                revision_id, text = edits.get(page_id, (None, text))
+                if text is None:
+                    continue
+                pages.append(page_xml(page_id, title, ns, text, revision_id))
+                index_lines.append(f'{offset}:{page_id}:{title}\n')
+            dump.write(bz2.compress(''.join(pages).encode('utf-8')))
+        dump.write(bz2.compress(b'</mediawiki>\n'))
+    with bz2.open(index_path, 'wt', encoding='utf-8') as index:
+        index.writelines(index_lines)
+
+def bench_parallel(num_pages=5000):
+    """Report articles/sec of the parallel processor for 1, 2, 4 and 8 workers."""
+    import contextlib
+    import io
+    from wiki_parallel import process_wiki_dump_parallel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dump_path = os.path.join(tmp, 'fixture-multistream.xml.bz2')
+        index_path = os.path.join(tmp, 'fixture-multistream-index.txt.bz2')
+        make_multistream_dump(dump_path, index_path, num_pages)
+        with bz2.open(dump_path, 'rb') as f:
+            xml_size = len(f.read())
+        print(f"Fixture: {num_pages} pages, {xml_size / 1e6:.1f} MB XML, "
+              f"{os.path.getsize(dump_path) / 1e6:.1f} MB compressed, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'articles/sec':>13} {'elapsed s':>10}")
+        reference = None
+        for workers in (1, 2, 4, 8):
+            output_file = os.path.join(tmp, f'out-{workers}.jsonl')
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                saved = process_wiki_dump_parallel(dump_path, output_file, index_path,
+                                                   workers=workers, max_articles=0)
+            elapsed = time.perf_counter() - started
+            with open(output_file, 'rb') as f:
+                output = f.read()
+            # Output must not depend on the number of workers.
+            reference = reference or output
+            assert output == reference, f"output with {workers} workers differs"
+            print(f"{workers:>8} {saved / elapsed:>13.1f} {elapsed:>10.2f}")
+
+_MEMORY_RUN = """
+import bz2, json, resource, sys
+from wiki_processor import extract_article, iter_pages, process_wiki_dump
+dump_path, output_file, mode = sys.argv[1:4]
+if mode == 'streaming':
+    process_wiki_dump(dump_path, output_file, max_articles=0)
+else:
+    # The previous implementation: collect every article, write at the end.
+    articles = []
+    with bz2.open(dump_path, 'rt', encoding='utf-8') as f:
+        for page_id, ns, title, revision_id, text in iter_pages(f):
+            article = extract_article(title, ns, text)
+            if article:
+                articles.append(article)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for article in articles:
+            f.write(json.dumps(article, ensure_ascii=False) + '\\n')
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)
+"""
+
+def bench_memory(sizes=(500, 2000, 8000)):
+    """Peak RSS of a full extraction for growing dumps, accumulating vs streaming (Linux)."""
+    import subprocess
+
+    print(f"{'pages':>8} {'accumulate MB':>14} {'streaming MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_pages in sizes:
+            dump_path = os.path.join(tmp, f'fixture-{num_pages}.xml.bz2')
+            make_multistream_dump(dump_path, os.path.join(tmp, 'index.txt.bz2'), num_pages)
+            peaks = []
+            for mode in ('accumulate', 'streaming'):
+                result = subprocess.run(
+                    [sys.executable, '-c', _MEMORY_RUN, dump_path, os.path.join(tmp, 'out.jsonl'), mode],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+                # ru_maxrss is in KB on Linux.
+                peaks.append(int(result.stderr.strip().splitlines()[-1]) / 1024)
+            print(f"{num_pages:>8} {peaks[0]:>14.1f} {peaks[1]:>13.1f}")
+
+class RangeFileHandler(BaseHTTPRequestHandler):
+    """Serves one file with Range support, plus a sha1sums listing for it.
+
+    The first `drops` GET requests are cut off after `drop_after` bytes to
+    simulate a connection lost mid-download, and the first `unavailable`
+    file GETs are answered with 503.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    data = b''
+    filename = 'thwiki-latest-pages-articles.xml.bz2'
+    sha1sums = ''
+    drops = 0
+    drop_after = 0
+    unavailable = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send_file_headers(self, status, start, end):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"fixture"')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(self.data)}')
+        self.end_headers()
+
+    def _range(self):
+        header = self.headers.get('Range')
+        if not header:
+            return 200, 0, len(self.data)
+        first, last = header.split('=', 1)[1].split('-')
+        return 206, int(first), (int(last) + 1 if last else len(self.data))
+
+    def do_HEAD(self):
+        self._send_file_headers(200, 0, len(self.data))
+
+    def do_GET(self):
+        if self.path.endswith('-sha1sums.txt'):
+            body = self.sha1sums.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.endswith('-md5sums.txt'):
+            self.send_error(404)
+            return
+        if RangeFileHandler.unavailable > 0:
+            RangeFileHandler.unavailable -= 1
+            self.send_error(503)
+            return
+        status, start, end = self._range()
+        self._send_file_headers(status, start, end)
+        if RangeFileHandler.drops > 0:
+            RangeFileHandler.drops -= 1
+            self.wfile.write(self.data[start:min(end, start + self.drop_after)])
+            self.close_connection = True
+            return
+        view = memoryview(self.data)
+        for offset in range(start, end, 1024 * 1024):
+            self.wfile.write(view[offset:min(end, offset + 1024 * 1024)])
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def _serve_file(path, sha1sums, drops, drop_after, unavailable, port_queue):
+    with open(path, 'rb') as f:
+        RangeFileHandler.data = f.read()
+    RangeFileHandler.sha1sums = sha1sums
+    RangeFileHandler.drops = drops
+    RangeFileHandler.drop_after = drop_after
+    RangeFileHandler.unavailable = unavailable
+    server = StubServer(('127.0.0.1', 0), RangeFileHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def start_file_server(path, sha1sums, drops=0, drop_after=0, unavailable=0):
+    """Serve path from a child process; returns (process, url of the file).
+
+    The first `drops` file GETs close the connection after `drop_after`
+    bytes; the first `unavailable` GETs are answered with 503.
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_file,
+                                      args=(path, sha1sums, drops, drop_after, unavailable, port_queue),
+                                      daemon=True)
+    process.start()
+    port = port_queue.get(timeout=10)
+    return process, f"http://127.0.0.1:{port}/thwiki/latest/{RangeFileHandler.filename}"
+
+def bench_download(size_mb=64):
+    """Download throughput for 1 and 4 segments, a resumed download and a checksum failure."""
+    import contextlib
+    import io
+    from dump_downloader import ChecksumMismatch
+    from wiki_processor import download_wiki_dump
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.bin')
+        data = random.Random(0).randbytes(size_mb * 1024 * 1024)
+        with open(source, 'wb') as f:
+            f.write(data)
+        sha1 = hashlib.sha1(data).hexdigest()
+        sums = f"{sha1}  thwiki-20240101-pages-articles.xml.bz2\n"
+        target = os.path.join(tmp, 'dump.xml.bz2')
+
+        def run(url, **kwargs):
+            if os.path.exists(target):
+                os.remove(target)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()) as log:
+                download_wiki_dump(url, target, **kwargs)
+            elapsed = time.perf_counter() - started
+            with open(target, 'rb') as f:
+                assert hashlib.sha1(f.read()).hexdigest() == sha1, "downloaded file differs"
+            return elapsed, log.getvalue()
+
+        print(f"{'scenario':>24} {'MB/s':>8} {'elapsed s':>10}")
+        process, url = start_file_server(source, sums)
+        try:
+            for segments in (1, 4):
+                elapsed, _ = run(url, segments=segments)
+                print(f"{f'{segments} segment(s)':>24} {size_mb / elapsed:>8.1f} {elapsed:>10.2f}")
+        finally:
+            process.terminate()
+
+        # Two dropped connections: the downloader resumes from the saved offsets.
+        process, url = start_file_server(source, sums, drops=2, drop_after=size_mb * 1024 * 1024 // 3)
+        try:
+            elapsed, log = run(url)
+            resumes = log.count('Download interrupted')
+            print(f"{f'resumed x{resumes}':>24} {size_mb / elapsed:>8.1f} {elapsed:>10.2f}")
+            assert resumes == 2
+        finally:
+            process.terminate()
+
+        # The dump GET is answered with 503 twice: the client's retry policy retries it.
+        process, url = start_file_server(source, sums, unavailable=2)
+        try:
+            elapsed, log = run(url)
+            retries = int(log.split('retries ')[1].split()[0])
+            print(f"{f'503 retried x{retries}':>24} {size_mb / elapsed:>8.1f} {elapsed:>10.2f}")
+            assert retries == 2
+        finally:
+            process.terminate()
+
+        process, url = start_file_server(source, sums.replace(sha1, '0' * 40))
+        try:
+            os.remove(target)
+            with contextlib.redirect_stdout(io.StringIO()):
+                download_wiki_dump(url, target)
+        except ChecksumMismatch:
+            assert not os.path.exists(target) and not os.path.exists(target + '.part')
+            print(f"{'bad checksum':>24} rejected, nothing left at the target path")
+        else:
+            raise AssertionError("a bad checksum was accepted")
+        finally:
+            process.terminate()
+
+def bench_incremental(num_pages=5000):
+    """Re-run time of a full extraction vs an incremental one after a small set of edits."""
+    import contextlib
+    import io
+    import json
+    from wiki_incremental import process_wiki_incremental
+    from wiki_processor import iter_pages, process_wiki_dump
+
+    rng = random.Random(1)
+    article_ids = [i for i in range(1, num_pages + 1) if i % 10]
+    edits = {}
+    for page_id in rng.sample(article_ids, len(article_ids) * 7 // 100):
+        roll = rng.random()
+        if roll < 0.7:
+            edits[page_id] = (page_id * 10 + 1, make_wikitext(rng))  # edited
+        elif roll < 0.85:
+            edits[page_id] = (page_id * 10 + 1, None)  # deleted
+        else:
+            edits[page_id] = (page_id * 10 + 2, '')  # null edit, text filled in below
+    grown = num_pages + num_pages // 20  # new pages
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, 'index.txt.bz2')
+        old_dump = os.path.join(tmp, 'old.xml.bz2')
+        new_dump = os.path.join(tmp, 'new.xml.bz2')
+        make_multistream_dump(old_dump, index_path, num_pages)
+        # Null edits keep the old text under a new revision id.
+        with bz2.open(old_dump, 'rt', encoding='utf-8') as f:
+            for page_id, _, _, _, text in iter_pages(f):
+                if edits.get(page_id, (0, None))[1] == '':
+                    edits[page_id] = (edits[page_id][0], text)
+        make_multistream_dump(new_dump, index_path, grown, edits=edits)
+
+        dataset = os.path.join(tmp, 'dataset.jsonl')
+        full_output = os.path.join(tmp, 'full.jsonl')
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_wiki_incremental(old_dump, dataset, merge=True)
+        timings = {}
+        for name, run in (('full', lambda: process_wiki_dump(new_dump, full_output, max_articles=0)),
+                          ('incremental', lambda: process_wiki_incremental(new_dump, dataset, merge=True))):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run()
+            timings[name] = time.perf_counter() - started
+
+        def records(path):
+            with open(path, encoding='utf-8') as f:
+                return sorted(f.read().splitlines())
+        # The merged dataset must hold exactly what a full run produces.
+        assert records(dataset) == records(full_output), "merged dataset differs from a full run"
+        delta = os.path.join(tmp, 'dataset.delta.jsonl')
+        with open(delta, encoding='utf-8') as f:
+            ops = [json.loads(line)['op'] for line in f]
+        print(f"Delta: {ops.count('add')} added, {ops.count('change')} changed, {ops.count('delete')} deleted "
+              f"out of {grown} pages")
+        print(f"{'mode':>12} {'elapsed s':>10}")
+        for name, elapsed in timings.items():
+            print(f"{name:>12} {elapsed:>10.2f}")
+
+def legacy_iter_pages(xml_file):
+    """The ElementTree page loop PageParser replaced, kept as the "before" in bench_parse."""
+    ns = {'mw': MW_NS}
+    context = ET.iterparse(xml_file, events=('end',))
+    for event, elem in context:
+        if elem.tag == f"{{{ns['mw']}}}page":
+            id_elem = elem.find('mw:id', ns)
+            title_elem = elem.find('mw:title', ns)
+            ns_elem = elem.find('mw:ns', ns)
+            revisions = elem.findall('mw:revision', ns)
+            if id_elem is not None and title_elem is not None and ns_elem is not None and revisions:
+                revision = revisions[-1]
+                rev_id_elem = revision.find('mw:id', ns)
+                text_elem = revision.find('mw:text', ns)
+                if rev_id_elem is not None and text_elem is not None:
+                    yield (int(id_elem.text), ns_elem.text, title_elem.text, int(rev_id_elem.text),
+                           text_elem.text)
+            elem.clear()
+
+def bench_parse(num_pages=5000):
+    """Parse throughput on already-decompressed XML, separately from cleaning."""
+    import io
+    from wiki_processor import ARTICLE_NAMESPACES, PageParser, extract_article
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dump_path = os.path.join(tmp, 'fixture.xml.bz2')
+        make_multistream_dump(dump_path, os.path.join(tmp, 'index.txt.bz2'), num_pages)
+        with bz2.open(dump_path, 'rb') as f:
+            xml_bytes = f.read()
+    size_mb = len(xml_bytes) / 1e6
+    print(f"Fixture: {num_pages} pages, {size_mb:.1f} MB XML")
+
+    expected = list(legacy_iter_pages(io.BytesIO(xml_bytes)))
+    parsers = [
+        ('ElementTree', lambda: list(legacy_iter_pages(io.BytesIO(xml_bytes)))),
+        ('expat', lambda: list(PageParser().parse(io.BytesIO(xml_bytes)))),
+        ('expat ns=0', lambda: list(PageParser(ARTICLE_NAMESPACES).parse(io.BytesIO(xml_bytes)))),
+    ]
+    print(f"{'parser':>12} {'MB/s':>8} {'pages/s':>10}")
+    for name, run in parsers:
+        started = time.perf_counter()
+        pages = run()
+        elapsed = time.perf_counter() - started
+        if name == 'expat':
+            assert pages == expected, "expat parser output differs from ElementTree"
+        elif name == 'expat ns=0':
+            assert pages == [page for page in expected if page[1] == '0']
+        print(f"{name:>12} {size_mb / elapsed:>8.1f} {num_pages / elapsed:>10.0f}")
+
+    # Cleaning cost on the same pages, for comparison.
+    started = time.perf_counter()
+    for page_id, ns, title, revision_id, text in expected:
+        extract_article(title, ns, text)
+    elapsed = time.perf_counter() - started
+    print(f"{'cleaning':>12} {size_mb / elapsed:>8.1f} {num_pages / elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'parallel'
+    args = [int(a) for a in sys.argv[2:]]
+    if command == 'parallel':
+        bench_parallel(*args)
+    elif command == 'memory':
+        bench_memory(*([args] if args else []))
+    elif command == 'download':
+        bench_download(*args)
+    elif command == 'incremental':
+        bench_incremental(*args)
+    elif command == 'parse':
+        bench_parse(*args)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,228 @@
+"""Resumable, optionally segmented download of large dump files.
+
+Data goes to `<output>.part`, with per-segment progress recorded in
+`<output>.part.state`. An interrupted download resumes from the recorded
+offsets with HTTP Range requests. Once complete, the file is checked against
+the published sha1/md5 sum and only then renamed into place, so a file at
+the final path is always complete.
+
+Failed requests (5xx, 429, refused connections) are retried by the client's
+retry policy; a connection that drops mid-file is resumed after a jittered
+backoff.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scraper_common.rate_limit import jittered_backoff
+
+CHUNK_SIZE = 1024 * 1024
+WRITE_BUFFER = 8 * 1024 * 1024
+# Save segment progress after this many bytes of each segment.
+STATE_EVERY = 16 * 1024 * 1024
+# Byte ranges must refer to the stored bytes, not a transparently decoded body.
+IDENTITY = {'Accept-Encoding': 'identity'}
+
+class ChecksumMismatch(Exception):
+    pass
+
+def checksum_urls(url):
+    """Published sha1/md5 sum files for a dumps.wikimedia.org file URL.
+
+    `.../thwiki/latest/thwiki-latest-pages-articles.xml.bz2` ->
+    `.../thwiki/latest/thwiki-latest-sha1sums.txt` (and md5sums).
+    """
+    directory, filename = url.rsplit('/', 1)
+    prefix = '-'.join(filename.split('-')[:2])
+    return [('sha1', f"{directory}/{prefix}-sha1sums.txt"), ('md5', f"{directory}/{prefix}-md5sums.txt")]
+
+def parse_checksums(text, filename):
+    """Find filename's sum in a `<hash>  <filename>` listing.
+
+    The listing in `latest/` names the dated files, so `latest` in filename
+    also matches an 8-digit dump date.
+    """
+    pattern = re.compile(re.escape(filename).replace('latest', r'(?:latest|\d{8})') + '$')
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and pattern.match(parts[1]):
+            return parts[0].lower()
+    return None
+
+def fetch_expected_checksum(client, url):
+    """Return (algorithm, hex digest) from the published sums, or (None, None)."""
+    filename = url.rsplit('/', 1)[1]
+    for algorithm, sums_url in checksum_urls(url):
+        try:
+            response = client.get(sums_url)
+        except Exception as e:
+            print(f"Could not fetch {sums_url}: {e}")
+            continue
+        if response.status_code == 200:
+            digest = parse_checksums(response.text, filename)
+            if digest:
+                return algorithm, digest
+    return None, None
+
+def file_digest(path, algorithm):
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(WRITE_BUFFER)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+class _DownloadState:
+    """Segment progress for a .part file, saved atomically as JSON."""
+
+    def __init__(self, path, url, size, validator, segments):
+        self.path = path
+        self.url = url
+        self.size = size
+        self.validator = validator
+        self.segments = segments  # [start, end_exclusive, done]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, url, size, validator):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('url') != url or data.get('size') != size or data.get('validator') != validator:
+            return None
+        return cls(path, url, size, validator, data['segments'])
+
+    def update(self, index, done):
+        with self._lock:
+            self.segments[index][2] = done
+            self.save()
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': self.url, 'size': self.size, 'validator': self.validator,
+                       'segments': self.segments}, f)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def downloaded(self):
+        return sum(done for _, _, done in self.segments)
+
+def _probe(client, url):
+    """Return (size or None, supports ranges, validator) from a HEAD request."""
+    response = client.request('HEAD', url, headers=IDENTITY)
+    response.raise_for_status()
+    size = response.headers.get('Content-Length')
+    ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+    return (int(size) if size is not None else None), ranges, validator
+
+def _download_segment(client, url, part_path, state, index):
+    start, end, done = state.segments[index]
+    if start + done >= end:
+        return
+    headers = dict(IDENTITY)
+    headers['Range'] = f"bytes={start + done}-{end - 1}"
+    try:
+        with client.stream('GET', url, headers=headers) as response:
+            if response.status_code == 200 and start + done > 0:
+                raise IOError(f"server ignored the Range request for {url}")
+            response.raise_for_status()
+            with open(part_path, 'r+b', buffering=WRITE_BUFFER) as f:
+                f.seek(start + done)
+                since_save = 0
+                for chunk in client.iter_chunks(response, CHUNK_SIZE):
+                    chunk = chunk[:end - start - done]
+                    f.write(chunk)
+                    done += len(chunk)
+                    since_save += len(chunk)
+                    if since_save >= STATE_EVERY:
+                        # Data must reach the file before the state claims it.
+                        f.flush()
+                        state.update(index, done)
+                        since_save = 0
+                    if start + done >= end:
+                        break
+    finally:
+        # The file is closed (flushed) by now, so everything counted is on disk.
+        state.update(index, done)
+    if start + done < end:
+        raise IOError(f"connection closed after {done} of {end - start} bytes")
+
+def _download_unranged(client, url, part_path):
+    """Plain streaming download for servers without Range support; no resume."""
+    with client.stream('GET', url, headers=IDENTITY) as response:
+        response.raise_for_status()
+        with open(part_path, 'wb', buffering=WRITE_BUFFER) as f:
+            for chunk in client.iter_chunks(response, CHUNK_SIZE):
+                f.write(chunk)
+
+def download_file(client, url, output_path, segments=1, retries=3, checksum=None):
+    """Download url to output_path, resuming any earlier partial download.
+
+    Args:
+        client: scraper_common HttpClient (its pool should allow `segments`
+            connections).
+        segments: number of byte ranges fetched in parallel.
+        retries: how many times to resume after a dropped connection,
+            waiting a jittered backoff before each.
+        checksum: (algorithm, hex digest) to verify before the rename.
+    """
+    part_path = output_path + '.part'
+    state_path = part_path + '.state'
+    size, ranges, validator = _probe(client, url)
+
+    if not ranges or not size:
+        print("Server does not support Range requests; downloading without resume")
+        _download_unranged(client, url, part_path)
+    else:
+        state = _DownloadState.load(state_path, url, size, validator) if os.path.exists(part_path) else None
+        if state is None:
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+            bounds = [size * i // segments for i in range(segments + 1)]
+            state = _DownloadState(state_path, url, size, validator,
+                                   [[bounds[i], bounds[i + 1], 0] for i in range(segments)])
+            state.save()
+        elif state.downloaded:
+            print(f"Resuming {output_path}: {state.downloaded / 1e6:.1f} of {size / 1e6:.1f} MB already downloaded")
+
+        for attempt in range(retries + 1):
+            pending = [i for i, (start, end, done) in enumerate(state.segments) if start + done < end]
+            if not pending:
+                break
+            with ThreadPoolExecutor(len(pending)) as pool:
+                futures = [pool.submit(_download_segment, client, url, part_path, state, i) for i in pending]
+                errors = [future.exception() for future in futures]
+            errors = [e for e in errors if e is not None]
+            if not errors:
+                break
+            if attempt == retries:
+                raise errors[0]
+            print(f"Download interrupted ({errors[0]}); resuming at {state.downloaded / 1e6:.1f} MB")
+            time.sleep(jittered_backoff(attempt))
+
+    if checksum and checksum[0]:
+        algorithm, expected = checksum
+        actual = file_digest(part_path, algorithm)
+        if actual != expected:
+            os.remove(part_path)
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            raise ChecksumMismatch(f"{algorithm} of {url} is {actual}, expected {expected}")
+        print(f"Verified {algorithm} {actual}")
+
+    os.replace(part_path, output_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
@@ -0,0 +1,251 @@
+"""Incremental processing: only pages whose revision changed are cleaned again.
+
+A SQLite index next to the output maps page_id -> (revision_id, hash of the
+raw wikitext, title, whether the page produced an article). On each run:
+
+- a page whose revision id is unchanged is skipped before any parsing;
+- a page with a new revision but identical wikitext only has its revision
+  id updated;
+- everything else is cleaned and written to a delta file as an `add` or
+  `change` record, or `delete` if it no longer yields an article;
+- main-namespace pages from the index that are missing from a full dump are
+  written as `delete` records.
+
+With `merge`, the delta is also applied to the existing dataset. The index
+is committed only after the delta (and merge) are complete, so an
+interrupted run is simply repeated.
+
+Adds-changes dumps (`*-pages-meta-hist-incr.xml.bz2`) only contain changed
+pages, so they produce no deletions, and a revision older than the one
+already indexed is ignored.
+"""
+
+import bz2
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+
+from wiki_processor import (
+    ARTICLE_NAMESPACES, DEFAULT_MAX_CHARS, DEFAULT_MIN_LENGTH, DEFAULT_PROGRESS_INTERVAL,
+    CountingReader, PageParser, count_pages, extract_article, finish_progress, new_progress,
+)
+from scraper_common.jsonl_writer import JsonlWriter, iter_jsonl, output_path
+
+ADD = 'add'
+CHANGE = 'change'
+DELETE = 'delete'
+
+def content_hash(text):
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+
+class RevisionIndex:
+    """page_id -> revision id, wikitext hash, title and kept flag from the last run.
+
+    Revision ids are loaded into a dict up front so the common case, an
+    unchanged page, is a dict lookup. Updates go to SQLite in batches inside
+    one open transaction and only become visible to the next run once
+    `commit` is called; `revisions` keeps the state of the last commit.
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pages (page_id INTEGER PRIMARY KEY, "
+                           "revision_id INTEGER NOT NULL, content_hash TEXT NOT NULL, "
+                           "title TEXT NOT NULL, kept INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self.revisions = dict(self._conn.execute("SELECT page_id, revision_id FROM pages"))
+        self._pending = []
+
+    def __len__(self):
+        return len(self.revisions)
+
+    def get(self, page_id):
+        """Return (content_hash, title, kept) for page_id, or None."""
+        return self._conn.execute("SELECT content_hash, title, kept FROM pages WHERE page_id = ?",
+                                  (page_id,)).fetchone()
+
+    def kept_pages(self):
+        """Return [(page_id, title)] of pages that produced an article last run."""
+        return self._conn.execute("SELECT page_id, title FROM pages WHERE kept = 1").fetchall()
+
+    def get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def update(self, page_id, revision_id, digest, title, kept):
+        self._pending.append((page_id, revision_id, digest, title, int(kept)))
+        if len(self._pending) >= self.batch_size:
+            self._write_pending()
+
+    def delete(self, page_id):
+        self._write_pending()
+        self._conn.execute("DELETE FROM pages WHERE page_id = ?", (page_id,))
+
+    def _write_pending(self):
+        self._conn.executemany("INSERT OR REPLACE INTO pages (page_id, revision_id, content_hash, title, kept) "
+                               "VALUES (?, ?, ?, ?, ?)", self._pending)
+        self._pending.clear()
+
+    def commit(self, **meta):
+        self._write_pending()
+        self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items())
+        self._conn.commit()
+        self.revisions = dict(self._conn.execute("SELECT page_id, revision_id FROM pages"))
+
+    def close(self):
+        # Uncommitted updates are rolled back.
+        self._conn.close()
+
+def iter_changes(pages, index, full_dump=True, min_length=DEFAULT_MIN_LENGTH, max_chars=DEFAULT_MAX_CHARS,
+                 reclean=False, stats=None):
+    """Compare pages against the index and yield delta records, updating the index.
+
+    With `reclean`, pages are cleaned again even when their revision is
+    unchanged (used when the cleaning options differ from the last run).
+    """
+    stats = stats if stats is not None else {}
+    for key in ('unchanged', 'same_content', 'cleaned'):
+        stats.setdefault(key, 0)
+    seen = set()
+    for page_id, ns, title, revision_id, text in pages:
+        if ns != '0':
+            continue
+        seen.add(page_id)
+        indexed_revision = index.revisions.get(page_id)
+        if indexed_revision is not None and not reclean:
+            if indexed_revision == revision_id or (not full_dump and indexed_revision > revision_id):
+                stats['unchanged'] += 1
+                continue
+        digest = content_hash(text)
+        previous = index.get(page_id) if indexed_revision is not None else None
+        if previous and previous[0] == digest and previous[1] == title and not reclean:
+            # A new revision with identical wikitext (e.g. a null edit).
+            index.update(page_id, revision_id, digest, title, previous[2])
+            stats['same_content'] += 1
+            continue
+        stats['cleaned'] += 1
+        article = extract_article(title, ns, text, min_length, max_chars)
+        index.update(page_id, revision_id, digest, title, article is not None)
+        if article and previous and previous[2]:
+            yield dict(op=CHANGE, page_id=page_id, revision_id=revision_id, previous_title=previous[1], **article)
+        elif article:
+            yield dict(op=ADD, page_id=page_id, revision_id=revision_id, **article)
+        elif previous and previous[2]:
+            yield {'op': DELETE, 'page_id': page_id, 'title': previous[1]}
+    if full_dump:
+        # Pages gone from the main namespace were deleted or moved out of it.
+        for page_id, title in index.kept_pages():
+            if page_id not in seen:
+                index.delete(page_id)
+                yield {'op': DELETE, 'page_id': page_id, 'title': title}
+        for page_id in set(index.revisions) - seen:
+            index.delete(page_id)
+
+def merge_delta(dataset_file, delta_file, compression=None, batch_size=100, rebuild=False):
+    """Apply a delta file to the dataset, writing a new file that replaces it atomically.
+
+    Dataset records are keyed by title: records for changed or deleted
+    pages are dropped, then the new versions of added and changed pages are
+    appended. With `rebuild`, the old dataset is discarded.
+    """
+    replaced = set()
+    for record in iter_jsonl(delta_file, compression):
+        if record['op'] == DELETE:
+            replaced.add(record['title'])
+        elif record['op'] == CHANGE:
+            replaced.update((record['title'], record['previous_title']))
+    tmp_path = dataset_file + '.merge'
+    kept = 0
+    with JsonlWriter(tmp_path, compression, batch_size) as writer:
+        if os.path.exists(output_path(dataset_file, compression)) and not rebuild:
+            for record in iter_jsonl(dataset_file, compression):
+                if record['title'] not in replaced:
+                    writer.write(record)
+            kept = writer.records
+        for record in iter_jsonl(delta_file, compression):
+            if record['op'] != DELETE:
+                writer.write({'title': record['title'], 'content': record['content']})
+        total = writer.records
+    dataset_file = output_path(dataset_file, compression)
+    os.replace(writer.paths[0], dataset_file)
+    print(f"Merged into {dataset_file}: {kept} unchanged + {total - kept} new or changed articles")
+
+def _options_key(min_length, max_chars):
+    return json.dumps({'min_length': min_length, 'max_chars': max_chars or 0})
+
+def process_wiki_incremental(dump_path, output_file, index_path=None, delta_file=None, merge=False,
+                             full_dump=True, compression=None, batch_size=100,
+                             min_length=DEFAULT_MIN_LENGTH, max_chars=DEFAULT_MAX_CHARS,
+                             stats_file=None, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+    """Write the changes in dump_path since the last run to delta_file (and merge them).
+
+    Returns the number of delta records.
+    """
+    index_path = index_path or output_file + '.revisions.sqlite'
+    delta_file = delta_file or default_delta_path(output_file)
+    index = RevisionIndex(index_path)
+    try:
+        first_run = len(index) == 0
+        options = _options_key(min_length, max_chars)
+        reclean = not first_run and index.get_meta('options') != options
+        if first_run and not full_dump:
+            print(f"No revision index at {index_path} yet; run --incremental on a full dump first "
+                  f"so that the adds-changes dumps apply to a known state")
+        elif first_run:
+            print(f"No revision index at {index_path} yet; every article is an add")
+        elif reclean:
+            print("Cleaning options changed since the last run; cleaning every page again")
+        print(f"Processing {dump_path} incrementally ({len(index)} pages indexed)...")
+
+        stats = {}
+        ops = {ADD: 0, CHANGE: 0, DELETE: 0}
+        with open(dump_path, 'rb') as raw, bz2.BZ2File(raw) as decompressed, \
+                JsonlWriter(delta_file, compression, batch_size) as writer:
+            progress = new_progress(os.path.getsize(dump_path), raw.tell, progress_interval)
+            parser = PageParser(ARTICLE_NAMESPACES)
+            pages = count_pages(parser.parse(CountingReader(decompressed, progress)), progress, parser)
+            for record in iter_changes(pages, index, full_dump, min_length, max_chars, reclean, stats):
+                writer.write(record)
+                ops[record['op']] += 1
+                progress.set('output_bytes', writer.bytes_written)
+                progress.add('deletes' if record['op'] == DELETE else 'articles')
+            print(f"Delta: {ops[ADD]} added, {ops[CHANGE]} changed, {ops[DELETE]} deleted; "
+                  f"{stats['unchanged']} pages unchanged, {stats['same_content']} with identical text, "
+                  f"{stats['cleaned']} cleaned")
+            finish_progress(progress, writer, stats_file, dump_path=dump_path, schema=parser.schema, incremental=True,
+                            **{f"{op}s": count for op, count in ops.items()}, **stats)
+        if merge:
+            merge_delta(output_file, delta_file, compression, batch_size,
+                        rebuild=full_dump and (first_run or reclean))
+        index.commit(options=options)
+    finally:
+        index.close()
+    return sum(ops.values())
+
+def default_delta_path(output_file):
+    base, ext = os.path.splitext(output_file)
+    return f"{base}.delta{ext or '.jsonl'}"
+
+def find_incr_dumps(directory, wiki='thwiki'):
+    """Local adds-changes dumps for wiki, oldest first."""
+    pattern = os.path.join(directory, f"{wiki}-*-pages-meta-hist-incr.xml.bz2")
+    dated = []
+    for path in glob.glob(pattern):
+        match = re.search(r'-(\d{8})-pages-meta-hist-incr', os.path.basename(path))
+        if match:
+            dated.append((match.group(1), path))
+    return [path for _, path in sorted(dated)]
+
+def apply_incr_dumps(paths, output_file, index_path=None, merge=False, compression=None, **options):
+    """Apply adds-changes dumps in date order, one delta file per dump."""
+    for path in paths:
+        date = re.search(r'-(\d{8})-', os.path.basename(path)).group(1)
+        base, ext = os.path.splitext(default_delta_path(output_file))
+        process_wiki_incremental(path, output_file, index_path, f"{base}-{date}{ext}", merge,
+                                 full_dump=False, compression=compression, **options)
@@ -0,0 +1,135 @@
+"""Parallel processing of the multistream Wikipedia dump.
+
+The `-multistream.xml.bz2` dump is a concatenation of independent bz2
+streams: a header stream with `<siteinfo>`, then streams of 100 `<page>`
+elements each. The companion index lists `offset:page_id:title` for every
+page, where offset is the byte position of the stream holding the page.
+Workers decompress and clean groups of streams by byte range, and results
+are written back in stream order so the output is deterministic.
+"""
+
+import bz2
+import io
+import os
+from multiprocessing import Pool
+
+from wiki_processor import (
+    ARTICLE_NAMESPACES, DEFAULT_MAX_CHARS, DEFAULT_MIN_LENGTH, DEFAULT_PROGRESS_INTERVAL,
+    PageParser, finish_progress, iter_articles, new_progress,
+)
+from scraper_common.jsonl_writer import JsonlWriter
+
+# bz2 stream header ("BZh" + block size 1-9) followed by the block magic.
+_STREAM_MAGIC = b'1AY&SY'
+
+def read_stream_offsets(index_path):
+    """Return the sorted, de-duplicated stream offsets listed in a multistream index."""
+    opener = bz2.open if index_path.endswith('.bz2') else open
+    offsets = set()
+    with opener(index_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            offset = line.split(':', 1)[0]
+            if offset.isdigit():
+                offsets.add(int(offset))
+    return sorted(offsets)
+
+def scan_stream_offsets(dump_path, read_size=16 * 1024 * 1024):
+    """Find bz2 stream starts by scanning the dump when no index file is available."""
+    offsets = []
+    overlap = 10
+    with open(dump_path, 'rb') as f:
+        position = 0
+        tail = b''
+        while True:
+            block = f.read(read_size)
+            if not block:
+                break
+            data = tail + block
+            base = position - len(tail)
+            start = 0
+            while True:
+                found = data.find(b'BZh', start)
+                if found < 0 or found + 10 > len(data):
+                    break
+                if data[found + 3:found + 4] in b'123456789' and data[found + 4:found + 10] == _STREAM_MAGIC:
+                    offsets.append(base + found)
+                start = found + 1
+            position += len(block)
+            tail = data[-overlap:]
+    return sorted(set(offsets))
+
+def build_chunks(offsets, file_size, streams_per_chunk):
+    """Group consecutive streams into (start, end) byte ranges.
+
+    The header stream before the first page stream is skipped; the last
+    range runs to the end of the file.
+    """
+    bounds = list(offsets) + [file_size]
+    chunks = []
+    for i in range(0, len(offsets), streams_per_chunk):
+        chunks.append((bounds[i], bounds[min(i + streams_per_chunk, len(offsets))]))
+    return chunks
+
+def process_chunk(task):
+    """Decompress one byte range of the dump and clean its pages.
+
+    Returns (articles in page order, pages seen, decompressed bytes).
+    """
+    dump_path, start, end, min_length, max_chars = task
+    with open(dump_path, 'rb') as f:
+        f.seek(start)
+        raw = f.read(end - start)
+    # bz2.decompress handles the concatenated streams in the range.
+    data = bz2.decompress(raw)
+    decompressed_bytes = len(data)
+    xml_text = data.decode('utf-8').replace('</mediawiki>', '')
+    del raw, data  # only the text is needed while parsing
+    # Page streams carry no root element of their own; the parser matches
+    # elements by local name, so no namespace declaration is needed.
+    parser = PageParser(ARTICLE_NAMESPACES)
+    pages = parser.parse(io.StringIO(f'<mediawiki>{xml_text}</mediawiki>'))
+    articles = list(iter_articles(pages, min_length, max_chars))
+    return articles, parser.pages_seen, decompressed_bytes
+
+def process_wiki_dump_parallel(dump_path, output_file, index_path=None, workers=None,
+                               max_articles=1000, streams_per_chunk=10, compression=None,
+                               max_shard_bytes=None, min_length=DEFAULT_MIN_LENGTH,
+                               max_chars=DEFAULT_MAX_CHARS, stats_file=None,
+                               progress_interval=DEFAULT_PROGRESS_INTERVAL):
+    """Process a multistream dump in a process pool, writing articles in dump order."""
+    workers = workers or os.cpu_count() or 1
+    if index_path and os.path.exists(index_path):
+        offsets = read_stream_offsets(index_path)
+    else:
+        print("No multistream index found, scanning the dump for bz2 stream boundaries...")
+        # The first stream found is the <siteinfo> header; skip it. The
+        # closing </mediawiki> stream, if separate, just parses to no pages.
+        offsets = scan_stream_offsets(dump_path)[1:]
+    if not offsets:
+        raise ValueError(f"{dump_path} is not a multistream dump; use --workers 1")
+
+    chunks = build_chunks(offsets, os.path.getsize(dump_path), streams_per_chunk)
+    print(f"Processing {dump_path}: {len(offsets)} streams in {len(chunks)} chunks on {workers} workers...")
+
+    done_offset = [0]
+    progress = new_progress(os.path.getsize(dump_path), lambda: done_offset[0], progress_interval)
+    tasks = [(dump_path, start, end, min_length, max_chars) for start, end in chunks]
+    remaining = max_articles or None
+    with JsonlWriter(output_file, compression, max_bytes=max_shard_bytes) as writer, Pool(workers) as pool:
+        # imap keeps results in chunk order even though chunks finish out of order.
+        for (start, end), (articles, pages, decompressed_bytes) in zip(chunks, pool.imap(process_chunk, tasks)):
+            done_offset[0] = end
+            progress.add('decompressed_bytes', decompressed_bytes)
+            progress.add('pages', pages)
+            for article in articles[:remaining]:
+                writer.write(article)
+            progress.set('output_bytes', writer.bytes_written)
+            progress.add('articles', len(articles[:remaining]))
+            if remaining is not None:
+                remaining -= len(articles[:remaining])
+                if remaining <= 0:
+                    break
+        pool.terminate()
+        finish_progress(progress, writer, stats_file, dump_path=dump_path, workers=workers,
+                        max_articles=max_articles, min_length=min_length, max_chars=max_chars)
+    return writer.records
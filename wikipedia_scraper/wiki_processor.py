@@ -1,10 +1,50 @@
-import requests
-import json
+import argparse
 import os
+import sys
 import bz2
-import xml.etree.ElementTree as ET
+import itertools
+from xml.parsers import expat
 from mwparserfromhell import parse
-import re
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scraper_common.http_client import HttpClient
+from scraper_common.jsonl_writer import JsonlWriter
+from scraper_common.progress import ProgressReporter
+from scraper_common.rate_limit import RetryPolicy
+from scraper_common.text_cleaning import CleaningEngine, CollapseWhitespace, Literal, Regex
+from dump_downloader import download_file, fetch_expected_checksum
+
+# Cleaning applied to the output of strip_code(), in the order of the
+# original re.sub chain (from clean_all.py).
+WIKI_CLEANING_STEPS = [
+    # Remove all "()"
+    Literal('()'),
+    # Remove HTML tags
+    Regex(r'<[^>]+>', guard='<'),
+    # Remove wiki markup like thumb|, alt=, etc.
+    Regex(r'thumb\|[^|]*\|', guard='thumb|'),
+    Regex(r'alt=[^|]*\|', guard='alt='),
+    Literal('right|'),
+    Regex(r'upright=[^|]*\|', guard='upright='),
+    # Remove other wiki links and templates (already done by mwparserfromhell, but ensure)
+    Regex(r'\[\[.*?\]\]', guard='[['),
+    Regex(r'\{\{.*?\}\}', guard='{{'),
+    # Remove references [1], [2], etc.
+    Regex(r'\[\d+\]', guard='['),
+    # Additional patterns
+    Literal('(; , )'),
+    Literal('(, )'),
+    Literal('thumb|'),
+    Literal('(; )'),
+    Literal('frameless|350px'),
+    Literal('250px|'),
+    Literal('thumbnail|300px|'),
+    Literal('(; ; )'),
+    # Clean up whitespace
+    CollapseWhitespace(),
+]
+
+wiki_cleaner = CleaningEngine(WIKI_CLEANING_STEPS)
 
 def clean_wiki_text(text):
     """Clean wiki markup text to plain text with additional cleaning."""
@@ -14,103 +54,303 @@ def clean_wiki_text(text):
     wikicode = parse(text)
     # Remove templates, links, etc., keep plain text
     plain = wikicode.strip_code()
-    
-    # Additional cleaning from clean_all.py
-    # Remove all "()"
-    plain = re.sub(r'\(\)', '', plain)
-    # Remove HTML tags
-    plain = re.sub(r'<[^>]+>', '', plain)
-    # Remove wiki markup like thumb|, alt=, etc.
-    plain = re.sub(r'thumb\|[^|]*\|', '', plain)
-    plain = re.sub(r'alt=[^|]*\|', '', plain)
-    plain = re.sub(r'right\|', '', plain)
-    plain = re.sub(r'upright=[^|]*\|', '', plain)
-    # Remove other wiki links and templates (already done by mwparserfromhell, but ensure)
-    plain = re.sub(r'\[\[.*?\]\]', '', plain)
-    plain = re.sub(r'\{\{.*?\}\}', '', plain)
-    # Remove references [1], [2], etc.
-    plain = re.sub(r'\[\d+\]', '', plain)
-    
-    # Additional patterns
-    additional_patterns = [
-        r'\(; , \)',
-        r'\(, \)',
-        r'thumb\|',
-        r'\(; \)',
-        r'frameless\|350px',
-        r'250px\|',
-        r'thumbnail\|300px\|',
-        r'\(; ; \)'
-    ]
-    for pattern in additional_patterns:
-        plain = re.sub(pattern, '', plain)
-    
-    # Clean up whitespace
-    plain = re.sub(r'\s+', ' ', plain)
-    return plain.strip()
+    return wiki_cleaner.clean(plain)
 
-def download_wiki_dump(url, output_path):
-    """Download the wiki dump file."""
+def download_wiki_dump(url, output_path, client=None, segments=1, verify=True):
+    """Download the wiki dump file, resuming a partial download and verifying its checksum."""
     print(f"Downloading {url}...")
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    client = client or HttpClient(pool_size=max(segments, 1), retry=RetryPolicy())
+    checksum = fetch_expected_checksum(client, url) if verify else None
+    if verify and not checksum[0]:
+        print("No published checksum found; skipping verification")
+    download_file(client, url, output_path, segments=segments, checksum=checksum)
     print(f"Downloaded to {output_path}")
+    print(client.stats.summary())
+    print(client.metrics.summary())
+
+# Only main-namespace pages become articles; the text of others is never collected.
+ARTICLE_NAMESPACES = {'0'}
+EXCLUDED_PREFIXES = ('วิกิพีเดีย:', 'แม่แบบ:', 'หมวดหมู่:')
+DEFAULT_MIN_LENGTH = 100
+DEFAULT_MAX_CHARS = 10000
+DEFAULT_PROGRESS_INTERVAL = 5.0
+
+class PageParser:
+    """Stream (page_id, ns, title, revision_id, text) tuples out of an XML export with expat.
 
-def process_wiki_dump(dump_path, output_file, max_articles=1000):
-    """Process the wiki dump and extract articles."""
+    Elements are matched by local name, so any export schema version works;
+    the schema namespace found on the root element is kept in `schema`.
+    Nothing is built per element except the handful of fields above, and
+    with `namespaces` (e.g. {'0'}) the text of pages in other namespaces is
+    never collected: <ns> precedes <revision> in every page. History dumps
+    hold several revisions per page; the last (newest) one is used.
+    `pages_seen` counts every page, including skipped ones.
+    """
+
+    read_size = 1024 * 1024
+    _fields = {('page', 'title'): 'title', ('page', 'ns'): 'ns', ('page', 'id'): 'page_id',
+               ('revision', 'id'): 'revision_id', ('revision', 'text'): 'text'}
+
+    def __init__(self, namespaces=None):
+        self.namespaces = set(namespaces) if namespaces is not None else None
+        self.schema = None
+        self.pages_seen = 0
+
+    def parse(self, xml_file):
+        pages = []
+        stack = []
+        page = None
+        field = None
+        buffer = []
+        fields = self._fields
+        namespaces = self.namespaces
+        parser = expat.ParserCreate()
+
+        def start(name, attrs):
+            nonlocal page, field, buffer
+            if ':' in name:
+                name = name.rpartition(':')[2]
+            if not stack and self.schema is None:
+                self.schema = attrs.get('xmlns')
+            if name == 'page':
+                page = {}
+            elif page is not None:
+                field = fields.get((stack[-1], name))
+                if field:
+                    buffer = []
+                    # Character data is only converted to str while a
+                    # wanted field is open; everything else stays in C.
+                    parser.CharacterDataHandler = buffer.append
+            stack.append(name)
+
+        def end(name):
+            nonlocal page, field
+            stack.pop()
+            if field is not None:
+                parser.CharacterDataHandler = None
+                page[field] = ''.join(buffer)
+                if field == 'ns' and namespaces is not None and page['ns'] not in namespaces:
+                    page = None  # skip the rest of this page
+                field = None
+            elif name == 'page' or name.endswith(':page'):
+                self.pages_seen += 1
+                if page is not None and len(page) == 5:
+                    pages.append((int(page['page_id']), page['ns'], page['title'],
+                                  int(page['revision_id']), page['text']))
+                page = None
+
+        parser.buffer_text = True
+        parser.buffer_size = 64 * 1024
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        while True:
+            data = xml_file.read(self.read_size)
+            parser.Parse(data, not data)
+            yield from pages
+            pages.clear()
+            if not data:
+                break
+
+def iter_pages(xml_file, namespaces=None):
+    """Yield (page_id, ns, title, revision_id, text) for every page in an XML export stream.
+
+    With `namespaces`, pages in other namespaces are skipped without collecting their text.
+    """
+    return PageParser(namespaces).parse(xml_file)
+
+def extract_article(title_text, ns_text, content_text, min_length=DEFAULT_MIN_LENGTH,
+                    max_chars=DEFAULT_MAX_CHARS):
+    """Return the cleaned article dict for a page, or None if it is filtered out.
+
+    Articles of `min_length` characters or fewer are dropped, and content is
+    truncated to `max_chars` characters unless it is 0 or None.
+    """
+    if ns_text != '0':  # main namespace
+        return None
+    if not content_text or title_text.startswith(EXCLUDED_PREFIXES):
+        return None
+    clean_content = clean_wiki_text(content_text)
+    if clean_content and len(clean_content) > min_length:  # minimum length
+        return {
+            'title': title_text,
+            'content': clean_content[:max_chars] if max_chars else clean_content  # Limit content length
+        }
+    return None
+
+def iter_articles(pages, min_length=DEFAULT_MIN_LENGTH, max_chars=DEFAULT_MAX_CHARS):
+    """Turn iter_pages() tuples into cleaned article dicts, skipping filtered pages."""
+    for _, ns_text, title_text, _, content_text in pages:
+        article = extract_article(title_text, ns_text, content_text, min_length, max_chars)
+        if article:
+            yield article
+
+class CountingReader:
+    """File wrapper that reports the number of bytes read to a ProgressReporter."""
+
+    def __init__(self, stream, progress, counter='decompressed_bytes'):
+        self.stream = stream
+        self.progress = progress
+        self.counter = counter
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.progress.add(self.counter, len(data))
+        return data
+
+def count_pages(pages, progress, parser):
+    """Pass pages through, counting every page the parser saw (including skipped ones)."""
+    counted = 0
+    for page in pages:
+        progress.add('pages', parser.pages_seen - counted)
+        counted = parser.pages_seen
+        yield page
+    progress.add('pages', parser.pages_seen - counted)
+
+def new_progress(total=None, position=None, interval=DEFAULT_PROGRESS_INTERVAL):
+    progress = ProgressReporter(total, position, interval)
+    for counter in ('pages', 'decompressed_bytes', 'articles', 'output_bytes'):
+        progress.set(counter, 0)
+    return progress
+
+def finish_progress(progress, writer, stats_file=None, **extra):
+    """Print the final status line and optionally save the counters as JSON."""
+    writer.flush()
+    progress.set('output_bytes', writer.bytes_written)
+    progress.report()
+    print(f"Saved {writer.records} articles to {', '.join(writer.paths)}")
+    if stats_file:
+        progress.write_json(stats_file, output_files=writer.paths, **extra)
+        print(f"Stats written to {stats_file}")
+
+def process_wiki_dump(dump_path, output_file, max_articles=1000, compression=None,
+                      max_shard_bytes=None, batch_size=100, min_length=DEFAULT_MIN_LENGTH,
+                      max_chars=DEFAULT_MAX_CHARS, stats_file=None,
+                      progress_interval=DEFAULT_PROGRESS_INTERVAL):
+    """Process the wiki dump and extract articles.
+
+    Articles stream from the decompressor through cleaning to the writer one
+    at a time, so memory stays flat however many articles are extracted.
+    `max_articles` of 0 or None means no limit. Progress is printed every
+    `progress_interval` seconds, with the ETA based on the offset in the
+    compressed file.
+    """
     print(f"Processing {dump_path}...")
-    articles = []
-    ns = {'mw': 'http://www.mediawiki.org/xml/export-0.11/'}
     
-    with bz2.open(dump_path, 'rt', encoding='utf-8') as f:
-        # Parse XML
-        context = ET.iterparse(f, events=('end',))
-        for event, elem in context:
-            if elem.tag == f"{{{ns['mw']}}}page":
-                title_elem = elem.find('mw:title', ns)
-                ns_elem = elem.find('mw:ns', ns)
-                revision = elem.find('mw:revision', ns)
-                if title_elem is not None and ns_elem is not None and revision is not None:
-                    title_text = title_elem.text
-                    ns_text = ns_elem.text
-                    text_elem = revision.find('mw:text', ns)
-                    if text_elem is not None and ns_text == '0':  # main namespace
-                        content_text = text_elem.text
-                        if content_text and not title_text.startswith('วิกิพีเดีย:') and not title_text.startswith('แม่แบบ:') and not title_text.startswith('หมวดหมู่:'):
-                            clean_content = clean_wiki_text(content_text)
-                            if clean_content and len(clean_content) > 100:  # minimum length
-                                article = {
-                                    'title': title_text,
-                                    'content': clean_content[:10000]  # Limit content length
-                                }
-                                articles.append(article)
-                                print(f"Extracted: {title_text}")
-                                if len(articles) >= max_articles:
-                                    break
-                elem.clear()
-    # Save to JSONL
-    with open(output_file, 'w', encoding='utf-8') as f:
+    with open(dump_path, 'rb') as raw, bz2.BZ2File(raw) as decompressed, \
+            JsonlWriter(output_file, compression, batch_size, max_shard_bytes) as writer:
+        progress = new_progress(os.path.getsize(dump_path), raw.tell, progress_interval)
+        parser = PageParser(ARTICLE_NAMESPACES)
+        pages = count_pages(parser.parse(CountingReader(decompressed, progress)), progress, parser)
+        articles = itertools.islice(iter_articles(pages, min_length, max_chars), max_articles or None)
         for article in articles:
-            f.write(json.dumps(article, ensure_ascii=False) + '\n')
-    print(f"Saved {len(articles)} articles to {output_file}")
+            writer.write(article)
+            progress.set('output_bytes', writer.bytes_written)
+            progress.add('articles')
+        finish_progress(progress, writer, stats_file, dump_path=dump_path, schema=parser.schema,
+                        max_articles=max_articles, min_length=min_length, max_chars=max_chars)
+    return writer.records
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download and clean the Thai Wikipedia dump")
+    parser.add_argument('--output', default='data/wiki_dataset_clean.jsonl', help="JSONL output file")
+    parser.add_argument('--full', action='store_true',
+                        help="production mode: no article limit and no content truncation")
+    parser.add_argument('--max-articles', type=int, default=1000,
+                        help="stop after this many articles, 0 for no limit (default 1000)")
+    parser.add_argument('--max-chars', type=int, default=DEFAULT_MAX_CHARS,
+                        help=f"truncate content to this many characters, 0 disables (default {DEFAULT_MAX_CHARS})")
+    parser.add_argument('--min-length', type=int, default=DEFAULT_MIN_LENGTH,
+                        help=f"drop articles of this many characters or fewer (default {DEFAULT_MIN_LENGTH})")
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], default=None,
+                        help="compress the output (zstd needs the zstandard package)")
+    parser.add_argument('--shard-size', type=int, default=0,
+                        help="rotate output into shards of this many MB of JSONL, 0 disables (default 0)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="decompress and clean the multistream dump in this many processes (default 1)")
+    parser.add_argument('--segments', type=int, default=1,
+                        help="download the dump in this many parallel byte ranges (default 1)")
+    parser.add_argument('--no-verify', action='store_true',
+                        help="skip checking the download against the published sha1/md5 sums")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only clean pages whose revision changed since the last run and write "
+                             "add/change/delete records to a delta file (no article limit)")
+    parser.add_argument('--merge', action='store_true',
+                        help="with --incremental, also apply the delta to the --output dataset")
+    parser.add_argument('--delta', default=None,
+                        help="delta file for --incremental (default: <output>.delta.jsonl)")
+    parser.add_argument('--revision-index', default=None,
+                        help="revision index for --incremental (default: <output>.revisions.sqlite)")
+    parser.add_argument('--incr-dir', default=None,
+                        help="with --incremental, apply the local *-pages-meta-hist-incr.xml.bz2 "
+                             "adds-changes dumps in this directory instead of the full dump")
+    parser.add_argument('--progress-interval', type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help=f"seconds between progress lines (default {DEFAULT_PROGRESS_INTERVAL:g})")
+    parser.add_argument('--stats', default=None,
+                        help="where to write the run's stats JSON (default: <output>.stats.json)")
+    args = parser.parse_args()
+    if args.incremental and (args.workers > 1 or args.shard_size):
+        parser.error("--incremental runs in one process and does not support --workers or --shard-size")
+    if args.full:
+        args.max_articles = 0
+        args.max_chars = 0
+    if args.stats is None:
+        args.stats = os.path.splitext(args.output)[0] + '.stats.json'
+    return args
 
 if __name__ == "__main__":
-    # URL for Thai Wikipedia dump (latest articles)
-    dump_url = "https://dumps.wikimedia.org/thwiki/latest/thwiki-latest-pages-articles.xml.bz2"
-    dump_path = "thwiki-latest-pages-articles.xml.bz2"
-    output_file = "data/wiki_dataset_clean.jsonl"
+    args = parse_args()
+    output_file = args.output
+    options = dict(compression=args.compression, max_shard_bytes=args.shard_size * 1024 * 1024,
+                   min_length=args.min_length, max_chars=args.max_chars, stats_file=args.stats,
+                   progress_interval=args.progress_interval)
 
     # Ensure data directory exists
-    os.makedirs("data", exist_ok=True)
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
 
-    # Download dump
-    if not os.path.exists(dump_path):
-        download_wiki_dump(dump_url, dump_path)
+    if args.incremental:
+        from wiki_incremental import apply_incr_dumps, find_incr_dumps, process_wiki_incremental
+        options = dict(compression=args.compression, min_length=args.min_length, max_chars=args.max_chars,
+                       stats_file=args.stats, progress_interval=args.progress_interval)
+        if args.incr_dir:
+            incr_dumps = find_incr_dumps(args.incr_dir)
+            print(f"Found {len(incr_dumps)} adds-changes dumps in {args.incr_dir}")
+            apply_incr_dumps(incr_dumps, output_file, args.revision_index, args.merge, **options)
+        else:
+            dump_url = "https://dumps.wikimedia.org/thwiki/latest/thwiki-latest-pages-articles.xml.bz2"
+            dump_path = "thwiki-latest-pages-articles.xml.bz2"
+            if not os.path.exists(dump_path):
+                download_wiki_dump(dump_url, dump_path, segments=args.segments, verify=not args.no_verify)
+            else:
+                print(f"Dump already exists: {dump_path}")
+            process_wiki_incremental(dump_path, output_file, args.revision_index, args.delta, args.merge,
+                                     **options)
+    elif args.workers > 1:
+        # The multistream dump is made of independent bz2 streams of 100
+        # pages each, which lets workers decompress byte ranges in parallel.
+        dump_url = "https://dumps.wikimedia.org/thwiki/latest/thwiki-latest-pages-articles-multistream.xml.bz2"
+        dump_path = "thwiki-latest-pages-articles-multistream.xml.bz2"
+        index_url = "https://dumps.wikimedia.org/thwiki/latest/thwiki-latest-pages-articles-multistream-index.txt.bz2"
+        index_path = "thwiki-latest-pages-articles-multistream-index.txt.bz2"
+        for url, path in ((dump_url, dump_path), (index_url, index_path)):
+            if not os.path.exists(path):
+                download_wiki_dump(url, path, segments=args.segments, verify=not args.no_verify)
+            else:
+                print(f"Dump already exists: {path}")
+
+        from wiki_parallel import process_wiki_dump_parallel
+        process_wiki_dump_parallel(dump_path, output_file, index_path, workers=args.workers,
+                                   max_articles=args.max_articles, **options)
     else:
-        print(f"Dump already exists: {dump_path}")
+        # URL for Thai Wikipedia dump (latest articles)
+        dump_url = "https://dumps.wikimedia.org/thwiki/latest/thwiki-latest-pages-articles.xml.bz2"
+        dump_path = "thwiki-latest-pages-articles.xml.bz2"
+
+        # Download dump (partial downloads live in <dump>.part, so an
+        # existing dump_path is always a complete, verified file)
+        if not os.path.exists(dump_path):
+            download_wiki_dump(dump_url, dump_path, segments=args.segments, verify=not args.no_verify)
+        else:
+            print(f"Dump already exists: {dump_path}")
 
-    # Process dump
-    process_wiki_dump(dump_path, output_file)
\ No newline at end of file
+        # Process dump
+        process_wiki_dump(dump_path, output_file, args.max_articles, **options)
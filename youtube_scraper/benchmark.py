@@ -0,0 +1,485 @@
+"""Benchmarks for the YouTube scrapers against local fixtures.
+
+Usage:
+    python benchmark.py selenium [num_comments] [num_videos]
+    python benchmark.py pool [num_videos] [max_workers]
+    python benchmark.py lean [num_comments] [num_videos]
+    python benchmark.py requests [num_pages] [latency_ms]
+    python benchmark.py async [num_videos] [latency_ms]
+    python benchmark.py json [repeat]
+    python benchmark.py transcript [hours]
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from functools import lru_cache, partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Dummy payloads for the heavy resources fixtures/watch.html requests:
+# (path prefix, content type, size in bytes).
+FIXTURE_ASSETS = [
+    ('/videoplayback', 'video/mp4', 2 * 1024 * 1024),
+    ('/fonts/', 'font/woff2', 150 * 1024),
+    ('/pagead/', 'application/javascript', 60 * 1024),
+    ('/vi/', 'image/jpeg', 25 * 1024),
+    ('/avatar/', 'image/jpeg', 8 * 1024),
+]
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves the fixtures directory quietly, plus dummy FIXTURE_ASSETS."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        for prefix, content_type, size in FIXTURE_ASSETS:
+            if self.path.startswith(prefix):
+                # A JS comment is a valid script and harmless bytes for everything else.
+                body = b'/*' + b'x' * (size - 4) + b'*/'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+                return
+        super().do_GET()
+
+@lru_cache(maxsize=None)
+def youtubei_fixture(name, last):
+    """JSON text of fixtures/youtubei/<name>.json; with last=True its continuation item is removed."""
+    with open(os.path.join(FIXTURES, 'youtubei', f'{name}.json'), encoding='utf-8') as f:
+        data = json.load(f)
+    if last:
+        for endpoint in data.get('onResponseReceivedEndpoints', []):
+            for command in endpoint.values():
+                command['continuationItems'] = [item for item in command['continuationItems']
+                                                if 'continuationItemRenderer' not in item]
+    return json.dumps(data, ensure_ascii=False)
+
+class YoutubeiHandler(BaseHTTPRequestHandler):
+    """Replays the recorded youtubei/v1/next fixtures as a paginated comment section.
+
+    Tokens are `comments:<video>:<page>` for comment pages (page 1 is
+    next_comments.json, later pages next_comments_more.json, `pages` in all)
+    and `replies:<video>:<page>:<thread>[:more]` for reply pages.
+    Placeholders in the fixtures are filled in per request so every page
+    carries distinct comments. With `max_in_flight`, requests beyond that
+    many concurrent ones get a 429 with Retry-After: 1.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    in_flight = 0
+    in_flight_lock = threading.Lock()
+
+    def __init__(self, *args, pages=10, latency=0.0, max_in_flight=0, **kwargs):
+        self.pages = pages
+        self.latency = latency
+        self.max_in_flight = max_in_flight
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        cls = YoutubeiHandler
+        with cls.in_flight_lock:
+            throttled = self.max_in_flight and cls.in_flight >= self.max_in_flight
+            if not throttled:
+                cls.in_flight += 1
+        if throttled:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        try:
+            self._reply(request)
+        finally:
+            with cls.in_flight_lock:
+                cls.in_flight -= 1
+
+    def _reply(self, request):
+        token = request.get('continuation')
+        if token is None:
+            video = request['videoId']
+            body = youtubei_fixture('next_watch', False).replace('__NEXT__', f'comments:{video}:1')
+        elif token.startswith('comments:'):
+            _, video, page = token.split(':')
+            page = int(page)
+            body = youtubei_fixture('next_comments' if page == 1 else 'next_comments_more', page >= self.pages)
+            body = body.replace('__NEXT__', f'comments:{video}:{page + 1}').replace('__REPLIES__', f'replies:{video}:{page}:')
+            body = body.replace('__PAGE__', str(page))
+        else:
+            _, video, page, thread = token.split(':')[:4]
+            body = youtubei_fixture('next_replies', token.endswith(':more'))
+            parent = f"{'Ugx' if page == '1' else 'Ugy'}{page}{thread}"
+            body = body.replace('__NEXT__', f'{token}:more').replace('__PARENT__', parent)
+        body = body.replace('__VIDEO__', video).encode('utf-8')
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def _serve(handler, port_queue):
+    server = StubServer(('127.0.0.1', 0), handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def start_stub_server(handler=None):
+    """Run a stub server in a child process; returns (process, base_url)."""
+    handler = handler or partial(FixtureHandler, directory=FIXTURES)
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(handler, port_queue), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+def bench_selenium(num_comments=60, num_videos=3):
+    """Per-video latency of the sleep-based and the event-driven Selenium modes (needs Chrome)."""
+    import contextlib
+    import io
+    import tempfile
+    from youtube_comment_scraper import YouTubeCommentScraper
+
+    process, base_url = start_stub_server()
+    try:
+        urls = [f"{base_url}/watch.html?v=fixture{i:04d}&total={num_comments}" for i in range(num_videos)]
+        print(f"Fixture: {num_videos} videos x {num_comments} comments, loaded 20 at a time")
+        print(f"{'mode':>8} {'s/video':>8} {'comments':>9}")
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, fast in (('sleep', False), ('fast', True)):
+                scraper = YouTubeCommentScraper(output_dir=tmp, fast=fast)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    scraper.setup_driver()
+                try:
+                    started = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        results[name] = [scraper.extract_comments(url, num_comments) for url in urls]
+                    elapsed = time.perf_counter() - started
+                finally:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        scraper.close()
+                count = sum(len(comments) for comments in results[name])
+                print(f"{name:>8} {elapsed / num_videos:>8.2f} {count:>9}")
+        # Both modes must extract the same comments.
+        assert results['sleep'] == results['fast'], "fast mode extracted different comments"
+    finally:
+        process.terminate()
+
+def bench_pool(num_videos=12, max_workers=4):
+    """Videos/min of the browser pool for 1, 2, 4, ... workers on fixture pages (needs Chrome)."""
+    import contextlib
+    import io
+    import tempfile
+    from youtube_comment_batch import print_worker_stats, run_batch
+
+    process, base_url = start_stub_server()
+    try:
+        urls = [f"{base_url}/watch.html?v=fixture{i:04d}&total=40" for i in range(num_videos)]
+        print(f"Fixture: {num_videos} videos x 40 comments, {os.cpu_count()} CPUs")
+        workers = 1
+        while workers <= max_workers:
+            with tempfile.TemporaryDirectory() as tmp:
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    videos, stats = run_batch(urls, tmp, workers=workers, max_comments=40)
+                elapsed = time.perf_counter() - started
+                assert sorted(v['comments'] for v in videos) == [40] * num_videos, "missing comments"
+                assert len(os.listdir(tmp)) == num_videos
+            print(f"\n{workers} worker(s): {num_videos * 60 / elapsed:.1f} videos/min, {elapsed:.1f} s including startup")
+            print_worker_stats(stats)
+            workers *= 2
+    finally:
+        process.terminate()
+
+def bench_lean(num_comments=60, num_videos=3):
+    """Requests, bytes and time per video with the default and the lean browser profile (needs Chrome)."""
+    import contextlib
+    import io
+    import tempfile
+    from youtube_comment_scraper import YouTubeCommentScraper
+
+    process, base_url = start_stub_server()
+    try:
+        urls = [f"{base_url}/watch.html?v=fixture{i:04d}&total={num_comments}" for i in range(num_videos)]
+        print(f"{'profile':>8} {'requests':>9} {'KB':>8} {'blocked':>8} {'s/video':>8}")
+        results = {}
+        usage = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, lean in (('default', False), ('lean', True)):
+                scraper = YouTubeCommentScraper(output_dir=tmp, fast=True, lean=lean, report_network=True)
+                totals = {'requests': 0, 'bytes': 0, 'blocked': 0}
+                results[name] = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    scraper.setup_driver()
+                try:
+                    started = time.perf_counter()
+                    for url in urls:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            results[name].append(scraper.extract_comments(url, num_comments))
+                        for key in totals:
+                            totals[key] += scraper.last_network[key]
+                    elapsed = time.perf_counter() - started
+                finally:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        scraper.close()
+                usage[name] = totals
+                print(f"{name:>8} {totals['requests'] / num_videos:>9.1f} {totals['bytes'] / 1024 / num_videos:>8.0f} "
+                      f"{totals['blocked'] / num_videos:>8.1f} {elapsed / num_videos:>8.2f}")
+        saved = usage['default']['bytes'] - usage['lean']['bytes']
+        print(f"Saved per video: {saved / 1024 / num_videos:.0f} KB "
+              f"({saved / max(usage['default']['bytes'], 1):.0%}), "
+              f"{usage['lean']['blocked'] / num_videos:.1f} blocked requests")
+        assert results['default'] == results['lean'], "lean profile extracted different comments"
+    finally:
+        process.terminate()
+
+def bench_requests(num_pages=20, latency_ms=50):
+    """Comments/sec of the continuation-token engine against the replayed youtubei fixtures."""
+    import contextlib
+    import io
+    import tempfile
+    from youtube_comment_scraper_requests import YouTubeCommentScraperRequests
+    from scraper_common.jsonl_writer import iter_jsonl
+
+    handler = partial(YoutubeiHandler, pages=num_pages, latency=latency_ms / 1000)
+    process, base_url = start_stub_server(handler)
+    try:
+        total = num_pages * 20
+        url = "https://www.youtube.com/watch?v=fixture0001"
+        print(f"Fixture: {num_pages} pages x 20 comments, {latency_ms} ms server latency")
+        print(f"{'mode':>16} {'comments':>9} {'requests':>9} {'seconds':>8} {'comments/s':>11}")
+        with tempfile.TemporaryDirectory() as tmp:
+            runs = (('all', total, False), ('max 50', 50, False), ('all + replies', total * 3, True))
+            for name, max_comments, replies in runs:
+                scraper = YouTubeCommentScraperRequests(output_dir=tmp, base_url=base_url, rps=0)
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    comments = scraper.scrape_video_comments(url, max_comments, replies)
+                elapsed = time.perf_counter() - started
+                requests_made = scraper.session.stats.requests
+                print(f"{name:>16} {len(comments):>9} {requests_made:>9} {elapsed:>8.2f} {len(comments) / elapsed:>11.0f}")
+                saved = list(iter_jsonl(os.path.join(tmp, 'youtube_comments_fixture0001.jsonl')))
+                assert saved == comments, "streamed file differs from the returned comments"
+                if not replies:
+                    assert len(comments) == min(max_comments, total), "wrong number of comments"
+                    assert len({c['comment'] for c in comments}) == len(comments), "duplicate comments"
+    finally:
+        process.terminate()
+
+def bench_async(num_videos=200, latency_ms=50):
+    """Videos/hour of the async harvester against one-video-at-a-time requests scraping."""
+    import contextlib
+    import io
+    import tempfile
+    from youtube_comment_async import run_harvest
+    from youtube_comment_scraper_requests import YouTubeCommentScraperRequests
+    from scraper_common.jsonl_writer import iter_jsonl
+
+    pages = 3
+    video_ids = [f"fx{i:09d}" for i in range(num_videos)]
+    print(f"Fixture: {num_videos} videos x {pages} pages x 20 comments, {latency_ms} ms server latency")
+    print(f"{'mode':>24} {'videos/hour':>12} {'comments':>9} {'requests':>9} {'429s':>6} {'seconds':>8}")
+
+    handler = partial(YoutubeiHandler, pages=pages, latency=latency_ms / 1000)
+    process, base_url = start_stub_server(handler)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Baseline: the synchronous scraper, one video after another (on a sample).
+            sample = video_ids[:max(1, num_videos // 10)]
+            scraper = YouTubeCommentScraperRequests(output_dir=os.path.join(tmp, 'sync'), base_url=base_url, rps=0)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = {v: scraper.get_comments(v, 100) for v in sample}
+            elapsed = time.perf_counter() - started
+            print(f"{'sequential (sample)':>24} {len(sample) * 3600 / elapsed:>12.0f} "
+                  f"{sum(map(len, expected.values())):>9} {scraper.session.stats.requests:>9} {0:>6} {elapsed:>8.1f}")
+
+            for concurrency in (8, 32):
+                out_dir = os.path.join(tmp, f'async{concurrency}')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats = run_harvest(video_ids, out_dir, concurrency=concurrency, base_url=base_url)
+                print(f"{f'async x{concurrency}':>24} {stats['videos_per_hour']:>12.0f} {stats['comments']:>9} "
+                      f"{stats['requests']:>9} {stats['throttled']:>6} {stats['elapsed']:>8.1f}")
+                assert stats['done'] == num_videos, "videos failed"
+                for video_id, comments in expected.items():
+                    path = os.path.join(out_dir, f"youtube_comments_{video_id}.jsonl")
+                    assert list(iter_jsonl(path)) == comments, "async output differs from the sequential scraper"
+        # Throttling: the server only accepts 8 concurrent requests and
+        # answers the rest with 429; the limiter has to back off to finish.
+        process.terminate()
+        process, base_url = start_stub_server(partial(handler, max_in_flight=8))
+        with tempfile.TemporaryDirectory() as tmp:
+            combined = os.path.join(tmp, 'comments.jsonl')
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = run_harvest(video_ids, combined=combined, max_shard_bytes=1024 * 1024, concurrency=32,
+                                    base_url=base_url)
+            print(f"{'async x32, 429 above 8':>24} {stats['videos_per_hour']:>12.0f} {stats['comments']:>9} "
+                  f"{stats['requests']:>9} {stats['throttled']:>6} {stats['elapsed']:>8.1f}")
+            print(f"Concurrency backed off to {stats['lowest_limit']}; combined output in "
+                  f"{len(os.listdir(tmp))} shard(s)")
+            assert stats['done'] == num_videos, "videos failed under throttling"
+            records = [r for name in sorted(os.listdir(tmp)) for r in iter_jsonl(os.path.join(tmp, name))]
+            assert len(records) == stats['comments']
+            for video_id, comments in expected.items():
+                assert [{k: v for k, v in r.items() if k != 'video_id'} for r in records
+                        if r['video_id'] == video_id] == comments, "combined output out of order"
+    finally:
+        process.terminate()
+
+def recorded_pages():
+    """The youtubei fixtures with their placeholders filled in, as response bytes."""
+    pages = {}
+    for name in ('next_watch', 'next_comments', 'next_comments_more', 'next_replies'):
+        body = youtubei_fixture(name, False)
+        for placeholder, value in (('__NEXT__', 'comments:fixture0001:2'), ('__REPLIES__', 'replies:fixture0001:1:'),
+                                   ('__PAGE__', '1'), ('__PARENT__', 'Ugx13'), ('__VIDEO__', 'fixture0001')):
+            body = body.replace(placeholder, value)
+        pages[name] = body.encode('utf-8')
+    return pages
+
+def bench_json(repeat=200):
+    """Decode + parse time and peak allocated memory per recorded youtubei page, per JSON backend."""
+    import tracemalloc
+    from youtube_comment_scraper_requests import COMMENT_PAGE, next_token, page_items, parse_items
+    from scraper_common.fastjson import available_backends, get_loads
+
+    def parse(data):
+        items = page_items(data)
+        return next_token(items), list(parse_items(items, data))
+
+    decoders = [(f'{backend} (full)', get_loads(backend)) for backend in reversed(available_backends())]
+    if COMMENT_PAGE.decoder is not None:
+        decoders.append(('msgspec projection', COMMENT_PAGE.loads))
+    else:
+        print("msgspec is not installed; the projection falls back to a full decode")
+    pages = recorded_pages()
+    print(f"{'decoder':>20} {'page':>20} {'KB':>6} {'ms/page':>8} {'peak KB':>8}")
+    expected = {name: parse(json.loads(body)) for name, body in pages.items()}
+    for label, loads in decoders:
+        for name, body in pages.items():
+            assert parse(loads(body)) == expected[name], f"{label} parsed {name} differently"
+            started = time.perf_counter()
+            for _ in range(repeat):
+                parse(loads(body))
+            elapsed = (time.perf_counter() - started) / repeat
+            tracemalloc.start()
+            data = loads(body)
+            parse(data)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del data
+            print(f"{label:>20} {name:>20} {len(body) / 1024:>6.0f} {elapsed * 1000:>8.3f} {peak / 1024:>8.0f}")
+
+TRANSCRIPT_PHRASES = [
+    'สวัสดีครับทุกคน วันนี้เราจะมาพูดถึงเรื่อง', '[เพลง]', 'ซึ่งจริงๆ แล้ว   มันไม่ได้ยากอย่างที่คิด',
+    'ok so let\'s get started!', '♪ ♪ ♪', 'ขั้นตอนแรกคือการเตรียมข้อมูล (data preparation)',
+    'ขอบคุณที่รับชมนะครับ.', 'ถ้าชอบคลิปนี้ฝากกด like และ subscribe ด้วย', 'ราคา 1,500 บาท หรือประมาณ $45?',
+]
+
+def synthetic_transcript(hours):
+    """Caption segments of about 3 s each for `hours` of video, in the shape transcript_entries returns."""
+    entries = []
+    for i in range(int(hours * 1200)):
+        text = TRANSCRIPT_PHRASES[i % len(TRANSCRIPT_PHRASES)]
+        if i % 11 == 0:
+            text = f'[{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000:03d}] {text}'
+        elif i % 13 == 0:
+            text = f'[{i // 60 % 60:02d}:{i % 60:02d}] {text}\n{text}'
+        entries.append({'text': text, 'start': round(i * 3.003, 3), 'duration': 2.9 if i % 17 else 6.5})
+    return entries
+
+def legacy_save_transcript(transcript, text_path, jsonl_path):
+    """save_transcript before the single-pass writer: format everything, then clean each entry with re.sub."""
+    import re
+
+    def clean(text):
+        text = re.sub(r'\[\d+:\d+:\d+\.\d+\]', '', text)
+        text = re.sub(r'\[\d+:\d+\]', '', text)
+        text = re.sub(r'\s+', ' ', text).strip()
+        return re.sub(r'[^\w\s\u0E00-\u0E7F.,!?]', '', text)
+
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(line['text'] for line in transcript))
+    with open(jsonl_path, 'w', encoding='utf-8') as f:
+        for entry in transcript:
+            json.dump({"start": entry['start'], "duration": entry['duration'], "text": clean(entry['text'])},
+                      f, ensure_ascii=False)
+            f.write('\n')
+
+def bench_transcript(hours=3):
+    """Time to save a long transcript: legacy two-pass writer vs the single-pass one (with and without merging)."""
+    import contextlib
+    import io
+    import tempfile
+    from youtube_content_scraper import YouTubeContentScraper
+
+    transcript = synthetic_transcript(hours)
+    print(f"Transcript: {hours} h, {len(transcript)} segments")
+    print(f"{'writer':>22} {'seconds':>8} {'jsonl rows':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir = os.path.join(tmp, 'legacy')
+        os.mkdir(legacy_dir)
+        started = time.perf_counter()
+        legacy_save_transcript(transcript, os.path.join(legacy_dir, 'youtube_transcript_v.text'),
+                               os.path.join(legacy_dir, 'youtube_content_v.jsonl'))
+        print(f"{'legacy two-pass':>22} {time.perf_counter() - started:>8.3f} {len(transcript):>11}")
+
+        for name, merge_chars in (('single-pass', 0), ('single-pass, merged', 400)):
+            scraper = YouTubeContentScraper(os.path.join(tmp, name), merge_chars=merge_chars)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                scraper.save_transcript(transcript, 'v')
+            elapsed = time.perf_counter() - started
+            with open(scraper.output_dir / 'youtube_content_v.jsonl', encoding='utf-8') as f:
+                rows = sum(1 for _ in f)
+            print(f"{name:>22} {elapsed:>8.3f} {rows:>11}")
+            if not merge_chars:
+                for filename in ('youtube_transcript_v.text', 'youtube_content_v.jsonl'):
+                    with open(os.path.join(legacy_dir, filename), 'rb') as a, \
+                            open(scraper.output_dir / filename, 'rb') as b:
+                        assert a.read() == b.read(), f"{filename} differs from the legacy writer"
+            with contextlib.redirect_stdout(io.StringIO()):
+                scraper.save_transcript(transcript, 'v', format_type='json')
+            with open(scraper.output_dir / 'youtube_transcript_v.json', encoding='utf-8') as f:
+                assert f.read() == json.dumps(transcript), "json output differs from JSONFormatter"
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    args = [int(a) for a in sys.argv[2:]]
+    if command == 'selenium':
+        bench_selenium(*args)
+    elif command == 'pool':
+        bench_pool(*args)
+    elif command == 'lean':
+        bench_lean(*args)
+    elif command == 'requests':
+        bench_requests(*args)
+    elif command == 'async':
+        bench_async(*args)
+    elif command == 'json':
+        bench_json(*args)
+    elif command == 'transcript':
+        bench_transcript(*args)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,85 @@
+"""
+Transcript cache
+เก็บผล transcript ต่อวิดีโอใน SQLite เพื่อให้การรันซ้ำไม่ต้องเรียกเครือข่าย
+
+- ผลบวก: transcript ที่ดึงได้ (บีบอัดด้วย zlib) ต่อ (video_id, ภาษาที่ขอ) ไม่หมดอายุ
+  เว้นแต่กำหนด positive_ttl
+- ผลลบ: วิดีโอที่ไม่มี transcript เก็บต่อ video_id (ไม่ขึ้นกับภาษา เพราะเมื่อไม่มีภาษาที่
+  ต้องการจะใช้ transcript ภาษาอื่นแทนอยู่แล้ว) หมดอายุหลัง negative_ttl เพราะเจ้าของช่อง
+  อาจเพิ่มคำบรรยายภายหลัง
+ข้อผิดพลาดชั่วคราว (เครือข่าย, ถูกบล็อก) ไม่ถูกเก็บ
+"""
+
+import json
+import sqlite3
+import time
+import zlib
+
+DAY = 24 * 60 * 60
+
+class TranscriptCache:
+    OK = 'ok'
+    NONE = 'none'
+
+    def __init__(self, path, negative_ttl=7 * DAY, positive_ttl=None, flush_every=50):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.positive_ttl = positive_ttl
+        self.flush_every = flush_every
+        self._pending = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS transcripts (
+            video_id TEXT NOT NULL,
+            language TEXT NOT NULL,
+            status TEXT NOT NULL,
+            transcript_language TEXT,
+            entries BLOB,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (video_id, language))""")
+        self._conn.commit()
+
+    def get(self, video_id, language, now=None):
+        """คืน (status, transcript_language, entries) ที่ยังไม่หมดอายุ หรือ None ถ้าต้องดึงใหม่"""
+        now = time.time() if now is None else now
+        row = self._conn.execute(
+            "SELECT fetched_at FROM transcripts WHERE video_id = ? AND language = '' AND status = ?",
+            (video_id, self.NONE)).fetchone()
+        if row and (self.negative_ttl is None or now - row[0] < self.negative_ttl):
+            return self.NONE, None, None
+        row = self._conn.execute(
+            "SELECT transcript_language, entries, fetched_at FROM transcripts WHERE video_id = ? AND language = ?",
+            (video_id, language)).fetchone()
+        if row and (self.positive_ttl is None or now - row[2] < self.positive_ttl):
+            return self.OK, row[0], json.loads(zlib.decompress(row[1]))
+        return None
+
+    def put(self, video_id, language, transcript_language, entries):
+        """เก็บ transcript ที่ดึงได้ และลบผลลบเดิมของวิดีโอ (ถ้ามี)"""
+        blob = zlib.compress(json.dumps(entries, ensure_ascii=False).encode('utf-8'))
+        self._conn.execute("DELETE FROM transcripts WHERE video_id = ? AND language = ''", (video_id,))
+        self._conn.execute("INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                           (video_id, language, self.OK, transcript_language, blob, time.time()))
+        self._maybe_flush()
+
+    def put_missing(self, video_id):
+        """บันทึกว่าวิดีโอนี้ไม่มี transcript"""
+        self._conn.execute("INSERT OR REPLACE INTO transcripts VALUES (?, '', ?, NULL, NULL, ?)",
+                           (video_id, self.NONE, time.time()))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def counts(self):
+        """จำนวนรายการต่อ status"""
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM transcripts GROUP BY status"))
+
+    def close(self):
+        self.flush()
+        self._conn.close()
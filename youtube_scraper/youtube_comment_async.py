@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+YouTube Comment Scraper (Async batch)
+ดึงความคิดเห็นจากวิดีโอจำนวนมากพร้อมกันผ่าน youtubei API ด้วย asyncio และ aiohttp
+
+แต่ละวิดีโอต้องตาม continuation token ทีละหน้า จึงเร็วขึ้นได้ด้วยการดึงหลายวิดีโอพร้อมกัน
+จำนวน request ที่ค้างพร้อมกันถูกจำกัดรวมทุกวิดีโอ เมื่อเจอ 429 จะลดจำนวนลงครึ่งหนึ่ง
+และหยุดส่งตาม Retry-After (หรือ backoff แบบทวีคูณ) แล้วค่อยๆ เพิ่มกลับเมื่อ request สำเร็จ
+
+ผลลัพธ์เป็นไฟล์ JSONL ต่อวิดีโอ (เรียงตามลำดับหน้า) หรือไฟล์รวมไฟล์เดียวที่แบ่ง shard ได้
+โดยแต่ละรายการมี "video_id" กำกับ
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import aiohttp
+
+from youtube_comment_scraper_requests import (
+    API_HEADERS, API_PATH, COMMENT_PAGE, USER_AGENT, YOUTUBE_URL, api_payload, next_token, page_items, parse_items,
+    read_video_ids,
+)
+from scraper_common.jsonl_writer import COMPRESSIONS, JsonlWriter
+from scraper_common.rate_limit import THROTTLE_STATUSES, jittered_backoff, parse_retry_after
+
+class AdaptiveLimiter:
+    """จำกัดจำนวน request ที่ค้างพร้อมกันรวมทุกวิดีโอ และปรับตาม 429
+
+    เมื่อถูก throttle จำนวนที่อนุญาตจะลดลงครึ่งหนึ่งและทุก request หยุดรอจนพ้นช่วงพัก
+    (Retry-After หรือ base_delay * 2^n พร้อม jitter) เมื่อสำเร็จติดต่อกันครบจำนวนที่อนุญาต
+    จะเพิ่มขึ้นทีละหนึ่ง แต่เมื่อถึงระดับที่เคยถูก throttle จะเพิ่มต่อหลังสำเร็จครบ
+    probe_factor เท่าเท่านั้น เพื่อไม่ให้วนชนเพดานเดิมซ้ำๆ request ที่เริ่มก่อนการลด
+    ครั้งล่าสุดจะไม่ทำให้ลดซ้ำ เพื่อไม่ให้ 429 หลายอันจากรอบเดียวกันกดจำนวนลงจนเหลือหนึ่ง
+    """
+
+    def __init__(self, max_concurrency, base_delay=1.0, max_delay=60.0, probe_factor=20):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.ceiling = self.max_concurrency
+        self.probe_factor = probe_factor
+        self.lowest_limit = self.limit
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.throttled = 0
+        self._epoch = 0
+        self._streak = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """รอจนส่ง request ได้ คืน epoch ที่ต้องส่งกลับให้ release"""
+        loop = asyncio.get_running_loop()
+        async with self._condition:
+            while True:
+                pause = self._paused_until - loop.time()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return self._epoch
+                else:
+                    await self._condition.wait()
+
+    async def release(self, epoch, throttled=False, retry_after=None):
+        loop = asyncio.get_running_loop()
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                if epoch == self._epoch:
+                    self._epoch += 1
+                    self._streak += 1
+                    self._successes = 0
+                    self.ceiling = max(1, self.limit - 1)
+                    self.limit = max(1, self.limit // 2)
+                    self.lowest_limit = min(self.lowest_limit, self.limit)
+                    delay = retry_after or min(self.max_delay, self.base_delay * 2 ** (self._streak - 1))
+                    self._paused_until = loop.time() + delay * random.uniform(1.0, 1.25)
+            else:
+                self._streak = 0
+                self._successes += 1
+                needed = self.limit if self.limit < self.ceiling else self.limit * self.probe_factor
+                if self._successes >= needed and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+async def post_next(session, limiter, api_url, request, stats, retries=4):
+    """เรียก youtubei/v1/next ผ่าน limiter ลองใหม่เมื่อถูก throttle, 5xx หรือเครือข่ายผิดพลาด"""
+    for attempt in range(retries + 1):
+        epoch = await limiter.acquire()
+        throttled = False
+        retry_after = None
+        error = None
+        try:
+            stats['requests'] += 1
+            async with session.post(api_url, json=api_payload(request), headers=API_HEADERS) as response:
+                if response.status in THROTTLE_STATUSES:
+                    throttled = True
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    error = f"HTTP {response.status}"
+                elif response.status >= 500:
+                    error = f"HTTP {response.status}"
+                else:
+                    # 4xx อื่นๆ ลองใหม่ก็ไม่ได้ผล จึงส่ง exception ออกไปเลย
+                    response.raise_for_status()
+                    return COMMENT_PAGE.loads(await response.read())
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            error = e
+        finally:
+            await limiter.release(epoch, throttled, retry_after)
+        if attempt == retries:
+            break
+        stats['retries'] += 1
+        if not throttled:
+            # ไม่ได้ถูก throttle จึงรอเฉพาะ request นี้ ไม่หยุดทั้ง limiter
+            await asyncio.sleep(jittered_backoff(attempt, limiter.base_delay, limiter.max_delay))
+    raise RuntimeError(f"ล้มเหลวหลังลอง {retries + 1} ครั้ง: {error}")
+
+async def harvest_video(session, limiter, api_url, video_id, max_comments, replies, write_page, stats, retries=4):
+    """ดึงความคิดเห็นของหนึ่งวิดีโอตาม continuation token และส่งแต่ละหน้าให้ write_page ตามลำดับ"""
+    remaining = max_comments
+    data = await post_next(session, limiter, api_url, {"videoId": video_id}, stats, retries)
+    while remaining > 0:
+        items = page_items(data)
+        token = next_token(items)
+        page = []
+        for comment, comment_id, replies_token in parse_items(items, data):
+            if replies:
+                comment.update(id=comment_id, reply_to=None)
+            page.append(comment)
+            remaining -= 1
+            while remaining and replies and replies_token:
+                reply_data = await post_next(session, limiter, api_url, {"continuation": replies_token}, stats, retries)
+                reply_items = page_items(reply_data)
+                replies_token = next_token(reply_items)
+                for reply, reply_id, _ in parse_items(reply_items, reply_data):
+                    reply.update(id=reply_id, reply_to=comment_id)
+                    page.append(reply)
+                    remaining -= 1
+                    if not remaining:
+                        break
+            if not remaining:
+                break
+        if page:
+            write_page(video_id, page)
+        if not token or remaining <= 0:
+            break
+        data = await post_next(session, limiter, api_url, {"continuation": token}, stats, retries)
+    return max_comments - remaining
+
+class PerVideoOutput:
+    """เขียน youtube_comments_{video_id}.jsonl แยกต่อวิดีโอ ตามลำดับหน้า"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self._writers = {}
+
+    def write_page(self, video_id, page):
+        writer = self._writers.get(video_id)
+        if writer is None:
+            path = os.path.join(self.output_dir, f"youtube_comments_{video_id}.jsonl")
+            writer = self._writers[video_id] = JsonlWriter(path, batch_size=len(page) + 1)
+        for comment in page:
+            writer.write(comment)
+        writer.flush()
+
+    def finish_video(self, video_id):
+        writer = self._writers.pop(video_id, None)
+        if writer is not None:
+            writer.close()
+
+    def close(self):
+        for video_id in list(self._writers):
+            self.finish_video(video_id)
+
+class CombinedOutput:
+    """เขียนทุกวิดีโอลงไฟล์เดียว (แบ่ง shard ตาม max_bytes) รายการของแต่ละวิดีโอยังเรียงตามหน้า"""
+
+    def __init__(self, path, compression=None, max_bytes=None):
+        self.writer = JsonlWriter(path, compression, max_bytes=max_bytes)
+
+    def write_page(self, video_id, page):
+        for comment in page:
+            self.writer.write({"video_id": video_id, **comment})
+
+    def finish_video(self, video_id):
+        pass
+
+    def close(self):
+        self.writer.close()
+
+async def harvest(video_ids, output, concurrency=32, max_comments=100, replies=False, base_url=YOUTUBE_URL,
+                  retries=4, timeout=30, verbose=True):
+    """ดึงความคิดเห็นของทุกวิดีโอ โดยมีไม่เกิน concurrency request ค้างพร้อมกัน คืนสถิติ"""
+    api_url = base_url.rstrip('/') + API_PATH
+    limiter = AdaptiveLimiter(concurrency)
+    queue = asyncio.Queue()
+    for video_id in video_ids:
+        queue.put_nowait(video_id)
+    stats = {'videos': len(video_ids), 'done': 0, 'failed': 0, 'empty': 0, 'comments': 0,
+             'requests': 0, 'retries': 0}
+    started = time.perf_counter()
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout,
+                                     headers={'User-Agent': USER_AGENT}) as session:
+
+        async def worker():
+            while True:
+                try:
+                    video_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    count = await harvest_video(session, limiter, api_url, video_id, max_comments, replies,
+                                                output.write_page, stats, retries)
+                except Exception as e:
+                    stats['failed'] += 1
+                    if verbose:
+                        print(f"✗ {video_id}: {e}")
+                    continue
+                finally:
+                    output.finish_video(video_id)
+                stats['done'] += 1
+                stats['comments'] += count
+                stats['empty'] += 0 if count else 1
+                if verbose:
+                    print(f"✓ [{stats['done'] + stats['failed']}/{stats['videos']}] {video_id}: "
+                          f"{count} ความคิดเห็น (limit {limiter.limit})")
+
+        # วิดีโอหนึ่งมี request ค้างได้ครั้งละหนึ่ง จึงใช้ worker เท่ากับจำนวน request สูงสุด
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(video_ids))))))
+
+    stats['elapsed'] = time.perf_counter() - started
+    stats['throttled'] = limiter.throttled
+    stats['lowest_limit'] = limiter.lowest_limit
+    stats['videos_per_hour'] = stats['done'] * 3600 / stats['elapsed'] if stats['elapsed'] else 0.0
+    stats['comments_per_sec'] = stats['comments'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
+
+def run_harvest(video_ids, output_dir="youtube_data", combined=None, compression=None, max_shard_bytes=None,
+                concurrency=32, max_comments=100, replies=False, base_url=YOUTUBE_URL, retries=4, verbose=True):
+    """จุดเริ่มแบบ synchronous ของ harvest"""
+    if combined:
+        output = CombinedOutput(combined, compression, max_shard_bytes)
+    else:
+        output = PerVideoOutput(output_dir)
+    try:
+        stats = asyncio.run(harvest(video_ids, output, concurrency, max_comments, replies, base_url, retries,
+                                    verbose=verbose))
+    finally:
+        output.close()
+    if verbose:
+        print(f"ดึงความคิดเห็นจาก {stats['done']}/{stats['videos']} วิดีโอ ({stats['failed']} ล้มเหลว, "
+              f"{stats['empty']} ไม่มีความคิดเห็น) {stats['comments']} รายการใน {stats['elapsed']:.1f} วินาที")
+        print(f"{stats['videos_per_hour']:.0f} วิดีโอ/ชั่วโมง, {stats['comments_per_sec']:.0f} ความคิดเห็น/วินาที, "
+              f"{stats['requests']} requests, ถูก throttle {stats['throttled']} ครั้ง "
+              f"(concurrency ต่ำสุด {stats['lowest_limit']})")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="ดึงความคิดเห็น YouTube จากวิดีโอจำนวนมากพร้อมกันโดยไม่ใช้ browser")
+    parser.add_argument('list_file', help="ไฟล์ video_id หรือ URL บรรทัดละหนึ่งรายการ")
+    parser.add_argument('--concurrency', type=int, default=32, help="จำนวน request ที่ค้างพร้อมกันสูงสุด (default 32)")
+    parser.add_argument('--max-comments', type=int, default=100, help="ความคิดเห็นสูงสุดต่อวิดีโอ (default 100)")
+    parser.add_argument('--replies', action='store_true', help="ดึงการตอบกลับด้วย (นับรวมใน --max-comments)")
+    parser.add_argument('--output-dir', default="youtube_data", help="โฟลเดอร์ไฟล์ต่อวิดีโอ (default youtube_data)")
+    parser.add_argument('--combined', help="เขียนทุกวิดีโอลงไฟล์นี้ไฟล์เดียวแทนไฟล์ต่อวิดีโอ")
+    parser.add_argument('--compression', choices=[c for c in COMPRESSIONS if c], help="บีบอัดไฟล์รวม")
+    parser.add_argument('--shard-mb', type=int, help="แบ่งไฟล์รวมเป็น shard ละกี่ MB")
+    parser.add_argument('--retries', type=int, default=4, help="จำนวนครั้งที่ลองใหม่ต่อ request (default 4)")
+    args = parser.parse_args()
+    if (args.compression or args.shard_mb) and not args.combined:
+        parser.error("--compression และ --shard-mb ใช้ได้กับ --combined เท่านั้น")
+
+    video_ids = read_video_ids(args.list_file)
+    print(f"พบ {len(video_ids)} วิดีโอใน {args.list_file}")
+    run_harvest(video_ids, args.output_dir, args.combined, args.compression,
+                args.shard_mb * 1024 * 1024 if args.shard_mb else None, args.concurrency, args.max_comments,
+                args.replies, retries=args.retries)
+
+if __name__ == "__main__":
+    main()
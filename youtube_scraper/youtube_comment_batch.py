@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+YouTube Comment Scraper (Batch)
+ดึงความคิดเห็นจากรายการวิดีโอด้วย browser แบบ headless หลายตัวพร้อมกัน
+
+แต่ละ worker process เปิด Chrome หนึ่งตัวและใช้ซ้ำกับทุกวิดีโอที่ได้รับ ก่อนแต่ละวิดีโอ
+จะตรวจว่า browser ยังตอบสนองอยู่ ถ้าไม่ก็เริ่มใหม่ และเริ่มใหม่ทุก recycle_after วิดีโอ
+เพื่อไม่ให้หน่วยความจำสะสม เมื่อจบจะแสดงสถิติของแต่ละ worker
+"""
+
+import argparse
+import multiprocessing
+import queue
+import time
+
+from youtube_comment_scraper import YouTubeCommentScraper, cached_driver_path, parse_video_id
+
+def read_video_urls(list_file):
+    """อ่าน URL วิดีโอจากไฟล์ บรรทัดละหนึ่ง URL (ข้ามบรรทัดว่าง, # และบรรทัดที่แยก video_id ไม่ได้)"""
+    urls = []
+    with open(list_file, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if parse_video_id(line) is None:
+                print(f"ข้าม: {line}")
+            else:
+                urls.append(line)
+    return urls
+
+# วินาทีที่รอผลจาก worker ก่อนตรวจว่ามี worker ตายไปโดยไม่ส่งสถิติหรือไม่
+RESULT_POLL_SECONDS = 1.0
+
+def _new_stats(worker_id):
+    return {'worker': worker_id, 'videos': 0, 'comments': 0, 'empty': 0, 'restarts': 0,
+            'busy_seconds': 0.0, 'network_bytes': 0, 'blocked': 0, 'started': time.monotonic()}
+
+def scrape_one(scraper, url, max_comments, stats):
+    """ดึงความคิดเห็นหนึ่งวิดีโอ เริ่ม browser ใหม่และลองซ้ำหนึ่งครั้งถ้า browser ค้างหรือล่ม"""
+    for _ in range(2):
+        if not scraper.is_healthy():
+            scraper.restart_driver()
+            stats['restarts'] += 1
+        comments = scraper.extract_comments(url, max_comments)
+        if comments or scraper.is_healthy():
+            return comments
+    return []
+
+def worker_main(worker_id, tasks, results, output_dir, max_comments, recycle_after, fast, lean):
+    stats = _new_stats(worker_id)
+    scraper = YouTubeCommentScraper(output_dir=output_dir, fast=fast, lean=lean)
+    try:
+        scraper.create_driver()
+        handled = 0
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            url, video_id = task
+            if recycle_after and handled and handled % recycle_after == 0:
+                scraper.restart_driver()
+                stats['restarts'] += 1
+            started = time.monotonic()
+            error = None
+            scraper.last_network = None
+            try:
+                comments = scrape_one(scraper, url, max_comments, stats)
+                scraper.save_comments(comments, video_id)
+            except Exception as e:
+                comments = []
+                error = str(e)
+            elapsed = time.monotonic() - started
+            handled += 1
+            stats['videos'] += 1
+            stats['comments'] += len(comments)
+            stats['empty'] += 0 if comments else 1
+            stats['busy_seconds'] += elapsed
+            if scraper.last_network:
+                stats['network_bytes'] += scraper.last_network['bytes']
+                stats['blocked'] += scraper.last_network['blocked']
+            results.put(('video', worker_id, url, len(comments), elapsed, error))
+    except Exception as e:
+        results.put(('error', worker_id, None, 0, 0.0, str(e)))
+    finally:
+        try:
+            scraper.close()
+        except Exception:
+            pass
+        stats['elapsed'] = time.monotonic() - stats.pop('started')
+        results.put(('stats', worker_id, stats))
+
+def print_worker_stats(all_stats):
+    print(f"{'worker':>6} {'videos':>7} {'comments':>9} {'empty':>7} {'restarts':>9} {'s/video':>8} "
+          f"{'videos/min':>11} {'KB/video':>9} {'blocked':>8}")
+    for stats in sorted(all_stats, key=lambda s: s['worker']):
+        videos = stats['videos'] or 1
+        per_min = stats['videos'] * 60 / stats['elapsed'] if stats['elapsed'] else 0.0
+        print(f"{stats['worker']:>6} {stats['videos']:>7} {stats['comments']:>9} {stats['empty']:>7} "
+              f"{stats['restarts']:>9} {stats['busy_seconds'] / videos:>8.2f} {per_min:>11.1f} "
+              f"{stats['network_bytes'] / 1024 / videos:>9.0f} {stats['blocked']:>8}")
+
+def run_batch(urls, output_dir="youtube_data", workers=2, max_comments=100, recycle_after=50, fast=True,
+              lean=False):
+    """กระจาย URL ไปยัง worker ที่แต่ละตัวมี browser ของตัวเอง คืน (ผลต่อวิดีโอ, สถิติต่อ worker)
+
+    URL ที่แยก video_id ไม่ได้จะถูกข้ามก่อนเปิด browser (ไม่เช่นนั้นจะโหลดหน้าเปล่าๆ
+    และเขียนทับ youtube_comments_None.jsonl)
+    """
+    jobs = []
+    for url in urls:
+        video_id = parse_video_id(url)
+        if video_id is None:
+            print(f"ข้าม: {url} (ไม่พบ video_id)")
+        else:
+            jobs.append((url, video_id))
+    if not jobs:
+        return [], []
+    # หา path ของ chromedriver ครั้งเดียวก่อนเริ่ม worker เพื่อให้ทุก worker ใช้ cache
+    cached_driver_path()
+    workers = max(1, min(workers, len(jobs)))
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    for job in jobs:
+        tasks.put(job)
+    for _ in range(workers):
+        tasks.put(None)
+
+    processes = [multiprocessing.Process(target=worker_main,
+                                         args=(i, tasks, results, output_dir, max_comments, recycle_after, fast, lean))
+                 for i in range(workers)]
+    started = time.monotonic()
+    for process in processes:
+        process.start()
+
+    videos = []
+    all_stats = []
+    finished = set()
+    while len(finished) < workers:
+        try:
+            message = results.get(timeout=RESULT_POLL_SECONDS)
+        except queue.Empty:
+            # worker ที่ถูก kill (OOM, segfault) ไม่ถึง finally จึงไม่ส่งสถิติ นับว่าจบแล้ว
+            for worker_id, process in enumerate(processes):
+                if worker_id not in finished and not process.is_alive():
+                    finished.add(worker_id)
+                    stats = _new_stats(worker_id)
+                    stats['elapsed'] = time.monotonic() - stats.pop('started')
+                    all_stats.append(stats)
+                    print(f"worker {worker_id}: process จบโดยไม่ส่งสถิติ (exit code {process.exitcode}) "
+                          f"วิดีโอที่กำลังทำอยู่จะหายไป")
+            continue
+        if message[0] == 'stats':
+            if message[1] not in finished:
+                finished.add(message[1])
+                all_stats.append(message[2])
+            continue
+        kind, worker_id, url, count, elapsed, error = message
+        if kind == 'error':
+            print(f"worker {worker_id}: เริ่ม browser ไม่ได้: {error}")
+            continue
+        videos.append({'url': url, 'worker': worker_id, 'comments': count, 'seconds': round(elapsed, 3),
+                       'error': error})
+        print(f"[{len(videos)}/{len(jobs)}] worker {worker_id}: {count} ความคิดเห็น "
+              f"({elapsed:.1f} วินาที) {url}")
+    for process in processes:
+        process.join()
+
+    elapsed = time.monotonic() - started
+    print(f"ดึงความคิดเห็นจาก {len(videos)} วิดีโอใน {elapsed:.1f} วินาที "
+          f"({len(videos) * 60 / elapsed:.1f} วิดีโอ/นาที)")
+    print_worker_stats(all_stats)
+    return videos, all_stats
+
+def main():
+    parser = argparse.ArgumentParser(description="ดึงความคิดเห็น YouTube จากรายการวิดีโอด้วย browser หลายตัว")
+    parser.add_argument('list_file', help="ไฟล์ URL วิดีโอ บรรทัดละหนึ่ง URL")
+    parser.add_argument('--workers', type=int, default=2, help="จำนวน browser ที่ทำงานพร้อมกัน (default 2)")
+    parser.add_argument('--max-comments', type=int, default=100, help="ความคิดเห็นสูงสุดต่อวิดีโอ (default 100)")
+    parser.add_argument('--output-dir', default="youtube_data", help="โฟลเดอร์ผลลัพธ์ (default youtube_data)")
+    parser.add_argument('--recycle-after', type=int, default=50,
+                        help="เริ่ม browser ใหม่ทุก N วิดีโอ, 0 คือไม่เริ่มใหม่ (default 50)")
+    parser.add_argument('--slow', action='store_true', help="ใช้การรอแบบ sleep คงที่แทนโหมดเร็ว")
+    parser.add_argument('--lean', action='store_true',
+                        help="ไม่โหลดวิดีโอ รูปภาพ ฟอนต์ และโฆษณา และรายงานการใช้เครือข่าย")
+    args = parser.parse_args()
+
+    urls = read_video_urls(args.list_file)
+    print(f"พบ {len(urls)} วิดีโอใน {args.list_file}")
+    run_batch(urls, args.output_dir, args.workers, args.max_comments, args.recycle_after, fast=not args.slow,
+              lean=args.lean)
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ YouTube Comment Scraper
 ดึงความคิดเห็นจากวิดีโอ YouTube
 """
 
+import os
 import sys
 import time
 import json
@@ -15,32 +16,182 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from pathlib import Path
 
+# ดึงทุกฟิลด์ของความคิดเห็นในหน้าเว็บด้วย execute_script ครั้งเดียว
+# (ใช้ selector เดียวกับ XPath ในโหมดปกติ) แล้วส่งกลับเป็น JSON
+EXTRACT_COMMENTS_JS = """
+const limit = arguments[0];
+const text = (root, selector) => {
+    const el = root.querySelector(selector);
+    return el ? el.textContent.trim() : null;
+};
+const comments = [];
+const threads = document.querySelectorAll('ytd-comment-thread-renderer');
+for (let i = 0; i < threads.length && comments.length < limit; i++) {
+    const author = text(threads[i], 'a#author-text');
+    const comment = text(threads[i], 'yt-formatted-string#content-text');
+    if (author === null || comment === null) continue;
+    const likes = text(threads[i], 'span#vote-count-middle');
+    const time = text(threads[i], 'a[class="yt-simple-endpoint style-scope yt-formatted-string"]');
+    comments.push({author: author, comment: comment, likes: likes === null ? '0' : likes,
+                   time: time === null ? '' : time});
+}
+return JSON.stringify(comments);
+"""
+
+# รอจนจำนวนความคิดเห็นมากกว่า arguments[0] (ดูจาก DOM mutation) หรือครบ
+# timeout arguments[1] ms แล้วส่งจำนวนปัจจุบันกลับ
+WAIT_FOR_COMMENTS_JS = """
+const previous = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+const count = () => document.querySelectorAll('ytd-comment-thread-renderer').length;
+if (count() > previous) { done(count()); return; }
+let timer = null;
+const observer = new MutationObserver(() => {
+    const n = count();
+    if (n > previous) { observer.disconnect(); clearTimeout(timer); done(n); }
+});
+observer.observe(document.documentElement, {childList: true, subtree: true});
+timer = setTimeout(() => { observer.disconnect(); done(count()); }, timeoutMs);
+"""
+
+# ChromeDriverManager().install() ตรวจเวอร์ชันผ่านเครือข่ายทุกครั้ง จึงเก็บ path ที่ได้ไว้ใช้ซ้ำ
+DRIVER_CACHE = Path.home() / '.cache' / 'scrape-thai-web' / 'chromedriver.json'
+DRIVER_CACHE_TTL = 7 * 24 * 3600
+
+def cached_driver_path(refresh=False):
+    """คืน path ของ chromedriver: CHROMEDRIVER_PATH ถ้าตั้งไว้ ไม่เช่นนั้นใช้ค่าที่ cache ไว้ไม่เกิน 7 วัน"""
+    if os.environ.get('CHROMEDRIVER_PATH'):
+        return os.environ['CHROMEDRIVER_PATH']
+    if not refresh:
+        try:
+            with open(DRIVER_CACHE, encoding='utf-8') as f:
+                cached = json.load(f)
+            if time.time() - cached['saved_at'] < DRIVER_CACHE_TTL and os.path.exists(cached['path']):
+                return cached['path']
+        except (OSError, ValueError, KeyError):
+            pass
+    path = ChromeDriverManager().install()
+    try:
+        DRIVER_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        with open(DRIVER_CACHE, 'w', encoding='utf-8') as f:
+            json.dump({'path': path, 'saved_at': time.time()}, f)
+    except OSError:
+        pass
+    return path
+
+def parse_video_id(video_url):
+    """แยก video_id จาก URL (คืน None ถ้าไม่ใช่ URL วิดีโอ)"""
+    if 'v=' in video_url:
+        return video_url.split('v=')[1].split('&')[0]
+    if 'youtu.be/' in video_url:
+        return video_url.split('youtu.be/')[1].split('?')[0]
+    return None
+
+# URL ที่ไม่จำเป็นต่อการดึงความคิดเห็น (Network.setBlockedURLs รองรับ * เป็น wildcard):
+# ส่วนของวิดีโอ, รูปภาพ/thumbnail/avatar, ฟอนต์, โฆษณาและ tracking
+BLOCKED_URL_PATTERNS = [
+    '*/videoplayback*', '*.googlevideo.com/*',
+    '*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.svg*', '*.ico*',
+    '*i.ytimg.com/*', '*yt3.ggpht.com/*', '*yt3.googleusercontent.com/*',
+    '*.woff*', '*.ttf*', '*.otf*', '*fonts.gstatic.com/*', '*fonts.googleapis.com/*',
+    '*doubleclick.net/*', '*googlesyndication.com/*', '*googleadservices.com/*', '*/pagead/*',
+    '*/ptracking*', '*/api/stats/*', '*/generate_204*', '*/log_event*', '*google-analytics.com/*',
+]
+
 class YouTubeCommentScraper:
-    def __init__(self, output_dir="youtube_data"):
+    def __init__(self, output_dir="youtube_data", fast=False, first_load_timeout=15.0, idle_timeout=2.0,
+                 idle_rounds=2, lean=False, report_network=None):
+        """
+        fast: รอตามเหตุการณ์ใน DOM แทนการ sleep คงที่ และหยุดเลื่อนเมื่อจำนวนความคิดเห็นไม่เพิ่ม
+        lean: ไม่โหลดวิดีโอ รูปภาพ ฟอนต์ และโฆษณา (บล็อกผ่าน CDP) ปิด autoplay
+        report_network: รายงานจำนวน request, byte และ request ที่ถูกบล็อกต่อหน้า (ค่าเริ่มต้นตาม lean)
+        first_load_timeout: วินาทีที่รอความคิดเห็นชุดแรก
+        idle_timeout, idle_rounds: หยุดเมื่อเลื่อนแล้วไม่มีความคิดเห็นใหม่ภายใน idle_timeout วินาที
+            ติดกัน idle_rounds ครั้ง
+        """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         self.driver = None
+        self.fast = fast
+        self.first_load_timeout = first_load_timeout
+        self.idle_timeout = idle_timeout
+        self.idle_rounds = idle_rounds
+        self.lean = lean
+        self.report_network = lean if report_network is None else report_network
+        self.last_network = None
+
+    def create_driver(self):
+        """เริ่ม Chrome แบบ headless (ส่งต่อ exception ถ้าเริ่มไม่ได้)"""
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')  # Run in background
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--window-size=1920,1080')
+        options.page_load_strategy = 'eager'  # Faster loading
+        if self.lean:
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_argument('--autoplay-policy=user-gesture-required')
+            options.add_argument('--mute-audio')
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        if self.report_network:
+            # ใช้ performance log นับ request และจำนวน byte ของแต่ละหน้า
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+        try:
+            self.driver = webdriver.Chrome(service=Service(cached_driver_path()), options=options)
+        except Exception:
+            # path ที่ cache ไว้อาจไม่ตรงกับเวอร์ชัน Chrome ที่อัปเดตแล้ว
+            self.driver = webdriver.Chrome(service=Service(cached_driver_path(refresh=True)), options=options)
+        # ต้องนานกว่า timeout ที่ส่งให้ WAIT_FOR_COMMENTS_JS
+        self.driver.set_script_timeout(max(self.first_load_timeout, self.idle_timeout) + 5)
+        if self.lean:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+
+    def network_usage(self):
+        """อ่าน performance log ตั้งแต่ครั้งก่อน คืนจำนวน request, byte ที่โหลดจริง และ request ที่ถูกบล็อก"""
+        usage = {'requests': 0, 'bytes': 0, 'blocked': 0}
+        for entry in self.driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                usage['requests'] += 1
+            elif method == 'Network.loadingFinished':
+                usage['bytes'] += int(params.get('encodedDataLength', 0))
+            elif method == 'Network.loadingFailed' and (params.get('blockedReason')
+                                                         or 'BLOCKED_BY_CLIENT' in params.get('errorText', '')):
+                usage['blocked'] += 1
+        return usage
 
     def setup_driver(self):
         """ตั้งค่า WebDriver"""
         try:
-            options = webdriver.ChromeOptions()
-            options.add_argument('--headless')  # Run in background
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--window-size=1920,1080')
-            options.page_load_strategy = 'eager'  # Faster loading
-
-            self.driver = webdriver.Chrome(
-                service=Service(ChromeDriverManager().install()),
-                options=options
-            )
+            self.create_driver()
             print("WebDriver เริ่มทำงานแล้ว")
         except Exception as e:
             print(f"เกิดข้อผิดพลาดในการตั้งค่า WebDriver: {e}")
             sys.exit(1)
 
+    def is_healthy(self):
+        """ตรวจว่า browser ยังตอบสนองอยู่"""
+        if not self.driver:
+            return False
+        try:
+            return self.driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def restart_driver(self):
+        """ปิด browser เดิม (ถ้ายังปิดได้) แล้วเริ่มใหม่"""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+        self.create_driver()
+
     def scroll_to_load_comments(self, max_scrolls=10):
         """เลื่อนหน้าเพื่อโหลดความคิดเห็นเพิ่มเติม"""
         for i in range(max_scrolls):
@@ -64,8 +215,83 @@ class YouTubeCommentScraper:
                 print(f"เกิดข้อผิดพลาดในการเลื่อน: {e}")
                 break
 
+    def wait_for_comment_growth(self, previous, timeout):
+        """รอจนมีความคิดเห็นมากกว่า previous หรือครบ timeout วินาที แล้วคืนจำนวนปัจจุบัน"""
+        return self.driver.execute_async_script(WAIT_FOR_COMMENTS_JS, previous, int(timeout * 1000))
+
+    def scroll_until_plateau(self, max_comments=100, max_scrolls=50):
+        """เลื่อนหน้าจนได้ความคิดเห็นครบ max_comments หรือจำนวนไม่เพิ่มอีก คืนจำนวนที่โหลดแล้ว"""
+        scroll = "window.scrollTo(0, document.documentElement.scrollHeight);"
+        # ความคิดเห็นชุดแรกโหลดเมื่อเลื่อนถึงส่วนความคิดเห็น ซึ่งอาจยังไม่ถูกสร้างตอน driver.get คืนค่า
+        # จึงเลื่อนซ้ำทุกวินาทีจนกว่าจะมีความคิดเห็นหรือครบ first_load_timeout
+        deadline = time.monotonic() + self.first_load_timeout
+        count = 0
+        while count == 0 and time.monotonic() < deadline:
+            self.driver.execute_script(scroll)
+            count = self.wait_for_comment_growth(0, min(1.0, max(0.0, deadline - time.monotonic())))
+        print(f"โหลดความคิดเห็นชุดแรก: {count} ความคิดเห็น")
+
+        idle = 0
+        for i in range(max_scrolls):
+            if count == 0 or count >= max_comments:
+                break
+            self.driver.execute_script(scroll)
+            new_count = self.wait_for_comment_growth(count, self.idle_timeout)
+            print(f"เลื่อนครั้งที่ {i+1}: {new_count} ความคิดเห็น")
+            if new_count > count:
+                count = new_count
+                idle = 0
+            else:
+                idle += 1
+                if idle >= self.idle_rounds:
+                    break
+        return count
+
+    def extract_comments_fast(self, video_url, max_comments=100):
+        """ดึงความคิดเห็นแบบเร็ว: ไม่มี sleep คงที่ และดึงข้อมูลด้วย execute_script ครั้งเดียว"""
+        try:
+            print(f"กำลังดึงความคิดเห็นจาก: {video_url}")
+            started = time.perf_counter()
+            self.driver.get(video_url)
+
+            # ยอมรับคุกกี้ถ้ามี (ไม่รอ ถ้าไม่มีปุ่มก็ข้ามไป)
+            for button in self.driver.find_elements(By.XPATH, "//button[contains(@aria-label, 'Accept') or contains(text(), 'Accept')]"):
+                if button.is_displayed():
+                    button.click()
+                    break
+
+            self.scroll_until_plateau(max_comments)
+            comments = json.loads(self.driver.execute_script(EXTRACT_COMMENTS_JS, max_comments))
+            print(f"ดึงความคิดเห็น {len(comments)} รายการใน {time.perf_counter() - started:.1f} วินาที")
+            return comments
+
+        except Exception as e:
+            print(f"เกิดข้อผิดพลาดในการดึงความคิดเห็น: {e}")
+            return []
+
     def extract_comments(self, video_url, max_comments=100):
         """ดึงความคิดเห็นจาก URL วิดีโอ"""
+        if self.report_network:
+            try:
+                self.network_usage()  # ทิ้ง log ของหน้าก่อนหน้า
+            except Exception:
+                pass
+        if self.fast:
+            comments = self.extract_comments_fast(video_url, max_comments)
+        else:
+            comments = self.extract_comments_default(video_url, max_comments)
+        if self.report_network:
+            try:
+                self.last_network = self.network_usage()
+                print(f"เครือข่าย: {self.last_network['requests']} requests, "
+                      f"{self.last_network['bytes'] / 1024:.0f} KB, บล็อก {self.last_network['blocked']} requests")
+            except Exception as e:
+                self.last_network = None
+                print(f"อ่าน performance log ไม่ได้: {e}")
+        return comments
+
+    def extract_comments_default(self, video_url, max_comments=100):
+        """ดึงความคิดเห็นแบบเดิม: sleep คงที่และอ่านทีละความคิดเห็น"""
         try:
             print(f"กำลังดึงความคิดเห็นจาก: {video_url}")
             self.driver.get(video_url)
@@ -150,12 +376,8 @@ class YouTubeCommentScraper:
         if not self.driver:
             self.setup_driver()
 
-        # แยก video_id จาก URL
-        if 'v=' in video_url:
-            video_id = video_url.split('v=')[1].split('&')[0]
-        elif 'youtu.be/' in video_url:
-            video_id = video_url.split('youtu.be/')[1].split('?')[0]
-        else:
+        video_id = parse_video_id(video_url)
+        if not video_id:
             print("URL ไม่ถูกต้อง")
             return
 
@@ -171,15 +393,16 @@ class YouTubeCommentScraper:
             print("WebDriver ปิดแล้ว")
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python youtube_comment_scraper.py <video_url> [max_comments]")
-        print("Example: python youtube_comment_scraper.py https://www.youtube.com/watch?v=VIDEO_ID 50")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 1:
+        print("Usage: python youtube_comment_scraper.py <video_url> [max_comments] [--fast] [--lean]")
+        print("Example: python youtube_comment_scraper.py https://www.youtube.com/watch?v=VIDEO_ID 50 --fast")
         sys.exit(1)
 
-    video_url = sys.argv[1]
-    max_comments = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    video_url = args[0]
+    max_comments = int(args[1]) if len(args) > 1 else 100
 
-    scraper = YouTubeCommentScraper()
+    scraper = YouTubeCommentScraper(fast='--fast' in sys.argv, lean='--lean' in sys.argv)
     try:
         scraper.scrape_video_comments(video_url, max_comments)
     finally:
@@ -2,115 +2,310 @@
 """
 YouTube Comment Scraper (Requests-based)
 ดึงความคิดเห็นจากวิดีโอ YouTube โดยใช้ requests
+
+เรียก youtubei/v1/next แล้วตาม continuation token ของส่วนความคิดเห็น (และของการตอบกลับ
+เมื่อเปิด --replies) ไปทีละหน้า แต่ละหน้าถูกเขียนลงไฟล์ทันทีที่ได้รับ
 """
 
+import os
 import sys
 import json
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import time
 import re
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scraper_common.fastjson import JsonPath, Projection
+from scraper_common.http_client import DEFAULT_POOL_SIZE, HttpClient
+from scraper_common.jsonl_writer import JsonlWriter
+from scraper_common.rate_limit import AdaptiveRateLimiter, RetryPolicy
+from scraper_common.response_cache import ResponseCache
+
+YOUTUBE_URL = "https://www.youtube.com"
+API_PATH = "/youtubei/v1/next"
+CLIENT_VERSION = "2.20210721.00.00"
+API_HEADERS = {
+    'Content-Type': 'application/json',
+    'X-YouTube-Client-Name': '1',
+    'X-YouTube-Client-Version': CLIENT_VERSION
+}
+# จำนวน request ต่อวินาทีเริ่มต้น ลดลงอัตโนมัติเมื่อเจอ 429/503
+DEFAULT_RPS = 10.0
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+VIDEO_ID_PATTERNS = [
+    r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]{11})',
+    r'(?:https?://)?youtu\.be/([a-zA-Z0-9_-]{11})',
+    r'(?:https?://)?(?:www\.)?youtube\.com/embed/([a-zA-Z0-9_-]{11})'
+]
+
+def video_id_from(text):
+    """แยก video_id จาก URL YouTube หรือรับ video_id ตรงๆ (คืน None ถ้าไม่ใช่ทั้งสองแบบ)"""
+    for pattern in VIDEO_ID_PATTERNS:
+        match = re.search(pattern, text)
+        if match:
+            return match.group(1)
+    if re.fullmatch(r'[a-zA-Z0-9_-]{11}', text):
+        return text
+    return None
+
+def read_video_ids(list_file):
+    """อ่าน video_id หรือ URL จากไฟล์ บรรทัดละหนึ่งรายการ (ข้ามบรรทัดว่าง, # และรายการซ้ำ)"""
+    video_ids = []
+    seen = set()
+    with open(list_file, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            video_id = video_id_from(line)
+            if video_id is None:
+                print(f"ข้าม: {line}")
+            elif video_id not in seen:
+                seen.add(video_id)
+                video_ids.append(video_id)
+    return video_ids
+
+def api_payload(request):
+    """body ของ youtubei/v1/next: context ของ client WEB รวมกับ videoId หรือ continuation"""
+    payload = {"context": {"client": {"clientName": "WEB", "clientVersion": CLIENT_VERSION}}}
+    payload.update(request)
+    return payload
+
+# ฟิลด์ที่ parser อ่าน: response ถูก decode เฉพาะส่วนนี้ (ดู scraper_common.fastjson.Projection)
+CONTINUATION_FIELDS = ['continuationEndpoint.continuationCommand.token',
+                       'button.buttonRenderer.command.continuationCommand.token']
+RENDERER_FIELDS = ['authorText.simpleText', 'contentText.runs[*].text', 'contentText.simpleText', 'likeCount',
+                   'voteCount.simpleText', 'publishedTimeText.runs[*].text', 'commentId']
+VIEW_MODEL_FIELDS = ['commentKey', 'commentId']
+ITEM_FIELDS = (
+    [f'commentThreadRenderer.comment.commentRenderer.{f}' for f in RENDERER_FIELDS]
+    + [f'commentThreadRenderer.commentViewModel.commentViewModel.{f}' for f in VIEW_MODEL_FIELDS]
+    + [f'commentThreadRenderer.replies.commentRepliesRenderer.{key}[*].continuationItemRenderer.{f}'
+       for key in ('contents', 'subThreads') for f in CONTINUATION_FIELDS]
+    + [f'commentRenderer.{f}' for f in RENDERER_FIELDS]
+    + [f'commentViewModel.{f}' for f in VIEW_MODEL_FIELDS]
+    + [f'commentViewModel.commentViewModel.{f}' for f in VIEW_MODEL_FIELDS]
+    + [f'continuationItemRenderer.{f}' for f in CONTINUATION_FIELDS]
+)
+CONTINUATION_ITEMS = [f'{key}[*].{command}.continuationItems'
+                      for key in ('onResponseReceivedEndpoints', 'onResponseReceivedActions')
+                      for command in ('reloadContinuationItemsCommand', 'appendContinuationItemsAction')]
+WATCH_SECTIONS = 'contents.twoColumnWatchNextResults.results.results.contents[*].itemSectionRenderer'
+PANEL_SECTIONS = 'engagementPanels[*].engagementPanelSectionListRenderer'
+PANEL_ITEM_SECTIONS = 'content.sectionListRenderer.contents[*].itemSectionRenderer'
+MUTATIONS = 'frameworkUpdates.entityBatchUpdate.mutations[*]'
+ENTITY_FIELDS = ['author.displayName', 'properties.content.content', 'properties.publishedTime',
+                 'properties.commentId', 'toolbar.likeCountNotliked']
+
+COMMENT_PAGE = Projection(
+    [f'{prefix}[*].{f}' for prefix in CONTINUATION_ITEMS for f in ITEM_FIELDS]
+    + [f'{WATCH_SECTIONS}.contents[*].{f}' for f in ITEM_FIELDS] + [f'{WATCH_SECTIONS}.sectionIdentifier']
+    + [f'{PANEL_SECTIONS}.{PANEL_ITEM_SECTIONS}.contents[*].{f}' for f in ITEM_FIELDS]
+    + [f'{PANEL_SECTIONS}.panelIdentifier', f'{MUTATIONS}.entityKey']
+    + [f'{MUTATIONS}.payload.commentEntityPayload.{f}' for f in ENTITY_FIELDS]
+)
+
+_CONTINUATION_TOKENS = [JsonPath(path) for path in CONTINUATION_FIELDS]
+_CONTINUATION_ITEMS = [JsonPath(path) for path in CONTINUATION_ITEMS]
+_WATCH_SECTIONS = JsonPath(WATCH_SECTIONS)
+_PANEL_SECTIONS = JsonPath(PANEL_SECTIONS)
+_PANEL_ITEM_SECTIONS = JsonPath(PANEL_ITEM_SECTIONS)
+_MUTATIONS = JsonPath(MUTATIONS)
+
+def _continuation_token(renderer):
+    """token จาก continuationItemRenderer (โหลดเมื่อเลื่อนถึง หรือปุ่ม "แสดงเพิ่มเติม")"""
+    for path in _CONTINUATION_TOKENS:
+        token = path.find(renderer)
+        if token:
+            return token
+    return None
+
+def _comment_section(data):
+    """รายการในส่วนความคิดเห็นของ response หน้าแรก (ก่อนตาม continuation)"""
+    for section in _WATCH_SECTIONS.find_all(data):
+        if section.get('sectionIdentifier', 'comment-item-section') == 'comment-item-section':
+            return section.get('contents', [])
+    for panel in _PANEL_SECTIONS.find_all(data):
+        if panel.get('panelIdentifier') == 'engagement-panel-comments-section':
+            for section in _PANEL_ITEM_SECTIONS.find_all(panel):
+                return section.get('contents', [])
+    return []
+
+def page_items(data):
+    """รายการทั้งหมดของหนึ่งหน้า: ส่วนความคิดเห็นของหน้าแรก หรือ continuationItems ของหน้าถัดไป"""
+    items = []
+    for path in _CONTINUATION_ITEMS:
+        for continuation_items in path.find_all(data):
+            items.extend(continuation_items)
+    return items or _comment_section(data)
+
+def next_token(items):
+    """continuation token ของหน้าถัดไปในรายการของหนึ่งหน้า (None ถ้าเป็นหน้าสุดท้าย)"""
+    for item in items:
+        if 'continuationItemRenderer' in item:
+            return _continuation_token(item['continuationItemRenderer'])
+    return None
+
+def _replies_token(thread):
+    replies = thread.get('replies', {}).get('commentRepliesRenderer', {})
+    return next_token(replies.get('contents', []) + replies.get('subThreads', []))
+
+def _comment_entities(data):
+    """commentEntityPayload ตาม entity key จาก frameworkUpdates"""
+    return {m['entityKey']: m['payload']['commentEntityPayload']
+            for m in _MUTATIONS.find_all(data) if 'commentEntityPayload' in m.get('payload', {})}
+
+def _comment_entity(thread, entities):
+    """(comment id, payload) ของ commentViewModel"""
+    view_model = thread.get('commentViewModel', {})
+    view_model = view_model.get('commentViewModel', view_model)
+    return view_model.get('commentId'), entities.get(view_model.get('commentKey'))
+
+def parse_comment(comment_thread):
+    """แยกข้อมูลความคิดเห็น"""
+    try:
+        comment = comment_thread['comment']['commentRenderer']
+
+        author = comment['authorText']['simpleText']
+        content = comment['contentText']
+        comment_text = ''.join(run['text'] for run in content['runs']) if 'runs' in content else content['simpleText']
+        likes = comment.get('likeCount', comment.get('voteCount', {}).get('simpleText', 0))
+        published_time = comment.get('publishedTimeText', {}).get('runs', [{}])[0].get('text', '')
+
+        return {
+            "author": author,
+            "comment": comment_text,
+            "likes": str(likes),
+            "time": published_time
+        }
+    except Exception as e:
+        print(f"เกิดข้อผิดพลาดในการแยกความคิดเห็น: {e}")
+        return None
+
+def parse_comment_entity(payload):
+    """แยกข้อมูลความคิดเห็นจาก commentEntityPayload (รูปแบบ commentViewModel)"""
+    try:
+        return {
+            "author": payload['author']['displayName'],
+            "comment": payload['properties']['content']['content'],
+            "likes": payload.get('toolbar', {}).get('likeCountNotliked') or '0',
+            "time": payload['properties'].get('publishedTime', '')
+        }
+    except Exception as e:
+        print(f"เกิดข้อผิดพลาดในการแยกความคิดเห็น: {e}")
+        return None
+
+def parse_items(items, data):
+    """yield (ความคิดเห็น, comment id, token ของการตอบกลับ) จากรายการในหนึ่งหน้า
+
+    รองรับทั้งรูปแบบ commentRenderer และ commentViewModel ที่เก็บเนื้อหาไว้ใน
+    frameworkUpdates ของ response
+    """
+    entities = _comment_entities(data)
+    for item in items:
+        if 'commentThreadRenderer' in item:
+            thread = item['commentThreadRenderer']
+            replies_token = _replies_token(thread)
+        elif 'commentRenderer' in item or 'commentViewModel' in item:
+            # หน้าการตอบกลับไม่มี thread ครอบ
+            thread = {'comment': item} if 'commentRenderer' in item else item
+            replies_token = None
+        else:
+            continue
+        if 'comment' in thread:
+            comment = parse_comment(thread)
+            comment_id = thread['comment']['commentRenderer'].get('commentId')
+        else:
+            comment_id, payload = _comment_entity(thread, entities)
+            comment = parse_comment_entity(payload)
+        if comment:
+            yield comment, comment_id, replies_token
+
 class YouTubeCommentScraperRequests:
-    def __init__(self, output_dir="youtube_data"):
+    def __init__(self, output_dir="youtube_data", pool_size=DEFAULT_POOL_SIZE, http2=False, base_url=YOUTUBE_URL,
+                 rps=DEFAULT_RPS, cache=None):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        self.api_url = base_url.rstrip('/') + API_PATH
+        # connection pool แบบ keep-alive ใช้ร่วมกับ scraper อื่น จำกัดไม่เกิน rps (0 คือไม่จำกัด)
+        # และลองใหม่เมื่อเจอ 429/5xx หรือเครือข่ายผิดพลาด
+        # ถ้าให้ cache (ResponseCache) มา หน้าที่เคยดึงแล้วจะอ่านจากดิสก์แทน
+        self.session = HttpClient(headers={'User-Agent': USER_AGENT}, pool_size=pool_size, http2=http2,
+                                  limiter=AdaptiveRateLimiter(rps), retry=RetryPolicy(), cache=cache)
 
     def extract_video_id(self, url):
         """แยก video_id จาก URL YouTube"""
-        patterns = [
-            r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]{11})',
-            r'(?:https?://)?youtu\.be/([a-zA-Z0-9_-]{11})',
-            r'(?:https?://)?(?:www\.)?youtube\.com/embed/([a-zA-Z0-9_-]{11})'
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
-        return None
+        return video_id_from(url)
 
-    def get_comments(self, video_id, max_comments=100):
-        """ดึงความคิดเห็นโดยใช้ requests"""
-        comments = []
-        continuation_token = None
-
-        # URL สำหรับดึงความคิดเห็น
-        base_url = "https://www.youtube.com/youtubei/v1/next"
-
-        # Payload สำหรับ API call แรก
-        payload = {
-            "context": {
-                "client": {
-                    "clientName": "WEB",
-                    "clientVersion": "2.20210721.00.00"
-                }
-            },
-            "continuation": continuation_token,
-            "videoId": video_id
-        }
+    def _fetch_next(self, request):
+        """เรียก youtubei/v1/next หนึ่งครั้ง (videoId สำหรับหน้าแรก หรือ continuation token)"""
+        response = self.session.post(self.api_url, json=api_payload(request), headers=API_HEADERS)
+        response.raise_for_status()
+        return COMMENT_PAGE.loads(response.content)
 
-        headers = {
-            'Content-Type': 'application/json',
-            'X-YouTube-Client-Name': '1',
-            'X-YouTube-Client-Version': '2.20210721.00.00'
-        }
+    def iter_comment_pages(self, video_id, max_comments=100, replies=False, raise_errors=False):
+        """ดึงความคิดเห็นทีละหน้าตาม continuation token และ yield รายการของแต่ละหน้า
 
+        ระหว่างที่แยกข้อมูลหน้าปัจจุบัน หน้าถัดไปจะถูกโหลดล่วงหน้าใน thread แยก
+        หยุดเมื่อได้ครบ max_comments พอดี เมื่อ replies=True จะตามการตอบกลับของแต่ละ
+        ความคิดเห็นด้วย (นับรวมใน max_comments) และทุกรายการจะมี "id" กับ "reply_to"
+        ข้อผิดพลาดจะถูกพิมพ์แล้วหยุด ยกเว้น raise_errors=True ที่ส่งต่อให้ผู้เรียก
+        (เช่น scheduler ของ crawl.py ที่ต้องรู้ว่างานล้มเหลวเพื่อลองใหม่)
+        """
+        remaining = max_comments
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self._fetch_next, {"videoId": video_id})
         try:
-            response = self.session.post(base_url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-            # แยกความคิดเห็นจาก response
-            if 'contents' in data and 'twoColumnWatchNextResults' in data['contents']:
-                results = data['contents']['twoColumnWatchNextResults']
-                if 'results' in results and 'results' in results['results']:
-                    contents = results['results']['results']['contents']
-
-                    for content in contents:
-                        if 'itemSectionRenderer' in content:
-                            for item in content['itemSectionRenderer']['contents']:
-                                if 'commentThreadRenderer' in item:
-                                    comment_thread = item['commentThreadRenderer']
-                                    comment_data = self._parse_comment(comment_thread)
-                                    if comment_data:
-                                        comments.append(comment_data)
-
-                                        if len(comments) >= max_comments:
-                                            break
-
-                            if len(comments) >= max_comments:
-                                break
+            while future is not None and remaining > 0:
+                data = future.result()
+                items = page_items(data)
+                token = next_token(items)
+                # ถ้าหน้านี้มีความคิดเห็นพอแล้วก็ไม่ต้องโหลดหน้าถัดไป
+                threads = sum(1 for item in items if 'commentThreadRenderer' in item)
+                future = None
+                if token and (replies or threads < remaining):
+                    future = executor.submit(self._fetch_next, {"continuation": token})
 
+                page = []
+                for comment, comment_id, replies_token in parse_items(items, data):
+                    if replies:
+                        comment.update(id=comment_id, reply_to=None)
+                    page.append(comment)
+                    remaining -= 1
+                    if remaining and replies and replies_token:
+                        for reply in self._iter_replies(replies_token, comment_id, remaining):
+                            page.append(reply)
+                            remaining -= 1
+                    if not remaining:
+                        break
+                yield page
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"เกิดข้อผิดพลาดในการดึงความคิดเห็น: {e}")
-            return []
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
-        return comments[:max_comments]
+    def _iter_replies(self, token, parent_id, limit):
+        """ตาม continuation ของการตอบกลับหนึ่งความคิดเห็น ได้ไม่เกิน limit รายการ"""
+        while token and limit > 0:
+            data = self._fetch_next({"continuation": token})
+            items = page_items(data)
+            token = next_token(items)
+            for reply, reply_id, _ in parse_items(items, data):
+                reply.update(id=reply_id, reply_to=parent_id)
+                yield reply
+                limit -= 1
+                if not limit:
+                    return
 
-    def _parse_comment(self, comment_thread):
-        """แยกข้อมูลความคิดเห็น"""
-        try:
-            comment = comment_thread['comment']['commentRenderer']
-
-            author = comment['authorText']['simpleText']
-            comment_text = comment['contentText']['runs'][0]['text'] if 'runs' in comment['contentText'] else comment['contentText']['simpleText']
-            likes = comment.get('likeCount', 0)
-            published_time = comment.get('publishedTimeText', {}).get('runs', [{}])[0].get('text', '')
-
-            return {
-                "author": author,
-                "comment": comment_text,
-                "likes": str(likes),
-                "time": published_time
-            }
-        except Exception as e:
-            print(f"เกิดข้อผิดพลาดในการแยกความคิดเห็น: {e}")
-            return None
+    def get_comments(self, video_id, max_comments=100, replies=False):
+        """ดึงความคิดเห็นโดยใช้ requests"""
+        comments = []
+        for page in self.iter_comment_pages(video_id, max_comments, replies):
+            comments.extend(page)
+        return comments
 
     def save_comments(self, comments, video_id, filename=None):
         """บันทึกความคิดเห็นเป็นไฟล์ JSONL"""
@@ -126,32 +321,70 @@ class YouTubeCommentScraperRequests:
 
         print(f"บันทึกความคิดเห็น {len(comments)} รายการไปยัง {output_file}")
 
-    def scrape_video_comments(self, video_url, max_comments=100):
-        """ฟังก์ชันหลักสำหรับดึงความคิดเห็น"""
+    def scrape_video_comments(self, video_url, max_comments=100, replies=False, raise_errors=False):
+        """ฟังก์ชันหลักสำหรับดึงความคิดเห็น เขียนลงไฟล์ทีละหน้าระหว่างดึง
+
+        raise_errors=True ส่งข้อผิดพลาดของ URL และเครือข่ายต่อแทนการพิมพ์แล้วคืนผลเท่าที่ได้
+        """
         video_id = self.extract_video_id(video_url)
         if not video_id:
+            if raise_errors:
+                raise ValueError(f"ไม่สามารถแยก video_id จาก {video_url!r}")
             print("ไม่สามารถแยก video_id จาก URL")
             return []
 
         print(f"กำลังดึงความคิดเห็นจากวิดีโอ: {video_id}")
 
-        comments = self.get_comments(video_id, max_comments)
-        if comments:
-            self.save_comments(comments, video_id)
+        output_file = self.output_dir / f"youtube_comments_{video_id}.jsonl"
+        comments = []
+        started = time.perf_counter()
+        try:
+            with JsonlWriter(str(output_file), batch_size=max(max_comments, 1)) as writer:
+                for page in self.iter_comment_pages(video_id, max_comments, replies, raise_errors):
+                    for comment in page:
+                        writer.write(comment)
+                    writer.flush()
+                    comments.extend(page)
+        except Exception:
+            # ไม่ทิ้งไฟล์ว่างไว้เมื่อดึงไม่สำเร็จ (raise_errors=True)
+            if not comments:
+                output_file.unlink(missing_ok=True)
+            raise
+        elapsed = time.perf_counter() - started
 
+        if comments:
+            print(f"บันทึกความคิดเห็น {len(comments)} รายการไปยัง {output_file} "
+                  f"({elapsed:.1f} วินาที, {len(comments) / elapsed:.0f} ความคิดเห็น/วินาที)")
+        else:
+            output_file.unlink()
         return comments
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python youtube_comment_scraper_requests.py <video_url> [max_comments]")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 1:
+        print("Usage: python youtube_comment_scraper_requests.py <video_url> [max_comments] [--replies] "
+              "[--cache] [--replay]")
         print("Example: python youtube_comment_scraper_requests.py https://www.youtube.com/watch?v=VIDEO_ID 50")
         sys.exit(1)
 
-    video_url = sys.argv[1]
-    max_comments = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    video_url = args[0]
+    max_comments = int(args[1]) if len(args) > 1 else 100
+
+    # --cache เก็บคำตอบของ API ไว้ใน youtube_data/http_cache, --replay อ่านจาก cache อย่างเดียวโดยไม่ใช้เครือข่าย
+    cache = None
+    if '--cache' in sys.argv or '--replay' in sys.argv:
+        cache = ResponseCache(os.path.join("youtube_data", "http_cache"), max_bytes=1024 * 1024 * 1024,
+                              replay='--replay' in sys.argv)
 
-    scraper = YouTubeCommentScraperRequests()
-    scraper.scrape_video_comments(video_url, max_comments)
+    scraper = YouTubeCommentScraperRequests(cache=cache)
+    try:
+        scraper.scrape_video_comments(video_url, max_comments, replies='--replies' in sys.argv)
+    finally:
+        if cache is not None:
+            print(cache.summary())
+            cache.close()
+    print(scraper.session.stats.summary())
+    print(scraper.session.metrics.summary())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
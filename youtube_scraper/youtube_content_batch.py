@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+YouTube Content Scraper (Batch)
+ดึง transcript จากรายการวิดีโอพร้อมกันหลาย thread
+
+แต่ละวิดีโอเรียก list transcripts เพียงครั้งเดียว เลือกภาษาในเครื่อง (ดู choose_transcript)
+แล้ว fetch ตัวที่เลือก ผลทั้งที่พบและไม่พบ transcript ถูกเก็บใน TranscriptCache
+การรันซ้ำกับรายการเดิมจึงข้ามวิดีโอที่รู้แล้วว่าไม่มี transcript ได้ทันที
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from youtube_comment_scraper_requests import read_video_ids
+from youtube_content_scraper import YouTubeContentScraper, fetch_best_transcript
+from transcript_cache import DAY, TranscriptCache
+
+def fetch_one(scraper, video_id, language):
+    """ทำงานใน worker thread: ดึงและบันทึก transcript ของหนึ่งวิดีโอ
+
+    คืน (video_id, status, transcript_language, entries, error) โดย status เป็น
+    'ok', 'none' (ไม่มี transcript) หรือ 'error' (ลองใหม่ได้ในรอบหน้า)
+    """
+    try:
+        transcript_language, entries = fetch_best_transcript(video_id, language)
+    except Exception as e:
+        return video_id, 'error', None, None, str(e)[:200]
+    if entries is None:
+        return video_id, TranscriptCache.NONE, None, None, None
+    scraper.save_transcript(entries, video_id)
+    return video_id, TranscriptCache.OK, transcript_language, entries, None
+
+def run_batch(video_ids, output_dir="youtube_data", language='th', workers=8, cache_path=None,
+              negative_ttl=7 * DAY, refresh=False, merge_chars=0):
+    """ดึง transcript ของทุกวิดีโอ ข้ามวิดีโอที่อยู่ใน cache คืนสถิติ
+
+    cache เก็บ transcript ดิบเสมอ merge_chars มีผลกับไฟล์ JSONL ที่เขียนเท่านั้น
+    """
+    scraper = YouTubeContentScraper(output_dir, merge_chars)
+    cache = TranscriptCache(cache_path or os.path.join(output_dir, 'transcript_cache.sqlite'), negative_ttl)
+    stats = {'videos': len(video_ids), 'fetched': 0, 'missing': 0, 'errors': 0, 'cached': 0, 'cached_missing': 0}
+    started = time.perf_counter()
+    try:
+        pending = []
+        for video_id in video_ids:
+            hit = None if refresh else cache.get(video_id, language)
+            if hit is None:
+                pending.append(video_id)
+            elif hit[0] == TranscriptCache.NONE:
+                stats['cached_missing'] += 1
+            else:
+                stats['cached'] += 1
+                # มีใน cache แต่ไฟล์ผลลัพธ์หาย (เช่นเปลี่ยน output_dir) เขียนจาก cache โดยไม่เรียกเครือข่าย
+                if not (scraper.output_dir / f"youtube_content_{video_id}.jsonl").exists():
+                    scraper.save_transcript(hit[2], video_id)
+        print(f"{len(video_ids)} วิดีโอ: อยู่ใน cache {stats['cached']}, รู้แล้วว่าไม่มี transcript "
+              f"{stats['cached_missing']}, ต้องดึง {len(pending)}")
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(fetch_one, scraper, video_id, language) for video_id in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                video_id, status, transcript_language, entries, error = future.result()
+                if status == TranscriptCache.OK:
+                    cache.put(video_id, language, transcript_language, entries)
+                    stats['fetched'] += 1
+                    message = f"{len(entries)} ส่วน ภาษา {transcript_language}"
+                elif status == TranscriptCache.NONE:
+                    cache.put_missing(video_id)
+                    stats['missing'] += 1
+                    message = "ไม่มี transcript"
+                else:
+                    stats['errors'] += 1
+                    message = f"ผิดพลาด: {error}"
+                print(f"[{done}/{len(pending)}] {video_id}: {message}")
+    finally:
+        cache.close()
+
+    stats['elapsed'] = time.perf_counter() - started
+    print(f"ดึงใหม่ {stats['fetched']}, ไม่มี transcript {stats['missing']}, ผิดพลาด {stats['errors']}, "
+          f"จาก cache {stats['cached'] + stats['cached_missing']} ใน {stats['elapsed']:.1f} วินาที")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="ดึง transcript YouTube จากรายการวิดีโอพร้อมกันหลาย thread")
+    parser.add_argument('list_file', help="ไฟล์ video_id หรือ URL บรรทัดละหนึ่งรายการ")
+    parser.add_argument('--language', default='th', help="ภาษาที่ต้องการก่อน (default th)")
+    parser.add_argument('--workers', type=int, default=8, help="จำนวน thread ที่ดึงพร้อมกัน (default 8)")
+    parser.add_argument('--output-dir', default="youtube_data", help="โฟลเดอร์ผลลัพธ์ (default youtube_data)")
+    parser.add_argument('--cache', help="ไฟล์ cache (default <output-dir>/transcript_cache.sqlite)")
+    parser.add_argument('--negative-ttl-days', type=float, default=7,
+                        help="จำวิดีโอที่ไม่มี transcript ไว้กี่วันก่อนลองใหม่ (default 7)")
+    parser.add_argument('--refresh', action='store_true', help="ไม่อ่าน cache ดึงใหม่ทุกวิดีโอ")
+    parser.add_argument('--merge-chars', type=int, default=0,
+                        help="รวมส่วนที่ติดกันใน JSONL เป็นช่วงยาวไม่เกิน N ตัวอักษร (default 0 = ไม่รวม)")
+    args = parser.parse_args()
+
+    video_ids = read_video_ids(args.list_file)
+    print(f"พบ {len(video_ids)} วิดีโอใน {args.list_file}")
+    run_batch(video_ids, args.output_dir, args.language, args.workers, args.cache,
+              args.negative_ttl_days * DAY, args.refresh, args.merge_chars)
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,126 @@ YouTube Content Scraper
 ดึงเนื้อหาวิดีโอ (transcript/caption) จาก YouTube
 """
 
+import os
 import sys
 import json
 import re
+import threading
 from pathlib import Path
+import youtube_transcript_api
 from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.formatters import TextFormatter, JSONFormatter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scraper_common.text_cleaning import CleaningEngine, CollapseWhitespace, Regex
+
+transcript_cleaner = CleaningEngine([
+    # ลบ timestamp และ formatting
+    Regex(r'\[\d+:\d+:\d+\.\d+\]', guard='['),
+    Regex(r'\[\d+:\d+\]', guard='['),
+    # ลบ extra whitespace
+    CollapseWhitespace(),
+    # ลบ special characters ที่ไม่ต้องการ เก็บตัวอักษรไทย อังกฤษ และเครื่องหมายบางตัว
+    Regex(r'[^\w\s\u0E00-\u0E7F.,!?]'),
+])
+
+# ข้อผิดพลาดที่หมายความว่าวิดีโอไม่มี transcript จริงๆ (ต่างจากเครือข่ายล่มหรือถูกบล็อก)
+# ชื่อที่มีแตกต่างกันไปตามเวอร์ชันของ youtube-transcript-api
+NO_TRANSCRIPT_ERRORS = tuple(
+    getattr(youtube_transcript_api, name)
+    for name in ('TranscriptsDisabled', 'NoTranscriptFound', 'NoTranscriptAvailable', 'VideoUnavailable',
+                 'VideoUnplayable', 'AgeRestricted', 'InvalidVideoId')
+    if hasattr(youtube_transcript_api, name)
+)
+
+_local = threading.local()
+
+def list_transcripts(video_id):
+    """รายการ transcript ของวิดีโอ (API แบบ static ของเวอร์ชันเก่า หรือ instance ต่อ thread ของ 1.x)"""
+    if hasattr(YouTubeTranscriptApi, 'list_transcripts'):
+        return YouTubeTranscriptApi.list_transcripts(video_id)
+    if not hasattr(_local, 'api'):
+        _local.api = YouTubeTranscriptApi()
+    return _local.api.list(video_id)
+
+def preferred_languages(language):
+    """ภาษาที่ต้องการตามลำดับ: ภาษาที่ระบุ แล้วไทย แล้วอังกฤษ"""
+    return list(dict.fromkeys([language, 'th-TH', 'th', 'en', 'en-US']))
+
+def choose_transcript(transcripts, languages):
+    """เลือก transcript จากรายการโดยไม่เรียกเครือข่าย
+
+    ไล่ภาษาตามลำดับที่ต้องการ ในแต่ละภาษาเลือกแบบที่คนทำก่อนแบบสร้างอัตโนมัติ
+    ถ้าไม่มีภาษาไหนตรงเลยใช้ transcript แรกในรายการ
+    """
+    transcripts = list(transcripts)
+    for language in languages:
+        for generated in (False, True):
+            for transcript in transcripts:
+                if transcript.language_code == language and transcript.is_generated == generated:
+                    return transcript
+    return transcripts[0] if transcripts else None
+
+def transcript_entries(fetched):
+    """ผลของ Transcript.fetch() เป็น list ของ dict {text, start, duration} ในทุกเวอร์ชัน"""
+    if hasattr(fetched, 'to_raw_data'):
+        return fetched.to_raw_data()
+    return list(fetched)
+
+def fetch_best_transcript(video_id, language='th'):
+    """list transcript หนึ่งครั้ง เลือกภาษาในเครื่อง แล้ว fetch ตัวที่เลือก
+
+    คืน (language_code, entries) หรือ (None, None) เมื่อวิดีโอไม่มี transcript
+    ข้อผิดพลาดอื่น (เครือข่าย, ถูกบล็อก) ถูกส่งต่อให้ผู้เรียก
+    """
+    try:
+        transcript = choose_transcript(list_transcripts(video_id), preferred_languages(language))
+        if transcript is None:
+            return None, None
+        return transcript.language_code, transcript_entries(transcript.fetch())
+    except NO_TRANSCRIPT_ERRORS:
+        return None, None
+
+WRITE_BUFFER = 1024 * 1024
+SENTENCE_END = ('.', '!', '?')
+
+def merge_segments(rows, max_chars=400, max_gap=2.0):
+    """รวม segment ของคำบรรยายที่ติดกันเป็นช่วงขนาดประโยคสำหรับข้อมูลฝึกโมเดล
+
+    ตัดช่วงหลัง segment ที่จบด้วย . ! ? เมื่อข้อความจะยาวเกิน max_chars หรือเมื่อเว้นช่วง
+    จาก segment ก่อนหน้าเกิน max_gap วินาที segment ที่ว่างหลังทำความสะอาดถูกข้าม
+    แต่ละช่วงมี start ของ segment แรก และ duration ถึงจุดจบของ segment สุดท้าย
+    """
+    texts = []
+    size = start = end = 0
+
+    def chunk():
+        return {"start": start, "duration": round(end - start, 3), "text": ' '.join(texts)}
+
+    for row in rows:
+        text = row['text'].strip()
+        if not text:
+            continue
+        if texts and (row['start'] - end > max_gap or size + 1 + len(text) > max_chars):
+            yield chunk()
+            texts = []
+        if not texts:
+            start = row['start']
+            size = -1
+        texts.append(text)
+        size += 1 + len(text)
+        end = row['start'] + row['duration']
+        if text.endswith(SENTENCE_END):
+            yield chunk()
+            texts = []
+    if texts:
+        yield chunk()
 
 class YouTubeContentScraper:
-    def __init__(self, output_dir="youtube_data"):
+    def __init__(self, output_dir="youtube_data", merge_chars=0):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        # 0 คือเขียน JSONL ทีละ segment เหมือนเดิม มากกว่า 0 คือรวม segment (ดู merge_segments)
+        self.merge_chars = merge_chars
 
     def extract_video_id(self, url):
         """แยก video_id จาก URL YouTube"""
@@ -32,86 +141,75 @@ class YouTubeContentScraper:
 
     def get_transcript(self, video_id, language='th'):
         """ดึง transcript ของวิดีโอ"""
-        languages_to_try = [language, 'th-TH', 'th', 'en', 'en-US']
-
-        for lang in languages_to_try:
-            try:
-                print(f"ลองดึง transcript ภาษา {lang}...")
-                transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=[lang])
-                print(f"พบ transcript ภาษา {lang}")
-                return transcript
-            except Exception as e:
-                print(f"ไม่พบ transcript ภาษา {lang}: {str(e)[:50]}...")
-                continue
-
-        # ลอง list และ fetch โดยตรง
         try:
-            print("ลอง list transcripts...")
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-            available_transcripts = list(transcript_list)
-            print(f"พบ {len(available_transcripts)} transcripts")
-            for t in available_transcripts:
-                print(f"  - {t.language} (Generated: {t.is_generated})")
-            if available_transcripts:
-                transcript = available_transcripts[0].fetch()
-                print(f"ดึง transcript ภาษา {available_transcripts[0].language}")
-                return transcript
-        except Exception as e3:
-            print(f"ไม่สามารถ fetch transcript: {str(e3)[:50]}...")
-
-        return None
+            language_code, transcript = fetch_best_transcript(video_id, language)
+        except Exception as e:
+            print(f"ไม่สามารถ fetch transcript: {str(e)[:50]}...")
+            return None
+        if transcript is None:
+            print("ไม่พบ transcript")
+            return None
+        print(f"ดึง transcript ภาษา {language_code}")
+        return transcript
 
     def clean_transcript_text(self, text):
         """ทำความสะอาดข้อความ transcript"""
-        # ลบ timestamp และ formatting
-        text = re.sub(r'\[\d+:\d+:\d+\.\d+\]', '', text)
-        text = re.sub(r'\[\d+:\d+\]', '', text)
-
-        # ลบ extra whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
-
-        # ลบ special characters ที่ไม่ต้องการ
-        text = re.sub(r'[^\w\s\u0E00-\u0E7F.,!?]', '', text)  # เก็บตัวอักษรไทย อังกฤษ และเครื่องหมายบางตัว
-
-        return text
+        return transcript_cleaner.clean(text)
 
     def format_transcript(self, transcript, format_type='text'):
-        """จัดรูปแบบ transcript"""
+        """จัดรูปแบบ transcript (ผลเหมือน TextFormatter/JSONFormatter ของ youtube-transcript-api
+        แต่รับ list ของ dict ได้ในทุกเวอร์ชัน)"""
         if format_type == 'text':
-            formatter = TextFormatter()
-            return formatter.format_transcript(transcript)
+            return '\n'.join(entry['text'] for entry in transcript)
         elif format_type == 'json':
-            formatter = JSONFormatter()
-            return formatter.format_transcript(transcript)
+            return json.dumps(transcript)
         else:
             return transcript
 
     def save_transcript(self, transcript, video_id, format_type='text', filename=None):
-        """บันทึก transcript เป็นไฟล์"""
+        """บันทึก transcript เป็นไฟล์ และ JSONL ที่ทำความสะอาดแล้ว
+
+        ทั้งสองไฟล์ถูกเขียนพร้อมกันในการวนรายการรอบเดียว เมื่อกำหนด merge_chars ใน constructor
+        JSONL จะรวม segment ที่ติดกันเป็นช่วงขนาดประโยค (ดู merge_segments)
+        ไฟล์ text/json ยังเป็นรายการเดิมเสมอ
+        """
+        if format_type not in ('text', 'json'):
+            raise ValueError(f"format_type ต้องเป็น 'text' หรือ 'json' ไม่ใช่ {format_type!r}")
         if filename is None:
             filename = f"youtube_transcript_{video_id}.{format_type}"
 
         output_file = self.output_dir / filename
-
-        formatted_transcript = self.format_transcript(transcript, format_type)
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(formatted_transcript)
-
-        print(f"บันทึก transcript ไปยัง {output_file}")
-
-        # สร้างไฟล์ JSONL สำหรับข้อมูลที่มีโครงสร้าง
         jsonl_file = self.output_dir / f"youtube_content_{video_id}.jsonl"
-        with open(jsonl_file, 'w', encoding='utf-8') as f:
-            for entry in transcript:
-                content_data = {
-                    "start": entry['start'],
-                    "duration": entry['duration'],
-                    "text": self.clean_transcript_text(entry['text'])
-                }
-                json.dump(content_data, f, ensure_ascii=False)
-                f.write('\n')
+        clean = transcript_cleaner.clean
+
+        with open(output_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER) as out, \
+                open(jsonl_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER) as jsonl:
+
+            def rows():
+                # เขียนไฟล์ text/json (เหมือน format_transcript) ระหว่างส่งแต่ละรายการต่อไปยัง JSONL
+                separator = ''
+                for entry in transcript:
+                    if format_type == 'text':
+                        out.write(separator + entry['text'])
+                        separator = '\n'
+                    else:
+                        out.write((separator or '[') + json.dumps(entry))
+                        separator = ', '
+                    yield {
+                        "start": entry['start'],
+                        "duration": entry['duration'],
+                        "text": clean(entry['text'])
+                    }
+                if format_type == 'json':
+                    out.write(']' if separator else '[]')
+
+            content = rows()
+            if self.merge_chars:
+                content = merge_segments(content, self.merge_chars)
+            for content_data in content:
+                jsonl.write(json.dumps(content_data, ensure_ascii=False) + '\n')
 
+        print(f"บันทึก transcript ไปยัง {output_file}")
         print(f"บันทึกเนื้อหาเป็น JSONL ไปยัง {jsonl_file}")
 
     def scrape_video_content(self, video_url, language='th'):
@@ -132,16 +230,18 @@ class YouTubeContentScraper:
             return None
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python youtube_content_scraper.py <video_url> [language]")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 1:
+        print("Usage: python youtube_content_scraper.py <video_url> [language] [--merge]")
         print("Example: python youtube_content_scraper.py https://www.youtube.com/watch?v=VIDEO_ID th")
         print("Languages: th (Thai), en (English), etc.")
+        print("--merge: รวม segment ที่ติดกันใน JSONL เป็นช่วงขนาดประโยค (ไม่เกิน 400 ตัวอักษร)")
         sys.exit(1)
 
-    video_url = sys.argv[1]
-    language = sys.argv[2] if len(sys.argv) > 2 else 'th'
+    video_url = args[0]
+    language = args[1] if len(args) > 1 else 'th'
 
-    scraper = YouTubeContentScraper()
+    scraper = YouTubeContentScraper(merge_chars=400 if '--merge' in sys.argv else 0)
     scraper.scrape_video_content(video_url, language)
 
 if __name__ == "__main__":